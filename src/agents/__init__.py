@@ -1,3 +1,25 @@
-from agents.agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents.agents import (
+    DEFAULT_AGENT,
+    agent_source_files,
+    get_agent,
+    get_agent_durability,
+    get_all_agent_info,
+    prebind_agent_tools,
+    reload_agent,
+    set_agent_checkpointer,
+    uses_response_cache,
+    uses_semantic_cache,
+)
 
-__all__ = ["get_agent", "get_all_agent_info", "DEFAULT_AGENT"]
+__all__ = [
+    "agent_source_files",
+    "get_agent",
+    "get_agent_durability",
+    "get_all_agent_info",
+    "prebind_agent_tools",
+    "reload_agent",
+    "set_agent_checkpointer",
+    "uses_response_cache",
+    "uses_semantic_cache",
+    "DEFAULT_AGENT",
+]
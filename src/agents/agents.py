@@ -1,12 +1,16 @@
+import importlib
+import importlib.util
+import sys
+import threading
+from collections.abc import Iterable
 from dataclasses import dataclass
 
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph.state import CompiledStateGraph
 
-from agents.chatbot import chatbot
-from agents.research_assistant.research_assistant import research_assistant
-from agents.economic_report_assistant.economic_report_assistant import economic_report_assistant
-from agents.chb_assistant.chb_assistant import chb_assistant
-from schema import AgentInfo
+from core import settings
+from core.llm import SERVICE_MODEL_PARAMS
+from schema import AgentInfo, AllModelEnum, Durability
 
 DEFAULT_AGENT = "research-assistant"
 
@@ -14,22 +18,162 @@ DEFAULT_AGENT = "research-assistant"
 @dataclass
 class Agent:
     description: str
-    graph: CompiledStateGraph
+    # Loaded from import_path on first use if not given
+    graph: CompiledStateGraph | None = None
+    # "module:attribute" of the compiled graph
+    import_path: str | None = None
+    # If None, settings.CHECKPOINT_DURABILITY is used
+    durability: Durability | None = None
+    # Serve repeated identical model calls from the response cache, if RESPONSE_CACHE is enabled
+    response_cache: bool = False
+    # Answer stateless turns from the semantic cache, if SEMANTIC_CACHE is enabled. Only for
+    # agents whose tools have no side effects, since a cached answer skips running them.
+    semantic_cache: bool = False
 
 
+# Agents are imported on first use, so their tool dependencies don't slow down service startup
 agents: dict[str, Agent] = {
-    "chatbot": Agent(description="A simple chatbot.", graph=chatbot),
+    "chatbot": Agent(
+        description="A simple chatbot.",
+        import_path="agents.chatbot:chatbot",
+        response_cache=True,
+        semantic_cache=True,
+    ),
     "research-assistant": Agent(
-        description="A research assistant with web search and calculator.", graph=research_assistant
+        description="A research assistant with web search and calculator.",
+        import_path="agents.research_assistant.research_assistant:research_assistant",
+        durability=Durability.EXIT,
+        semantic_cache=True,
+    ),
+    "economic-report-assistant": Agent(
+        description="A economic report assistant.",
+        import_path="agents.economic_report_assistant.economic_report_assistant:economic_report_assistant",
+    ),
+    "chb-assistant": Agent(
+        description="A sale assistant.",
+        import_path="agents.chb_assistant.chb_assistant:chb_assistant",
+        durability=Durability.EXIT,
     ),
-    "economic-report-assistant": Agent(description="A economic report assistant.", graph=economic_report_assistant),
-    "chb-assistant": Agent(description="A sale assistant.", graph=chb_assistant),
 }
 
+# Checkpointer bound to every agent, including ones loaded after it is set
+_checkpointer: BaseCheckpointSaver | None = None
+# Reloads swap entries in sys.modules, so only one runs at a time
+_reload_lock = threading.Lock()
+
+
+def _enabled_agents() -> dict[str, Agent]:
+    if settings.ENABLED_AGENTS is None:
+        return agents
+    return {agent_id: agent for agent_id, agent in agents.items() if agent_id in settings.ENABLED_AGENTS}
+
 
 def get_agent(agent_id: str) -> CompiledStateGraph:
-    return agents[agent_id].graph
+    agent = _enabled_agents()[agent_id]
+    if agent.graph is None:
+        module_name, _, attribute = agent.import_path.partition(":")
+        agent.graph = getattr(importlib.import_module(module_name), attribute)
+        if _checkpointer is not None:
+            agent.graph.checkpointer = _checkpointer
+    return agent.graph
+
+
+def _agent_modules(import_path: str) -> list[str]:
+    """The agent's graph module, preceded by the already imported modules of its own package (e.g. its tools)."""
+    module_name = import_path.partition(":")[0]
+    package = module_name.rpartition(".")[0]
+    siblings = []
+    if package != __package__:
+        siblings = sorted(name for name in sys.modules if name.startswith(f"{package}.") and name != module_name)
+    return [*siblings, module_name]
+
+
+def reload_agent(agent_id: str) -> CompiledStateGraph:
+    """
+    Re-import an agent's modules and swap in the newly compiled graph.
+
+    The modules are executed into new module objects rather than reloaded in place, so
+    runs in progress keep the old graph along with the code and globals it was built
+    with, while new runs get the new one. If any module fails to import, the previous
+    graph and modules stay in place.
+    """
+    agent = _enabled_agents()[agent_id]
+    if agent.import_path is None:
+        raise ValueError(f"Agent {agent_id} has no import_path to reload from")
+    module_name, _, attribute = agent.import_path.partition(":")
+    with _reload_lock:
+        module_names = _agent_modules(agent.import_path)
+        previous = {name: sys.modules.get(name) for name in module_names}
+        try:
+            for name in module_names:
+                spec = importlib.util.find_spec(name)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[name] = module
+                spec.loader.exec_module(module)
+            graph = getattr(sys.modules[module_name], attribute)
+        except BaseException:
+            for name, module in previous.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+            raise
+    if _checkpointer is not None:
+        graph.checkpointer = _checkpointer
+    agent.graph = graph
+    return graph
+
+
+def agent_source_files(agent_id: str) -> list[str]:
+    """Source files a loaded agent is built from. Empty if the agent hasn't been loaded yet."""
+    agent = agents[agent_id]
+    if agent.graph is None or agent.import_path is None:
+        return []
+    modules = (sys.modules.get(name) for name in _agent_modules(agent.import_path))
+    return [module.__file__ for module in modules if getattr(module, "__file__", None)]
+
+
+def prebind_agent_tools(agent_id: str, model_names: Iterable[AllModelEnum]) -> None:
+    """
+    Load an agent and, if its module caches tool-bound models in `bound_model`, build
+    them for each model in the variants the service uses.
+    """
+    get_agent(agent_id)
+    import_path = agents[agent_id].import_path
+    if import_path is None:
+        return
+    bound_model = getattr(importlib.import_module(import_path.partition(":")[0]), "bound_model", None)
+    if bound_model is None:
+        return
+    for model_name in model_names:
+        for params in SERVICE_MODEL_PARAMS:
+            bound_model(model_name, params)
+
+
+def set_agent_checkpointer(checkpointer: BaseCheckpointSaver) -> None:
+    global _checkpointer
+    _checkpointer = checkpointer
+    for agent in agents.values():
+        if agent.graph is not None:
+            agent.graph.checkpointer = checkpointer
+
+
+def get_agent_durability(agent_id: str) -> Durability:
+    agent = agents.get(agent_id)
+    if agent and agent.durability:
+        return agent.durability
+    return settings.CHECKPOINT_DURABILITY
+
+
+def uses_response_cache(agent_id: str) -> bool:
+    agent = agents.get(agent_id)
+    return agent is not None and agent.response_cache
+
+
+def uses_semantic_cache(agent_id: str) -> bool:
+    agent = agents.get(agent_id)
+    return agent is not None and agent.semantic_cache
 
 
 def get_all_agent_info() -> list[AgentInfo]:
-    return [AgentInfo(key=agent_id, description=agent.description) for agent_id, agent in agents.items()]
+    return [AgentInfo(key=agent_id, description=agent.description) for agent_id, agent in _enabled_agents().items()]
@@ -4,7 +4,8 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.func import entrypoint
 from langgraph.graph import add_messages
 
-from core import get_model, settings
+from core import config_model_params, get_model, settings
+from core.scheduler import config_priority, model_scheduler
 
 
 @entrypoint(checkpointer=MemorySaver())
@@ -18,6 +19,7 @@ async def chatbot(
     if previous:
         messages = add_messages(previous["messages"], messages)
 
-    model = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
-    response = await model.ainvoke(messages)
+    model = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL), config_model_params(config))
+    async with model_scheduler.slot(config_priority(config)):
+        response = await model.ainvoke(messages)
     return entrypoint.final(value={"messages": [response]}, save={"messages": add_messages(messages, response)})
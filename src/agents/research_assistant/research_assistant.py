@@ -1,17 +1,21 @@
 from datetime import datetime
+from functools import lru_cache
 from typing import Literal
 
 from langchain_community.tools import DuckDuckGoSearchResults
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.managed import RemainingSteps
-from langgraph.prebuilt import ToolNode
 
 from agents.research_assistant.tools import calculator
-from core import get_model, settings
+from agents.utils import ScheduledToolNode
+from core import ModelParams, config_model_params, get_model, settings
+from core.context import build_context, context_budget
+from core.scheduler import config_priority, model_scheduler
+from schema import AllModelEnum
 
 
 class AgentState(MessagesState, total=False):
@@ -40,19 +44,29 @@ or two citations per response unless more are needed. ONLY USE LINKS RETURNED BY
 """
 
 
-def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+def wrap_model(model: BaseChatModel, budget: int) -> RunnableSerializable[AgentState, AIMessage]:
     model = model.bind_tools(tools)
     preprocessor = RunnableLambda(
-        lambda state: [SystemMessage(content=instructions)] + state["messages"],
+        lambda state: build_context(instructions, state["messages"], budget),
         name="StateModifier",
     )
     return preprocessor | model
 
 
+@lru_cache(maxsize=settings.MODEL_REGISTRY_MAX_ENTRIES)
+def bound_model(
+    model_name: AllModelEnum, params: ModelParams = ModelParams()
+) -> RunnableSerializable[AgentState, AIMessage]:
+    # Binding tools converts their schemas, so do it once per model variant rather than per call
+    return wrap_model(get_model(model_name, params), context_budget(model_name, params.max_tokens))
+
+
 async def acall_model(state: AgentState, config: RunnableConfig) -> AgentState:
-    m = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
-    model_runnable = wrap_model(m)
-    response = await model_runnable.ainvoke(state, config)
+    model_runnable = bound_model(
+        config["configurable"].get("model", settings.DEFAULT_MODEL), config_model_params(config)
+    )
+    async with model_scheduler.slot(config_priority(config)):
+        response = await model_runnable.ainvoke(state, config)
 
     if state["remaining_steps"] < 2 and response.tool_calls:
         return {
@@ -80,7 +94,7 @@ def pending_tool_calls(state: AgentState) -> Literal["tools", "done"]:
 # Define the graph
 agent = StateGraph(AgentState)
 agent.add_node("model", acall_model)
-agent.add_node("tools", ToolNode(tools))
+agent.add_node("tools", ScheduledToolNode(tools))
 agent.set_entry_point("model")
 
 # Always run "model" after "tools"
@@ -0,0 +1,20 @@
+from typing import Literal
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
+
+from core.scheduler import config_priority, tool_scheduler
+
+
+class ScheduledToolNode(ToolNode):
+    """ToolNode that runs each tool call in a slot granted by the tool scheduler, by run priority."""
+
+    async def _arun_one(
+        self,
+        call: ToolCall,
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        async with tool_scheduler.slot(config_priority(config)):
+            return await super()._arun_one(call, input_type, config)
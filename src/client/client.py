@@ -10,8 +10,10 @@ from schema import (
     ChatHistoryInput,
     ChatMessage,
     Feedback,
+    Priority,
     ServiceMetadata,
     StreamInput,
+    ThreadList,
     UserInput,
 )
 
@@ -29,6 +31,7 @@ class AgentClient:
         agent: str = None,
         timeout: float | None = None,
         get_info: bool = True,
+        priority: Priority | None = None,
     ) -> None:
         """
         Initialize the client.
@@ -39,10 +42,13 @@ class AgentClient:
             timeout (float, optional): The timeout for requests.
             get_info (bool, optional): Whether to fetch agent information on init.
                 Default: True
+            priority (Priority, optional): Scheduling priority sent with every request.
+                Use Priority.BATCH for offline jobs so they don't slow down interactive users.
         """
         self.base_url = base_url
         self.auth_secret = os.getenv("AUTH_SECRET")
         self.timeout = timeout
+        self.priority = priority
         self.info: ServiceMetadata | None = None
         self.agent: str | None = None
         if get_info:
@@ -55,6 +61,8 @@ class AgentClient:
         headers = {}
         if self.auth_secret:
             headers["Authorization"] = f"Bearer {self.auth_secret}"
+        if self.priority:
+            headers["X-Priority"] = self.priority
         return headers
 
     def retrieve_info(self) -> None:
@@ -340,3 +348,40 @@ class AgentClient:
             raise AgentClientError(f"Error: {e}")
 
         return ChatHistory.model_validate(response.json())
+
+    def list_threads(
+        self,
+        user_id: str | None = None,
+        agent_id: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> ThreadList:
+        """
+        List threads, most recently updated first.
+
+        Args:
+            user_id (str, optional): Only list threads of this user
+            agent_id (str, optional): Only list threads of this agent
+            limit (int, optional): Maximum number of threads to return
+                Default: 20
+            cursor (str, optional): `next_cursor` of the previous page
+        """
+        params: dict[str, Any] = {"limit": limit}
+        if user_id:
+            params["user_id"] = user_id
+        if agent_id:
+            params["agent_id"] = agent_id
+        if cursor:
+            params["cursor"] = cursor
+        try:
+            response = httpx.get(
+                f"{self.base_url}/threads",
+                params=params,
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
+
+        return ThreadList.model_validate(response.json())
@@ -1,4 +1,4 @@
-from core.llm import get_model
+from core.llm import ModelParams, config_model_params, get_model
 from core.settings import settings
 
-__all__ = ["settings", "get_model"]
+__all__ = ["settings", "get_model", "ModelParams", "config_model_params"]
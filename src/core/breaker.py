@@ -0,0 +1,251 @@
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from openai import APIConnectionError
+from pydantic import ConfigDict
+
+from core.settings import settings
+from schema import CircuitState
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """A model call was refused because its provider's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a model provider.
+
+    While closed, the outcomes of the calls in the last CIRCUIT_WINDOW_SECONDS are
+    kept. Provider errors, see `is_provider_failure`, and streams slower than
+    CIRCUIT_SLOW_CALL_SECONDS to their first token are failures: once there have been CIRCUIT_MIN_CALLS calls and CIRCUIT_FAILURE_RATE of them failed,
+    the circuit opens and calls are refused for CIRCUIT_OPEN_SECONDS. Then it is half
+    open: one call is let through as a probe, which closes the circuit if it succeeds
+    and opens it again if it fails.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        # (time, failed) of the recent calls while closed
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._probing = False
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - settings.CIRCUIT_WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def current_state(self) -> CircuitState:
+        if self.state == CircuitState.OPEN and time.monotonic() - self.opened_at >= settings.CIRCUIT_OPEN_SECONDS:
+            self.state = CircuitState.HALF_OPEN
+        return self.state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now. An allowed call must be followed by `record` or `release`."""
+        if self.current_state() == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, failed: bool) -> None:
+        now = time.monotonic()
+        if self.state == CircuitState.HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open(now, "the probe call failed")
+            else:
+                logger.info(f"Closing the circuit of {self.name}")
+                self.state = CircuitState.CLOSED
+                self._calls.clear()
+            return
+        if self.state == CircuitState.OPEN:
+            # A call let through before the circuit opened
+            return
+        self._calls.append((now, failed))
+        self._trim(now)
+        failures = sum(failed for _, failed in self._calls)
+        if len(self._calls) >= settings.CIRCUIT_MIN_CALLS and failures / len(self._calls) >= settings.CIRCUIT_FAILURE_RATE:
+            self._open(now, f"{failures} of {len(self._calls)} recent calls failed")
+
+    def release(self) -> None:
+        """Give back an allowed call that was cancelled or rejected, so it counts as neither a success nor a failure."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now: float, reason: str) -> None:
+        logger.warning(f"Opening the circuit of {self.name} for {settings.CIRCUIT_OPEN_SECONDS}s: {reason}")
+        self.state = CircuitState.OPEN
+        self.opened_at = now
+        self.opened += 1
+        self._calls.clear()
+
+    def stats(self) -> dict[str, Any]:
+        self._trim(time.monotonic())
+        failures = sum(failed for _, failed in self._calls)
+        return {
+            "state": self.current_state(),
+            "recent_calls": len(self._calls),
+            "recent_failure_rate": failures / len(self._calls) if self._calls else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy: a transport error, a timeout, rate
+    limiting or a server error. Errors about the request itself, such as a prompt over
+    the context window, filtered content or another 4xx, don't count against it.
+    """
+    if isinstance(error, httpx.TransportError | APIConnectionError | TimeoutError | ConnectionError):
+        return True
+    # OpenAI, Anthropic and Ollama errors have the HTTP status as status_code, Google's as code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def _record_error(breaker: CircuitBreaker, error: BaseException) -> None:
+    if is_provider_failure(error):
+        breaker.record(failed=True)
+    else:
+        breaker.release()
+
+
+circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(provider: str) -> CircuitBreaker:
+    if provider not in circuit_breakers:
+        circuit_breakers[provider] = CircuitBreaker(provider)
+    return circuit_breakers[provider]
+
+
+def circuit_states() -> dict[str, CircuitState]:
+    """State of the circuit of each provider that has been called."""
+    return {provider: breaker.current_state() for provider, breaker in circuit_breakers.items()}
+
+
+class CircuitBreakerChatModel(BaseChatModel):
+    """
+    Chat model that calls `model` through the circuit breaker of its provider. While
+    the circuit is open, calls go to `fallback` if there is one and fail right away
+    with `CircuitOpenError` otherwise.
+
+    Only streaming calls can be slow, by the time to their first token: a stream that
+    has started is not hung, and the duration of a whole answer depends on its length.
+    """
+
+    model: BaseChatModel
+    fallback: BaseChatModel | None = None
+    provider: str
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "circuit-breaker"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model": self.model.dict(), "fallback": self.fallback.dict() if self.fallback else None}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        # The fallback may be from another provider, which formats tools differently
+        model = self.model.bind_tools(tools, **kwargs)
+        if self.fallback is None:
+            return self.bind(provider_kwargs=getattr(model, "kwargs", {}))
+        fallback = self.fallback.bind_tools(tools, **kwargs)
+        return self.bind(provider_kwargs=getattr(model, "kwargs", {}), fallback_kwargs=getattr(fallback, "kwargs", {}))
+
+    def _route(self, kwargs: dict[str, Any]) -> tuple[CircuitBreaker | None, BaseChatModel, dict[str, Any]]:
+        """The breaker to report the call to, if it goes to `model`, the model to call and its kwargs."""
+        provider_kwargs = kwargs.pop("provider_kwargs", None) or {}
+        fallback_kwargs = kwargs.pop("fallback_kwargs", None) or {}
+        breaker = circuit_breaker(self.provider)
+        if breaker.allow():
+            return breaker, self.model, {**kwargs, **provider_kwargs}
+        if self.fallback is None:
+            raise CircuitOpenError(f"The circuit of {self.provider} is open")
+        return None, self.fallback, {**kwargs, **fallback_kwargs}
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        breaker, model, kwargs = self._route(kwargs)
+        stream = model._astream(messages, stop=stop, **kwargs)
+        if breaker is None:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        start = time.monotonic()
+        try:
+            first = await anext(stream, None)
+        except BaseException as e:
+            _record_error(breaker, e)
+            raise
+        breaker.record(failed=time.monotonic() - start > settings.CIRCUIT_SLOW_CALL_SECONDS)
+        if first is None:
+            return
+        yield first
+        async for chunk in stream:
+            yield chunk
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        breaker, model, kwargs = self._route(kwargs)
+        if breaker is None:
+            return await model._agenerate(messages, stop=stop, **kwargs)
+
+        try:
+            result = await model._agenerate(messages, stop=stop, **kwargs)
+        except BaseException as e:
+            _record_error(breaker, e)
+            raise
+        breaker.record(failed=False)
+        return result
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        breaker, model, kwargs = self._route(kwargs)
+        if breaker is None:
+            return model._generate(messages, stop=stop, **kwargs)
+
+        try:
+            result = model._generate(messages, stop=stop, **kwargs)
+        except BaseException as e:
+            _record_error(breaker, e)
+            raise
+        breaker.record(failed=False)
+        return result
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from core.settings import settings
+
+# Key in the run config (and so the model call's metadata) that opts a run into the cache
+CACHE_CONFIG_KEY = "response_cache"
+
+# Cached text is replayed word by word, keeping the whitespace that follows each word
+_REPLAY_CHUNK = re.compile(r"\S+\s*|\s+")
+
+
+def _normalize_messages(messages: list[BaseMessage]) -> list[dict[str, Any]]:
+    """
+    The parts of the messages that affect the model's answer. Message IDs and response
+    metadata are dropped, and tool call IDs, which are random, are replaced by their order.
+    """
+    tool_call_ids: dict[str, int] = {}
+
+    def tool_call_index(tool_call_id: str | None) -> int | None:
+        if tool_call_id is None:
+            return None
+        return tool_call_ids.setdefault(tool_call_id, len(tool_call_ids))
+
+    normalized = []
+    for message in messages:
+        entry: dict[str, Any] = {"type": message.type, "content": message.content}
+        if tool_calls := getattr(message, "tool_calls", None):
+            entry["tool_calls"] = [(c["name"], c["args"], tool_call_index(c.get("id"))) for c in tool_calls]
+        if tool_call_id := getattr(message, "tool_call_id", None):
+            entry["tool_call_id"] = tool_call_index(tool_call_id)
+        if message.name:
+            entry["name"] = message.name
+        normalized.append(entry)
+    return normalized
+
+
+def cache_key(llm_string: str, messages: list[BaseMessage]) -> str:
+    """
+    Key of a model call. `llm_string` identifies the model, its parameters and the
+    call's arguments, including the schemas of any bound tools.
+    """
+    payload = json.dumps([llm_string, _normalize_messages(messages)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of model responses: an in-memory LRU of `max_entries`, backed by
+    an optional SQLite file shared across restarts and workers. Entries expire after
+    `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, path: str | None = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, list[ChatGeneration]]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._memory),
+        }
+
+    async def get(self, key: str) -> list[ChatGeneration] | None:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._memory[key]
+            entry = None
+        if entry is None and self.path:
+            entry = await asyncio.to_thread(self._db_get, key, now)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._memory.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, generations: list[ChatGeneration]) -> None:
+        entry = (time.time() + self.ttl, generations)
+        self._remember(key, entry)
+        if self.path:
+            await asyncio.to_thread(self._db_set, key, entry)
+
+    def _remember(self, key: str, entry: tuple[float, list[ChatGeneration]]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+        return self._db
+
+    def _db_get(self, key: str, now: float) -> tuple[float, list[ChatGeneration]] | None:
+        with self._db_lock:
+            row = (
+                self._connect()
+                .execute("SELECT expires_at, value FROM response_cache WHERE key = ? AND expires_at > ?", (key, now))
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return row[0], loads(row[1])
+
+    def _db_set(self, key: str, entry: tuple[float, list[ChatGeneration]]) -> None:
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+                db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, dumps(entry[1]), entry[0]),
+                )
+
+
+class ResponseCacheMixin:
+    """
+    Mixin for chat model classes that serves repeated calls from `response_cache`.
+
+    Only calls made in a run whose config sets `response_cache` are cached, so agents
+    opt in individually. On a hit, streaming calls replay the cached response as
+    tokens, so clients see it arrive like a normal response.
+    """
+
+    async def _agenerate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if response_cache is None or not (run_manager and run_manager.metadata.get(CACHE_CONFIG_KEY)):
+            return await super()._agenerate_with_cache(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        key = cache_key(self._get_llm_string(stop=stop, **kwargs), messages)
+        if (generations := await response_cache.get(key)) is not None:
+            return await self._replay(generations, run_manager, **kwargs)
+
+        result = await super()._agenerate_with_cache(messages, stop=stop, run_manager=run_manager, **kwargs)
+        # IDs and token usage belong to this call, not to the calls the entry will answer later
+        cached = [
+            ChatGeneration(message=g.message.model_copy(update={"id": None, "usage_metadata": None}))
+            for g in result.generations
+        ]
+        await response_cache.set(key, cached)
+        return result
+
+    async def _replay(
+        self, generations: list[ChatGeneration], run_manager: AsyncCallbackManagerForLLMRun, **kwargs: Any
+    ) -> ChatResult:
+        message_id = f"run-{run_manager.run_id}"
+        generations = [
+            ChatGeneration(
+                message=g.message.model_copy(
+                    update={"id": message_id, "response_metadata": {**g.message.response_metadata, "cached": True}}
+                )
+            )
+            for g in generations
+        ]
+        content = generations[0].message.content
+        if isinstance(content, str) and self._should_stream(async_api=True, run_manager=run_manager, **kwargs):
+            for token in _REPLAY_CHUNK.findall(content):
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, id=message_id))
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+        return ChatResult(generations=generations)
+
+
+_cached_classes: dict[type, type] = {}
+
+
+def with_response_cache(model_class: type) -> type:
+    """The model class with `ResponseCacheMixin` applied, or the class itself if the cache is disabled."""
+    if response_cache is None:
+        return model_class
+    if model_class not in _cached_classes:
+        _cached_classes[model_class] = type(model_class.__name__, (ResponseCacheMixin, model_class), {})
+    return _cached_classes[model_class]
+
+
+response_cache = (
+    ResponseCache(
+        settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_PATH
+    )
+    if settings.RESPONSE_CACHE
+    else None
+)
@@ -0,0 +1,186 @@
+import json
+import logging
+import math
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from core.settings import settings
+from schema.models import (
+    AzureOpenAIModelName,
+    GoogleModelName,
+    OpenAIModelName,
+    RouterModelName,
+)
+
+logger = logging.getLogger(__name__)
+
+# Context windows in tokens. CONTEXT_WINDOW_TOKENS overrides any of them, and sets the windows of
+# other models (Ollama, OpenAI-compatible), which are otherwise only capped by CONTEXT_MAX_TOKENS.
+_CONTEXT_WINDOWS = {
+    OpenAIModelName.GPT_4O_MINI: 128_000,
+    OpenAIModelName.GPT_4O: 128_000,
+    AzureOpenAIModelName.AZURE_GPT_4O_MINI: 128_000,
+    AzureOpenAIModelName.AZURE_GPT_4O: 128_000,
+    GoogleModelName.GEMINI_15_FLASH: 1_048_576,
+    GoogleModelName.GEMINI_20_FLASH: 1_048_576,
+}
+# Room left for the answer when a request doesn't set max_tokens
+_DEFAULT_OUTPUT_TOKENS = 4096
+# Tokens a message costs beyond its text: role, separators
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def context_budget(model_name: str, max_tokens: int | None = None) -> int:
+    """
+    Prompt tokens a call to `model_name` may use: its context window less the room
+    for the answer, and at most CONTEXT_MAX_TOKENS. The "auto" model gets the smaller
+    budget of the two models it routes between. A model whose window isn't known is
+    only capped by CONTEXT_MAX_TOKENS, and isn't budgeted at all without it.
+    """
+    if model_name == RouterModelName.AUTO and settings.ROUTER_CHEAP_MODEL and settings.ROUTER_STRONG_MODEL:
+        return min(
+            context_budget(settings.ROUTER_CHEAP_MODEL, max_tokens),
+            context_budget(settings.ROUTER_STRONG_MODEL, max_tokens),
+        )
+    window = settings.CONTEXT_WINDOW_TOKENS.get(model_name) or _CONTEXT_WINDOWS.get(model_name)
+    if window is None:
+        return settings.CONTEXT_MAX_TOKENS or sys.maxsize
+    budget = window - (max_tokens or _DEFAULT_OUTPUT_TOKENS)
+    if settings.CONTEXT_MAX_TOKENS:
+        budget = min(budget, settings.CONTEXT_MAX_TOKENS)
+    return max(budget, 0)
+
+
+def _count_tokens(message: BaseMessage) -> int:
+    # About 4 characters per token, which is close enough to budget with and needs no tokenizer
+    chars = len(message.text())
+    if isinstance(message, AIMessage) and message.tool_calls:
+        chars += len(json.dumps([(call["name"], call["args"]) for call in message.tool_calls], default=str))
+    return math.ceil(chars / 4) + _MESSAGE_OVERHEAD_TOKENS
+
+
+class TokenEstimates:
+    """Token estimates of messages, cached by message ID since messages in a thread don't change."""
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self._estimates: OrderedDict[str, int] = OrderedDict()
+        # The agents' preprocessors are sync, so they run in worker threads
+        self._lock = threading.Lock()
+
+    def __call__(self, message: BaseMessage) -> int:
+        if message.id is None:
+            return _count_tokens(message)
+        with self._lock:
+            if (tokens := self._estimates.get(message.id)) is not None:
+                self._estimates.move_to_end(message.id)
+                return tokens
+        tokens = _count_tokens(message)
+        with self._lock:
+            self._estimates[message.id] = tokens
+            while len(self._estimates) > self.max_entries:
+                self._estimates.popitem(last=False)
+        return tokens
+
+    def __len__(self) -> int:
+        return len(self._estimates)
+
+
+estimate_tokens = TokenEstimates()
+
+
+class ContextStats:
+    """Estimated prompt sizes of the model calls, before and after budgeting."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.trimmed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.messages_dropped = 0
+        self.tool_results_elided = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "trimmed": self.trimmed,
+            "avg_prompt_tokens_before": self.tokens_before / self.calls if self.calls else 0.0,
+            "avg_prompt_tokens_after": self.tokens_after / self.calls if self.calls else 0.0,
+            "messages_dropped": self.messages_dropped,
+            "tool_results_elided": self.tool_results_elided,
+        }
+
+
+context_stats = ContextStats()
+
+
+def _elide(message: ToolMessage) -> ToolMessage:
+    """`message` with its result cut to about CONTEXT_TOOL_RESULT_TOKENS."""
+    keep = settings.CONTEXT_TOOL_RESULT_TOKENS * 4
+    text = message.text()
+    if len(text) <= keep:
+        return message
+    context_stats.tool_results_elided += 1
+    elided = f"{text[:keep]}\n[... {len(text) - keep} more characters of this earlier tool result were omitted]"
+    return message.model_copy(update={"content": elided, "id": None})
+
+
+def _units(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Messages grouped so that tool calls and their results are kept or dropped together."""
+    units: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and units:
+            units[-1].append(message)
+        else:
+            units.append([message])
+    return units
+
+
+def build_context(system_prompt: str, messages: list[BaseMessage], budget: int) -> list[BaseMessage]:
+    """
+    The system prompt and as much of the thread as fits in `budget` tokens.
+
+    The current turn, from the last human message on, is always kept. If it doesn't
+    fit on its own, its tool results before the latest model call are cut to
+    CONTEXT_TOOL_RESULT_TOKENS. Earlier turns are kept newest first while they fit,
+    with their tool results cut the same way, and the context always resumes at a
+    human message. A tool call and its results are never separated.
+    """
+    system = SystemMessage(content=system_prompt)
+    system_tokens = estimate_tokens(system)
+    tokens_before = system_tokens + sum(estimate_tokens(m) for m in messages)
+    context_stats.calls += 1
+    context_stats.tokens_before += tokens_before
+    if tokens_before <= budget:
+        context_stats.tokens_after += tokens_before
+        return [system, *messages]
+
+    current = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    turn = messages[current:]
+    if system_tokens + sum(estimate_tokens(m) for m in turn) > budget:
+        # A long tool loop within the turn; the results of the latest tool calls are what the model acts on
+        latest_call = max((i for i, m in enumerate(turn) if isinstance(m, AIMessage)), default=len(turn))
+        turn = [_elide(m) if isinstance(m, ToolMessage) and i < latest_call else m for i, m in enumerate(turn)]
+    remaining = budget - system_tokens - sum(estimate_tokens(m) for m in turn)
+    earlier = [_elide(m) if isinstance(m, ToolMessage) else m for m in messages[:current]]
+    kept: list[list[BaseMessage]] = []
+    for unit in reversed(_units(earlier)):
+        tokens = sum(estimate_tokens(m) for m in unit)
+        if tokens > remaining:
+            break
+        kept.insert(0, unit)
+        remaining -= tokens
+    while kept and not isinstance(kept[0][0], HumanMessage):
+        kept.pop(0)
+
+    context = [system, *(m for unit in kept for m in unit), *turn]
+    tokens_after = sum(estimate_tokens(m) for m in context)
+    context_stats.trimmed += 1
+    context_stats.tokens_after += tokens_after
+    context_stats.messages_dropped += len(messages) + 1 - len(context)
+    logger.debug(f"Context of {tokens_before} tokens cut to {tokens_after} for a budget of {budget}")
+    return context
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import httpx
+
+from core.settings import AzureDeployment, settings
+from core.transport import shared_transport
+
+logger = logging.getLogger(__name__)
+
+# Azure OpenAI quotas are per minute, so a deployment that reported an exhausted quota is avoided this long
+_QUOTA_WINDOW_SECONDS = 60
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(response.headers[header]) / scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _header_int(response: httpx.Response, header: str) -> int | None:
+    try:
+        return int(response.headers[header])
+    except (KeyError, ValueError):
+        return None
+
+
+class Deployment:
+    """Load and health of one deployment of a model."""
+
+    def __init__(self, config: AzureDeployment) -> None:
+        self.name = config.deployment
+        self.endpoint = (config.endpoint or "").rstrip("/")
+        self.api_key = config.api_key.get_secret_value() if config.api_key else ""
+        self.weight = config.weight
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.throttled_until = 0.0
+        # From the x-ratelimit-remaining-* headers of the last response
+        self.remaining_requests: int | None = None
+        self.remaining_tokens: int | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{httpx.URL(self.endpoint).host}"
+
+    def url(self, request_url: httpx.URL) -> httpx.URL:
+        """`request_url`, which calls some deployment of the model, rewritten to call this one."""
+        _, _, tail = request_url.path.partition("/deployments/")
+        _, _, operation = tail.partition("/")
+        return httpx.URL(f"{self.endpoint}/openai/deployments/{self.name}/{operation}", params=request_url.params)
+
+    def eject(self, seconds: float, reason: str) -> None:
+        self.ejected_until = max(self.ejected_until, time.monotonic() + seconds)
+        logger.warning(f"Ejecting Azure deployment {self.key} for {seconds:.1f}s: {reason}")
+
+    def record_response(self, response: httpx.Response) -> None:
+        self.remaining_requests = _header_int(response, "x-ratelimit-remaining-requests")
+        self.remaining_tokens = _header_int(response, "x-ratelimit-remaining-tokens")
+        if self.remaining_requests == 0 or self.remaining_tokens == 0:
+            self.throttled_until = time.monotonic() + _QUOTA_WINDOW_SECONDS
+        if response.status_code == 429:
+            self.rate_limited += 1
+            retry_after = _retry_after(response)
+            self.eject(settings.AZURE_DEPLOYMENT_EJECT_SECONDS if retry_after is None else retry_after, "rate limited")
+        elif response.status_code >= 500:
+            self.record_failure(f"HTTP {response.status_code}")
+        else:
+            self.consecutive_failures = 0
+
+    def record_failure(self, reason: str) -> None:
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.AZURE_DEPLOYMENT_MAX_FAILURES:
+            self.consecutive_failures = 0
+            self.eject(settings.AZURE_DEPLOYMENT_EJECT_SECONDS, reason)
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "ejected_seconds": max(self.ejected_until - now, 0.0),
+            "throttled": self.throttled_until > now,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+        }
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that calls `on_close` once, when the response is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]) -> None:
+        self.stream = stream
+        self.on_close: Callable[[], None] | None = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+        await self.stream.aclose()
+
+
+class DeploymentRouter(httpx.AsyncBaseTransport):
+    """
+    Async transport that sends each request for a model to one of its Azure OpenAI
+    deployments, rewriting the deployment, endpoint and key of the request.
+
+    The deployment with the fewest requests in flight for its weight is picked, with
+    ties going to the one that served the fewest requests for its weight, so sequential
+    traffic is shared by weight too. Deployments are skipped while ejected, after a 429
+    or repeated errors, and avoided while their last response reported an exhausted
+    quota. A request that gets a 429, a 5xx or a connection error is retried once on
+    each other available deployment before the error is returned to the client.
+    """
+
+    def __init__(self, deployments: list[AzureDeployment]) -> None:
+        if not deployments:
+            raise ValueError("At least one deployment is required")
+        self.deployments = [Deployment(deployment) for deployment in deployments]
+
+    def pick(self, tried: list[Deployment]) -> Deployment | None:
+        now = time.monotonic()
+        candidates = [d for d in self.deployments if d not in tried]
+        available = [d for d in candidates if d.ejected_until <= now]
+        if not available:
+            # With every deployment ejected, the first attempt goes to the one back soonest
+            return min(candidates, key=lambda d: d.ejected_until) if candidates and not tried else None
+        return min(
+            available,
+            key=lambda d: (d.throttled_until > now, d.outstanding / d.weight, d.requests / d.weight),
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        content = await request.aread()
+        tried: list[Deployment] = []
+        while (deployment := self.pick(tried)) is not None:
+            tried.append(deployment)
+            headers = httpx.Headers(request.headers)
+            headers["api-key"] = deployment.api_key
+            # httpx sets the host of the rewritten URL
+            del headers["host"]
+            routed = httpx.Request(
+                request.method,
+                deployment.url(request.url),
+                headers=headers,
+                content=content,
+                extensions=request.extensions,
+            )
+            deployment.requests += 1
+            deployment.outstanding += 1
+            try:
+                response = await shared_transport(deployment.endpoint).handle_async_request(routed)
+            except httpx.TransportError as e:
+                deployment.outstanding -= 1
+                deployment.record_failure(repr(e))
+                if self.pick(tried) is None:
+                    raise
+                continue
+            except BaseException:
+                deployment.outstanding -= 1
+                raise
+            deployment.record_response(response)
+            if (response.status_code == 429 or response.status_code >= 500) and self.pick(tried) is not None:
+                await response.aclose()
+                deployment.outstanding -= 1
+                continue
+
+            def release(deployment: Deployment = deployment) -> None:
+                deployment.outstanding -= 1
+
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=_TrackedStream(response.stream, release),  # type: ignore[arg-type]
+                extensions=response.extensions,
+            )
+        raise RuntimeError("No deployment was tried")  # pick() always returns one for the first attempt
+
+    def stats(self) -> dict[str, Any]:
+        return {deployment.key: deployment.stats() for deployment in self.deployments}
+
+
+_routers: dict[str, DeploymentRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def deployment_router(model: str) -> DeploymentRouter:
+    """The router shared by every variant of `model`, over its deployments in AZURE_OPENAI_DEPLOYMENT_MAP."""
+    with _routers_lock:
+        if model not in _routers:
+            _routers[model] = DeploymentRouter(settings.azure_deployments(model))
+        return _routers[model]
+
+
+def deployment_stats() -> dict[str, dict[str, Any]]:
+    """Load, health and last reported quota of each deployment of the routed models."""
+    return {model: router.stats() for model, router in _routers.items()}
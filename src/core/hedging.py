@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from contextlib import suppress
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict, Field
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeStats:
+    """First-token latencies of a primary model, and how often its calls were hedged."""
+
+    def __init__(self) -> None:
+        self.latencies: deque[float] = deque(maxlen=settings.HEDGE_LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.backup_wins = 0
+        self.failovers = 0
+
+    def hedge_delay(self) -> float:
+        """
+        How long to wait for the primary's first token before hedging: the
+        HEDGE_PERCENTILE of recent first-token latencies. Until enough calls have been
+        seen to estimate it, HEDGE_MAX_DELAY_SECONDS.
+        """
+        if len(self.latencies) < settings.HEDGE_MIN_SAMPLES:
+            return settings.HEDGE_MAX_DELAY_SECONDS
+        latencies = sorted(self.latencies)
+        delay = latencies[min(len(latencies) - 1, int(len(latencies) * settings.HEDGE_PERCENTILE / 100))]
+        return min(max(delay, settings.HEDGE_MIN_DELAY_SECONDS), settings.HEDGE_MAX_DELAY_SECONDS)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+            "backup_wins": self.backup_wins,
+            "backup_win_rate": self.backup_wins / self.hedged if self.hedged else 0.0,
+            "failovers": self.failovers,
+            "hedge_delay_seconds": self.hedge_delay(),
+        }
+
+
+hedge_stats: dict[str, HedgeStats] = {}
+
+
+async def _close(task: asyncio.Future | None, stream: AsyncIterator) -> None:
+    """Cancel a pending read of a stream and close it, which cancels its request."""
+    if task is not None:
+        task.cancel()
+        with suppress(BaseException):
+            await task
+    with suppress(Exception):
+        await stream.aclose()
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that calls `primary` and, if no token arrives within the hedge delay,
+    also calls `backup`. Whichever streams its first token first answers the call and
+    the other request is cancelled. If the primary fails before its first token, the
+    backup is called right away.
+
+    Calls always stream from the providers, since the first token decides the winner.
+    Tokens are only passed on to callbacks when the call would have streamed anyway.
+    Sync calls aren't hedged, since a blocking request can't be cancelled: they only
+    fail over to the backup if the primary fails.
+    """
+
+    primary: BaseChatModel
+    backup: BaseChatModel
+    # Name the primary's first-token latencies and hedge counts are kept under
+    stats_key: str = Field(default="")
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"primary": self.primary.dict(), "backup": self.backup.dict()}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        # The models may be from different providers, which format tools differently
+        primary = self.primary.bind_tools(tools, **kwargs)
+        backup = self.backup.bind_tools(tools, **kwargs)
+        return self.bind(primary_kwargs=getattr(primary, "kwargs", {}), backup_kwargs=getattr(backup, "kwargs", {}))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        primary_kwargs: dict[str, Any] | None = None,
+        backup_kwargs: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        stats = hedge_stats.setdefault(self.stats_key, HedgeStats())
+        stats.calls += 1
+        start = time.monotonic()
+        hedge_at = start + stats.hedge_delay()
+
+        primary = self.primary._astream(messages, stop=stop, **{**kwargs, **(primary_kwargs or {})})
+        backup: AsyncIterator[ChatGenerationChunk] | None = None
+        reads: dict[asyncio.Future, AsyncIterator[ChatGenerationChunk]] = {
+            asyncio.ensure_future(anext(primary)): primary
+        }
+
+        def start_backup() -> None:
+            nonlocal backup
+            backup = self.backup._astream(messages, stop=stop, **{**kwargs, **(backup_kwargs or {})})
+            reads[asyncio.ensure_future(anext(backup))] = backup
+
+        winner: AsyncIterator[ChatGenerationChunk] | None = None
+        first: ChatGenerationChunk | None = None
+        hedged = False
+        try:
+            while winner is None:
+                timeout = None if backup is not None else max(hedge_at - time.monotonic(), 0)
+                done, _ = await asyncio.wait(reads, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    stats.hedged += 1
+                    start_backup()
+                    continue
+                for read in done:
+                    stream = reads.pop(read)
+                    try:
+                        first = read.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        if reads or backup is None:
+                            logger.warning(f"Model call failed before its first token, using the other model: {e}")
+                            if backup is None:
+                                stats.failovers += 1
+                                start_backup()
+                            continue
+                        raise
+                    winner = stream
+                    break
+        finally:
+            for read, stream in reads.items():
+                await _close(read, stream)
+
+        if winner is primary or hedged:
+            # If the backup won, the primary hadn't answered yet, so this is a lower bound of its latency
+            stats.latencies.append(time.monotonic() - start)
+        if winner is not primary and hedged:
+            stats.backup_wins += 1
+
+        try:
+            if first is not None:
+                yield first
+            async for chunk in winner:
+                yield chunk
+        finally:
+            await _close(None, winner)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = [chunk async for chunk in self._astream(messages, stop=stop, **kwargs)]
+        if not chunks:
+            # The winner streamed nothing, which can't be combined into a message
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=""))])
+        return generate_from_stream(iter(chunks))
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        primary_kwargs: dict[str, Any] | None = None,
+        backup_kwargs: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        stats = hedge_stats.setdefault(self.stats_key, HedgeStats())
+        stats.calls += 1
+        try:
+            return self.primary._generate(messages, stop=stop, **{**kwargs, **(primary_kwargs or {})})
+        except Exception as e:
+            logger.warning(f"Model call failed, using the other model: {e}")
+            stats.failovers += 1
+        return self.backup._generate(messages, stop=stop, **{**kwargs, **(backup_kwargs or {})})
@@ -1,12 +1,14 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import cache
-from typing import TypeAlias
+from typing import TYPE_CHECKING, Any, TypeAlias
 
-from langchain_community.chat_models import FakeListChatModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
+from langchain_core.runnables import RunnableConfig
 
+from core.cache import with_response_cache
 from core.settings import settings
+from core.transport import http_timeout, shared_transport
 from schema.models import (
     AllModelEnum,
     AzureOpenAIModelName,
@@ -15,72 +17,244 @@ from schema.models import (
     OllamaModelName,
     OpenAICompatibleName,
     OpenAIModelName,
+    Provider,
+    RouterModelName,
 )
 
 _MODEL_TABLE = {
     OpenAIModelName.GPT_4O_MINI: "gpt-4o-mini",
     OpenAIModelName.GPT_4O: "gpt-4o",
     OpenAICompatibleName.OPENAI_COMPATIBLE: settings.COMPATIBLE_MODEL,
-    AzureOpenAIModelName.AZURE_GPT_4O_MINI: settings.AZURE_OPENAI_DEPLOYMENT_MAP.get("gpt-4o-mini", ""),
-    AzureOpenAIModelName.AZURE_GPT_4O: settings.AZURE_OPENAI_DEPLOYMENT_MAP.get("gpt-4o", ""),
+    # Keys of AZURE_OPENAI_DEPLOYMENT_MAP
+    AzureOpenAIModelName.AZURE_GPT_4O_MINI: "gpt-4o-mini",
+    AzureOpenAIModelName.AZURE_GPT_4O: "gpt-4o",
     GoogleModelName.GEMINI_15_FLASH: "gemini-1.5-flash",
     GoogleModelName.GEMINI_20_FLASH: "gemini-2.0-flash",
     OllamaModelName.OLLAMA_GENERIC: "ollama",
     FakeModelName.FAKE: "fake",
+    RouterModelName.AUTO: "auto",
 }
 
-ModelT: TypeAlias = ChatOpenAI | ChatGoogleGenerativeAI | ChatOllama
+# Providers of the models that call a provider, which get its circuit breaker, see core.breaker
+_PROVIDERS = {
+    OpenAIModelName: Provider.OPENAI,
+    OpenAICompatibleName: Provider.OPENAI_COMPATIBLE,
+    AzureOpenAIModelName: Provider.AZURE_OPENAI,
+    GoogleModelName: Provider.GOOGLE,
+    OllamaModelName: Provider.OLLAMA,
+}
 
+# Provider SDKs are slow to import, so they're only imported by get_model when needed
+if TYPE_CHECKING:
+    import httpx
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_ollama import ChatOllama
+    from langchain_openai import ChatOpenAI
 
-class FakeToolModel(FakeListChatModel):
-    def __init__(self, responses: list[str]):
-        super().__init__(responses=responses)
+ModelT: TypeAlias = "ChatOpenAI | ChatGoogleGenerativeAI | ChatOllama"
 
-    def bind_tools(self, tools):
-        return self
 
+@dataclass(frozen=True)
+class ModelParams:
+    """Parameters a model is built with. Each distinct set is a separate model variant."""
 
-@cache
-def get_model(model_name: AllModelEnum, /) -> ModelT:
+    temperature: float = 0.5
+    max_tokens: int | None = None
     # NOTE: models with streaming=True will send tokens as they are generated
-    # if the /stream endpoint is called with stream_tokens=True (the default)
+    # if the /stream endpoint is called with stream_tokens=True (the default).
+    # Without it, a model only streams when a run streams its messages.
+    streaming: bool = True
+
+
+# The variants the service uses, for /stream and for /invoke
+SERVICE_MODEL_PARAMS = (ModelParams(), ModelParams(streaming=False))
+
+
+def config_model_params(config: RunnableConfig) -> ModelParams:
+    """Model parameters requested in a run's config, with the defaults for those that aren't set."""
+    configurable = config.get("configurable", {})
+    overrides = {
+        field: configurable[field]
+        for field in ("temperature", "max_tokens", "streaming")
+        if configurable.get(field) is not None
+    }
+    return ModelParams(**overrides)
+
+
+_models: OrderedDict[tuple[AllModelEnum, ModelParams], ModelT] = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def get_model(model_name: AllModelEnum, /, params: ModelParams = ModelParams()) -> ModelT:
+    """
+    The model variant for `model_name` and `params`. Variants are kept in an LRU of
+    MODEL_REGISTRY_MAX_ENTRIES, and variants of a provider endpoint share its HTTP
+    transport, see core.transport, so per-request parameters don't open new connection pools.
+
+    Models that call a provider are behind its circuit breaker, see core.breaker, and models
+    with a backup in HEDGE_BACKUP_MODELS are wrapped to hedge slow calls, see core.hedging.
+    """
+    key = (model_name, params)
+    with _models_lock:
+        if (model := _models.get(key)) is not None:
+            _models.move_to_end(key)
+            return model
+    model = _provider_model(model_name, params)
+    if backup_name := settings.HEDGE_BACKUP_MODELS.get(model_name):
+        from core.hedging import HedgedChatModel
+
+        model = with_response_cache(HedgedChatModel)(
+            primary=model, backup=_provider_model(backup_name, params), stats_key=model_name
+        )
+    with _models_lock:
+        model = _models.setdefault(key, model)
+        _models.move_to_end(key)
+        while len(_models) > settings.MODEL_REGISTRY_MAX_ENTRIES:
+            _models.popitem(last=False)
+    return model
+
+
+def _provider_model(model_name: AllModelEnum, params: ModelParams) -> ModelT:
+    """
+    The model, behind its provider's circuit breaker if CIRCUIT_BREAKER is on. While the
+    circuit is open, calls go to the model's entry in CIRCUIT_FALLBACK_MODELS, if any.
+    """
+    model = _build_model(model_name, params)
+    provider = next((p for models, p in _PROVIDERS.items() if model_name in models), None)
+    if not settings.CIRCUIT_BREAKER or provider is None:
+        return model
+
+    from core.breaker import CircuitBreakerChatModel
+
+    fallback_name = settings.CIRCUIT_FALLBACK_MODELS.get(model_name)
+    return with_response_cache(CircuitBreakerChatModel)(
+        model=model, fallback=_build_model(fallback_name, params) if fallback_name else None, provider=provider
+    )
+
+
+@cache
+def _http_clients(endpoint: str) -> "tuple[httpx.Client, httpx.AsyncClient]":
+    """HTTP clients shared by every model variant of an OpenAI API endpoint."""
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+    return (
+        DefaultHttpxClient(timeout=http_timeout()),
+        DefaultAsyncHttpxClient(transport=shared_transport(endpoint), timeout=http_timeout()),
+    )
+
+
+@cache
+def _routed_http_client(model: str) -> "httpx.AsyncClient":
+    """Async HTTP client spreading the requests of an Azure OpenAI model over its deployments, see core.deployments."""
+    from openai import DefaultAsyncHttpxClient
+
+    from core.deployments import deployment_router
+
+    return DefaultAsyncHttpxClient(transport=deployment_router(model), timeout=http_timeout())
+
+
+def _openai_client_kwargs(endpoint: str) -> dict[str, Any]:
+    http_client, http_async_client = _http_clients(endpoint)
+    # The SDK sends its own timeout with each request, so it's set on the model rather than the clients
+    return {"http_client": http_client, "http_async_client": http_async_client, "timeout": http_timeout()}
+
+
+def _build_model(model_name: AllModelEnum, params: ModelParams) -> ModelT:
+    # Models are built from with_response_cache(...) classes, which serve repeated calls
+    # from the response cache in runs of agents that opt in, see core.cache
     api_model_name = _MODEL_TABLE.get(model_name)
     if not api_model_name:
         raise ValueError(f"Unsupported model: {model_name}")
 
     if model_name in OpenAIModelName:
-        return ChatOpenAI(model=api_model_name, temperature=0.5, streaming=True)
+        from langchain_openai import ChatOpenAI
+
+        return with_response_cache(ChatOpenAI)(
+            model=api_model_name,
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,
+            streaming=params.streaming,
+            **_openai_client_kwargs("openai"),
+        )
     if model_name in OpenAICompatibleName:
         if not settings.COMPATIBLE_BASE_URL or not settings.COMPATIBLE_MODEL:
             raise ValueError("OpenAICompatible base url and endpoint must be configured")
 
-        return ChatOpenAI(
+        from langchain_openai import ChatOpenAI
+
+        return with_response_cache(ChatOpenAI)(
             model=settings.COMPATIBLE_MODEL,
-            temperature=0.5,
-            streaming=True,
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,
+            streaming=params.streaming,
             openai_api_base=settings.COMPATIBLE_BASE_URL,
             openai_api_key=settings.COMPATIBLE_API_KEY,
+            **_openai_client_kwargs(settings.COMPATIBLE_BASE_URL),
         )
     if model_name in AzureOpenAIModelName:
         if not settings.AZURE_OPENAI_API_KEY or not settings.AZURE_OPENAI_ENDPOINT:
             raise ValueError("Azure OpenAI API key and endpoint must be configured")
+        deployments = settings.azure_deployments(api_model_name)
+        if not deployments:
+            raise ValueError(f"No Azure OpenAI deployment configured for {api_model_name}")
+
+        from langchain_openai import AzureChatOpenAI
 
-        return AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            deployment_name=api_model_name,
+        # With several deployments, async requests are routed to one of them, see core.deployments.
+        # The service only calls models asynchronously, so sync calls always use the first one.
+        client_kwargs = _openai_client_kwargs(deployments[0].endpoint)
+        if len(deployments) > 1:
+            client_kwargs["http_async_client"] = _routed_http_client(api_model_name)
+        return with_response_cache(AzureChatOpenAI)(
+            azure_endpoint=deployments[0].endpoint,
+            deployment_name=deployments[0].deployment,
+            api_key=deployments[0].api_key,
             api_version=settings.AZURE_OPENAI_API_VERSION,
-            temperature=0.5,
-            streaming=True,
-            timeout=60,
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,
+            streaming=params.streaming,
             max_retries=3,
+            **client_kwargs,
         )
+    # The Gemini and Ollama models below only stream when a run streams its messages
     if model_name in GoogleModelName:
-        return ChatGoogleGenerativeAI(model=api_model_name, temperature=0.5, streaming=True)
+        # Gemini is called over gRPC, so it doesn't use the shared HTTP transports
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return with_response_cache(ChatGoogleGenerativeAI)(
+            model=api_model_name, temperature=params.temperature, max_output_tokens=params.max_tokens
+        )
     if model_name in OllamaModelName:
+        from langchain_ollama import ChatOllama
+        from ollama import AsyncClient
+
+        model_class = with_response_cache(ChatOllama)
+        kwargs: dict[str, Any] = {
+            "temperature": params.temperature,
+            "num_predict": params.max_tokens,
+            "client_kwargs": {"timeout": http_timeout()},
+        }
         if settings.OLLAMA_BASE_URL:
-            chat_ollama = ChatOllama(model=settings.OLLAMA_MODEL, temperature=0.5, base_url=settings.OLLAMA_BASE_URL)
+            chat_ollama = model_class(model=settings.OLLAMA_MODEL, base_url=settings.OLLAMA_BASE_URL, **kwargs)
         else:
-            chat_ollama = ChatOllama(model=settings.OLLAMA_MODEL, temperature=0.5)
+            chat_ollama = model_class(model=settings.OLLAMA_MODEL, **kwargs)
+        # client_kwargs go to both the sync and the async client, so the async transport is set separately
+        chat_ollama._async_client = AsyncClient(
+            host=settings.OLLAMA_BASE_URL,
+            transport=shared_transport(settings.OLLAMA_BASE_URL or "ollama"),
+            timeout=http_timeout(),
+        )
         return chat_ollama
+    if model_name in RouterModelName:
+        if settings.ROUTER_CHEAP_MODEL is None or settings.ROUTER_STRONG_MODEL is None:
+            raise ValueError("Router cheap and strong models must be configured")
+
+        from core.router import RouterChatModel
+
+        return with_response_cache(RouterChatModel)(
+            cheap=get_model(settings.ROUTER_CHEAP_MODEL, params), strong=get_model(settings.ROUTER_STRONG_MODEL, params)
+        )
     if model_name in FakeModelName:
-        return FakeToolModel(responses=["This is a test response from the fake model."])
+        from core.fake_model import FakeToolModel
+
+        return with_response_cache(FakeToolModel)(responses=["This is a test response from the fake model."])
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Any
+
+import httpx
+
+from core.settings import settings
+
+# Quotas without a reset header (Azure OpenAI) refill over a minute
+_DEFAULT_WINDOW_SECONDS = 60
+# OpenAI reset durations, e.g. "20ms", "1.5s" or "6m0s"
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _duration(value: str | None) -> float | None:
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Budget:
+    """
+    One quota of a provider, requests or tokens, as a bucket that refills at a constant
+    rate up to its limit. The provider's x-ratelimit-* headers reset the bucket, so it
+    follows the provider's own accounting rather than drifting from it.
+
+    What admitted requests take stays reserved until their response arrives. The
+    provider hasn't counted the requests still in flight when it reports what remains,
+    so their reservations are taken from the reported level.
+    """
+
+    def __init__(self) -> None:
+        self.limit: float | None = None
+        self.level = 0.0
+        self.rate = 0.0
+        self.in_flight = 0.0
+        self._updated = time.monotonic()
+
+    @property
+    def known(self) -> bool:
+        return self.limit is not None
+
+    def _refill(self, now: float) -> None:
+        if self.limit is not None:
+            self.level = min(self.level + self.rate * (now - self._updated), self.limit)
+        self._updated = now
+
+    def update(self, limit: float | None, remaining: float, reset: float | None, now: float) -> None:
+        # Without a limit header, the most seen remaining is the best estimate of the limit
+        self.limit = limit if limit is not None else max(self.limit or 0.0, remaining)
+        self.level = remaining - self.in_flight
+        self._updated = now
+        if reset:
+            self.rate = max(self.limit - remaining, 1.0) / reset
+        else:
+            self.rate = self.limit / _DEFAULT_WINDOW_SECONDS
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` can be taken, which is 0 if it can be now."""
+        if self.limit is None:
+            return 0.0
+        self._refill(now)
+        # A cost above the limit would never fit, so it waits for a full bucket instead
+        missing = min(cost, self.limit) - self.level
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else _DEFAULT_WINDOW_SECONDS
+
+    def take(self, cost: float) -> float:
+        """Reserve `cost`, returning the amount reserved, to `settle` when the response arrives."""
+        if self.limit is None:
+            return 0.0
+        reserved = min(cost, self.limit)
+        self.level -= reserved
+        self.in_flight += reserved
+        return reserved
+
+    def settle(self, reserved: float, refund: bool = False) -> None:
+        """End a reservation. Refund it if the request never reached the provider."""
+        self.in_flight = max(self.in_flight - reserved, 0.0)
+        if refund and self.limit is not None:
+            self._refill(time.monotonic())
+            self.level = min(self.level + reserved, self.limit)
+
+
+# What an admitted request reserved of the request and token budgets
+Reservation = tuple[float, float]
+
+
+class RateLimitScheduler:
+    """
+    Admits the requests of one provider quota (an OpenAI model, an Azure deployment)
+    within its request and token budgets, queueing the rest first in, first out.
+
+    Until the provider has reported its quota, requests are admitted right away. A 429
+    pauses the quota for the response's Retry-After, so the clients' retries wait in
+    the queue instead of all hitting the provider again.
+    """
+
+    def __init__(self) -> None:
+        self.requests = Budget()
+        self.tokens = Budget()
+        self.paused_until = 0.0
+        self._waiters: deque[tuple[float, asyncio.Future]] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now), 0.0)
+
+    def _admit(self, tokens: float) -> Reservation:
+        self.admitted += 1
+        return self.requests.take(1), self.tokens.take(tokens)
+
+    async def acquire(self, tokens: float) -> Reservation:
+        """
+        Wait until a request estimated to use `tokens` fits the budgets, and reserve
+        them. The reservation must be passed to `update` or `release` afterwards.
+        """
+        now = time.monotonic()
+        if not self._waiters and self._wait_time(tokens, now) == 0:
+            return self._admit(tokens)
+        future: asyncio.Future[Reservation] = asyncio.get_running_loop().create_future()
+        waiter = (tokens, future)
+        self._waiters.append(waiter)
+        self.queued += 1
+        self._schedule()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # `_schedule` may already have dropped it from the queue
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._schedule()
+            else:
+                # Cancelled after being admitted, so the request is never sent
+                self.release(future.result(), refund=True)
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - now
+
+    def release(self, reservation: Reservation, refund: bool = False) -> None:
+        """End the reservation of a request that got no response, refunding it if it was never sent."""
+        self.requests.settle(reservation[0], refund)
+        self.tokens.settle(reservation[1], refund)
+        if refund and self._waiters:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        """Admit the waiters at the head of the queue that fit, and set a timer for the next one."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            tokens, future = self._waiters[0]
+            if future.done():
+                # Cancelled while queued
+                self._waiters.popleft()
+                continue
+            wait = self._wait_time(tokens, time.monotonic())
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._schedule)
+                return
+            self._waiters.popleft()
+            future.set_result(self._admit(tokens))
+
+    def update(self, response: httpx.Response, reservation: Reservation) -> None:
+        """End the reservation of the request `response` answers, and apply the response's headers."""
+        self.requests.settle(reservation[0])
+        self.tokens.settle(reservation[1])
+        headers = response.headers
+        now = time.monotonic()
+        for name, budget in (("requests", self.requests), ("tokens", self.tokens)):
+            remaining = _number(headers.get(f"x-ratelimit-remaining-{name}"))
+            if remaining is not None:
+                limit = _number(headers.get(f"x-ratelimit-limit-{name}"))
+                budget.update(limit, remaining, _duration(headers.get(f"x-ratelimit-reset-{name}")), now)
+        if response.status_code == 429:
+            self.rate_limited += 1
+            retry_after = _number(headers.get("retry-after-ms"))
+            retry_after = retry_after / 1000 if retry_after is not None else _duration(headers.get("retry-after"))
+            self.paused_until = max(self.paused_until, now + (retry_after or 1.0))
+        if self._waiters:
+            self._schedule()
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "requests_limit": self.requests.limit,
+            "requests_available": self.requests.level if self.requests.known else None,
+            "tokens_limit": self.tokens.limit,
+            "tokens_available": self.tokens.level if self.tokens.known else None,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rate_limited": self.rate_limited,
+            "paused_seconds": max(self.paused_until - now, 0.0),
+            "wait_seconds": self.wait_seconds,
+        }
+
+
+def _quota(request: httpx.Request, body: dict[str, Any]) -> str:
+    """The quota a request counts against: the deployment for Azure OpenAI, else the model."""
+    _, _, tail = request.url.path.partition("/deployments/")
+    return tail.partition("/")[0] or str(body.get("model", ""))
+
+
+def _estimated_tokens(content: bytes, body: dict[str, Any]) -> float:
+    """Tokens a provider counts a request for: about one per 4 bytes of prompt, plus the completion it allows."""
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or 0
+    return len(content) / 4 + (completion if isinstance(completion, int) else 0)
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async transport that schedules the requests to an endpoint within its providers' quotas, see RateLimitScheduler."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+        self.schedulers: dict[str, RateLimitScheduler] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        content = await request.aread()
+        try:
+            body = json.loads(content) if content else {}
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+        scheduler = self.schedulers.setdefault(_quota(request, body), RateLimitScheduler())
+        reservation = await scheduler.acquire(_estimated_tokens(content, body))
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            # The provider may have counted the request, so its budget isn't refunded
+            scheduler.release(reservation)
+            raise
+        scheduler.update(response, reservation)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {quota: scheduler.stats() for quota, scheduler in self.schedulers.items()}
+
+
+_transports: dict[str, RateLimitedTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def rate_limited_transport(endpoint: str, transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """`transport` of `endpoint` behind its rate limit scheduler, unless RATE_LIMIT_SCHEDULER is off."""
+    if not settings.RATE_LIMIT_SCHEDULER:
+        return transport
+    with _transports_lock:
+        if endpoint not in _transports:
+            _transports[endpoint] = RateLimitedTransport(transport)
+        return _transports[endpoint]
+
+
+def rate_limit_stats() -> dict[str, dict[str, dict[str, Any]]]:
+    """Budgets and queueing of each quota, by provider endpoint."""
+    return {endpoint: transport.stats() for endpoint, transport in _transports.items()}
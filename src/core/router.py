@@ -0,0 +1,281 @@
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, Literal
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict
+
+from core.settings import settings
+
+# Routing decisions and feedback as JSON, written to ROUTER_LOG_PATH if it's set
+decision_logger = logging.getLogger(f"{__name__}.decisions")
+
+Tier = Literal["cheap", "strong"]
+
+# Words that ask for reasoning rather than lookup or chit-chat, in English and Vietnamese
+_REASONING = re.compile(
+    r"\b(why|explain|compare|analy[sz]e|evaluate|plan|step by step|prove|derive|code|"
+    r"tại sao|vì sao|giải thích|so sánh|phân tích|đánh giá|kế hoạch)\b",
+    re.IGNORECASE,
+)
+_MATH = re.compile(r"\d+\s*[-+*/^%]\s*\d+")
+
+# Weights of the turn features in the complexity score, which is between 0 and 1
+_WEIGHTS = {
+    "length": 0.35,
+    "depth": 0.15,
+    "tools": 0.15,
+    "reasoning": 0.25,
+    "math": 0.1,
+}
+
+
+def turn_features(messages: list[BaseMessage], tools_bound: bool) -> dict[str, float]:
+    """Cheap local features of a model call, each between 0 and 1."""
+    last_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    text = last_human.text() if last_human is not None else ""
+    return {
+        "length": min(len(text) / 800, 1.0),
+        "depth": min(sum(isinstance(m, HumanMessage) for m in messages) / 10, 1.0),
+        # Choosing tools and their arguments is harder than answering from tool results
+        "tools": float(tools_bound and not isinstance(messages[-1], ToolMessage)),
+        "reasoning": min(len(_REASONING.findall(text)) / 2, 1.0),
+        "math": float(bool(_MATH.search(text))),
+    }
+
+
+def complexity_score(features: dict[str, float]) -> float:
+    return sum(_WEIGHTS[name] * value for name, value in features.items())
+
+
+def tunes_routing(key: str) -> bool:
+    """Whether feedback with this key adjusts the threshold, see ROUTER_FEEDBACK_KEYS."""
+    return settings.ROUTER_FEEDBACK_KEYS is None or key in settings.ROUTER_FEEDBACK_KEYS
+
+
+def threshold_change(tier: Tier, score: float) -> float:
+    """How much feedback between 0 (bad) and 1 (good) on a run answered by `tier` moves the threshold."""
+    if tier != "cheap":
+        return 0.0
+    step = settings.ROUTER_FEEDBACK_STEP
+    return -step if score < 0.5 else step / 4
+
+
+def log_feedback(run_id: str, key: str, tier: Tier, score: float) -> None:
+    decision_logger.info(
+        json.dumps(
+            {"event": "feedback", "time": time.time(), "run_id": run_id, "key": key, "tier": tier, "score": score}
+        )
+    )
+
+
+class ModelRouter:
+    """
+    Routing state shared by every "auto" model: the threshold, which feedback adjusts,
+    and the recent latency of each tier.
+
+    Negative feedback on a run answered by the cheap model lowers the threshold, so
+    more turns go to the strong model, and positive feedback raises it slowly. The
+    slower the strong model is compared to the cheap one, the higher the threshold.
+
+    With several workers, the decisions and the threshold are shared through
+    `memory.routing.RoutingStore`, since feedback may reach any worker.
+    """
+
+    def __init__(self, max_decisions: int = 10_000) -> None:
+        self.threshold = settings.ROUTER_THRESHOLD
+        self.latency: dict[tuple[Tier, bool], float] = {}
+        self.routed = {"cheap": 0, "strong": 0}
+        # Tier that answered each run, so feedback on the run can be attributed
+        self._decisions: OrderedDict[str, Tier] = OrderedDict()
+        self._max_decisions = max_decisions
+        # Feedback keys already counted for each run
+        self._rated: dict[str, set[str]] = {}
+        # Decisions not yet saved to the shared store
+        self._unsaved: dict[str, Tier] = {}
+
+    def effective_threshold(self, streaming: bool) -> float:
+        cheap = self.latency.get(("cheap", streaming))
+        strong = self.latency.get(("strong", streaming))
+        penalty = settings.ROUTER_LATENCY_WEIGHT * math.log(strong / cheap) if cheap and strong else 0.0
+        return min(max(self.threshold + max(penalty, 0.0), 0.0), 1.0)
+
+    def route(self, messages: list[BaseMessage], tools_bound: bool, streaming: bool, run_id: str | None) -> Tier:
+        features = turn_features(messages, tools_bound)
+        score = complexity_score(features)
+        threshold = self.effective_threshold(streaming)
+        tier: Tier = "strong" if score >= threshold else "cheap"
+        self.routed[tier] += 1
+        if run_id is not None:
+            self._decisions[run_id] = tier
+            self._decisions.move_to_end(run_id)
+            self._unsaved[run_id] = tier
+            while len(self._decisions) > self._max_decisions:
+                evicted, _ = self._decisions.popitem(last=False)
+                self._rated.pop(evicted, None)
+                self._unsaved.pop(evicted, None)
+        decision_logger.info(
+            json.dumps(
+                {
+                    "event": "route",
+                    "time": time.time(),
+                    "run_id": run_id,
+                    "tier": tier,
+                    "score": round(score, 4),
+                    "threshold": round(threshold, 4),
+                    "features": features,
+                }
+            )
+        )
+        return tier
+
+    def record_latency(self, tier: Tier, streaming: bool, seconds: float) -> None:
+        """Exponentially weighted latency of a tier: time to first token when streaming, else the whole call."""
+        key = (tier, streaming)
+        previous = self.latency.get(key)
+        self.latency[key] = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+
+    def unsaved_decisions(self) -> dict[str, Tier]:
+        """Decisions made since the last call, to save to the shared store."""
+        unsaved, self._unsaved = self._unsaved, {}
+        return unsaved
+
+    def record_feedback(self, run_id: str, key: str, score: float) -> None:
+        """
+        Adjust the threshold from feedback between 0 (bad) and 1 (good) on a run this
+        process routed. Each feedback key counts once per run.
+        """
+        tier = self._decisions.get(run_id)
+        if tier is None or not tunes_routing(key) or key in self._rated.get(run_id, set()):
+            return
+        self._rated.setdefault(run_id, set()).add(key)
+        self.threshold = min(max(self.threshold + threshold_change(tier, score), 0.0), 1.0)
+        log_feedback(run_id, key, tier, score)
+
+    def stats(self) -> dict[str, Any]:
+        latency = {f"{tier}_{'stream' if streaming else 'invoke'}": s for (tier, streaming), s in self.latency.items()}
+        return {"threshold": self.threshold, "routed": dict(self.routed), "latency_seconds": latency}
+
+
+model_router = ModelRouter()
+
+if settings.ROUTER_LOG_PATH:
+    _handler = logging.FileHandler(settings.ROUTER_LOG_PATH)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    decision_logger.addHandler(_handler)
+    decision_logger.setLevel(logging.INFO)
+    decision_logger.propagate = False
+
+
+class RouterChatModel(BaseChatModel):
+    """
+    Chat model that answers each call with `cheap` or `strong`, depending on the
+    complexity score of the conversation so far, see `ModelRouter`.
+
+    Calls are attributed to the service run in the config's `run_id`, so feedback on
+    the run can adjust the routing.
+    """
+
+    cheap: BaseChatModel
+    strong: BaseChatModel
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "router"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"cheap": self.cheap.dict(), "strong": self.strong.dict()}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        # The models may be from different providers, which format tools differently
+        cheap = self.cheap.bind_tools(tools, **kwargs)
+        strong = self.strong.bind_tools(tools, **kwargs)
+        return self.bind(cheap_kwargs=getattr(cheap, "kwargs", {}), strong_kwargs=getattr(strong, "kwargs", {}))
+
+    async def _agenerate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # The streaming path of BaseChatModel doesn't pass the run manager on, so the run ID is passed as a kwarg
+        run_id = run_manager.metadata.get("run_id") if run_manager else None
+        return await super()._agenerate_with_cache(
+            messages, stop=stop, run_manager=run_manager, routed_run_id=run_id, **kwargs
+        )
+
+    def _generate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        run_id = run_manager.metadata.get("run_id") if run_manager else None
+        return super()._generate_with_cache(messages, stop=stop, run_manager=run_manager, routed_run_id=run_id, **kwargs)
+
+    def _pick(
+        self, messages: list[BaseMessage], streaming: bool, kwargs: dict[str, Any]
+    ) -> tuple[Tier, BaseChatModel, dict[str, Any]]:
+        cheap_kwargs = kwargs.pop("cheap_kwargs", None)
+        strong_kwargs = kwargs.pop("strong_kwargs", None)
+        run_id = kwargs.pop("routed_run_id", None)
+        tier = model_router.route(messages, cheap_kwargs is not None, streaming, run_id)
+        if tier == "cheap":
+            return tier, self.cheap, {**kwargs, **(cheap_kwargs or {})}
+        return tier, self.strong, {**kwargs, **(strong_kwargs or {})}
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tier, model, kwargs = self._pick(messages, True, kwargs)
+        start = time.monotonic()
+        first = True
+        async for chunk in model._astream(messages, stop=stop, **kwargs):
+            if first:
+                model_router.record_latency(tier, True, time.monotonic() - start)
+                first = False
+            yield chunk
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tier, model, kwargs = self._pick(messages, False, kwargs)
+        start = time.monotonic()
+        result = await model._agenerate(messages, stop=stop, **kwargs)
+        model_router.record_latency(tier, False, time.monotonic() - start)
+        return result
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tier, model, kwargs = self._pick(messages, False, kwargs)
+        start = time.monotonic()
+        result = model._generate(messages, stop=stop, **kwargs)
+        model_router.record_latency(tier, False, time.monotonic() - start)
+        return result
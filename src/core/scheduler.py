@@ -0,0 +1,89 @@
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from langchain_core.runnables import RunnableConfig
+
+from core.settings import settings
+from schema import Priority
+
+
+def config_priority(config: RunnableConfig | None) -> Priority:
+    """Priority of the run a node is executing in. Runs without one are interactive."""
+    return Priority((config or {}).get("configurable", {}).get("priority", Priority.INTERACTIVE))
+
+
+class PriorityScheduler:
+    """
+    Grants up to `slots` concurrent holders, serving interactive waiters before batch ones.
+
+    To keep batch work from starving, a batch waiter that has waited longer than
+    `max_wait` seconds is served before any interactive waiter. `slots=0` disables the
+    limit and every caller is admitted immediately.
+    """
+
+    def __init__(self, slots: int, max_wait: float) -> None:
+        self.slots = slots
+        self.max_wait = max_wait
+        self.in_use = 0
+        self._waiters: dict[Priority, deque[tuple[float, asyncio.Future]]] = {p: deque() for p in Priority}
+        self.granted: dict[Priority, int] = {p: 0 for p in Priority}
+
+    def waiting(self, priority: Priority) -> int:
+        return len(self._waiters[priority])
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+        if self.slots <= 0:
+            yield
+            return
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self.in_use < self.slots and not any(self._waiters.values()):
+            self.in_use += 1
+            self.granted[priority] += 1
+            return
+        loop = asyncio.get_running_loop()
+        waiter = (loop.time(), loop.create_future())
+        self._waiters[priority].append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].cancelled():
+                # `_release` may already have dropped it from the queue
+                if waiter in self._waiters[priority]:
+                    self._waiters[priority].remove(waiter)
+            else:
+                # The slot was granted as the caller was cancelled, so hand it on
+                self._release()
+            raise
+        self.granted[priority] += 1
+
+    def _release(self) -> None:
+        self.in_use -= 1
+        while self.in_use < self.slots and (future := self._next_waiter()):
+            self.in_use += 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        # Waiters cancelled while queued still have to remove themselves
+        for waiters in self._waiters.values():
+            while waiters and waiters[0][1].done():
+                waiters.popleft()
+        interactive = self._waiters[Priority.INTERACTIVE]
+        batch = self._waiters[Priority.BATCH]
+        if batch and (not interactive or asyncio.get_running_loop().time() - batch[0][0] >= self.max_wait):
+            return batch.popleft()[1]
+        if interactive:
+            return interactive.popleft()[1]
+        return None
+
+
+model_scheduler = PriorityScheduler(settings.MODEL_CONCURRENCY, settings.PRIORITY_MAX_WAIT_SECONDS)
+tool_scheduler = PriorityScheduler(settings.TOOL_CONCURRENCY, settings.PRIORITY_MAX_WAIT_SECONDS)
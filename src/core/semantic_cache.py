@@ -0,0 +1,139 @@
+import re
+import time
+import unicodedata
+import zlib
+from typing import Any
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+# Function words that paraphrases add or drop freely ("can you tell me", "please", "hãy cho tôi biết").
+# Negations are kept, since they change the meaning.
+STOP_WORDS = frozenset(
+    "a an the of in on at for to from by about me you can could would will please tell give show "
+    "what which was is are be do does did i my your it and or some any "
+    "của là gì cho tôi bạn mình có được và với trong về những các một hãy giúp xin vui lòng biết ạ nhé".split()
+)
+
+
+class HashedNgramEmbedder:
+    """
+    Offline text embedding: word unigrams and bigrams plus character trigrams of the
+    words left after dropping stop words, hashed into `dim` signed buckets and
+    L2-normalized. Paraphrases that share most of their content words and word
+    fragments end up with a high cosine similarity.
+    """
+
+    def __init__(self, dim: int = 1024) -> None:
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> list[str]:
+        text = unicodedata.normalize("NFC", text).lower()
+        words = [w for w in _WORD.findall(text) if w not in STOP_WORDS]
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            features += [f"c:{padded[i : i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        hashes = np.array([zlib.crc32(f.encode()) for f in self.features(text)], dtype=np.uint32)
+        if hashes.size:
+            # The top bit picks the sign, so colliding features tend to cancel out rather than add up
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(vector, hashes % self.dim, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Cache of answers looked up by the meaning of the question rather than its exact text.
+
+    Entries live in a preallocated matrix of embeddings, so a lookup is a single
+    matrix-vector product over every entry. A lookup hits if the most similar entry in
+    the same namespace has a cosine similarity of at least `threshold` and hasn't
+    outlived `ttl` seconds. When full, the least recently used entry is replaced.
+
+    Questions only match if they contain the same numbers, since "revenue in 2023" and
+    "revenue in 2024" are lexically almost identical but need different answers.
+    """
+
+    def __init__(self, capacity: int, threshold: float, ttl: float, embedder: HashedNgramEmbedder | None = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.hits = 0
+        self.misses = 0
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._namespaces = np.full(capacity, -1, dtype=np.int64)
+        self._numbers = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._values: list[Any] = [None] * capacity
+        self._namespace_ids: dict[str, int] = {}
+        self._size = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
+
+    @staticmethod
+    def _numbers_key(text: str) -> int:
+        numbers = sorted(set(_NUMBER.findall(text)))
+        return zlib.crc32(" ".join(numbers).encode())
+
+    def _search(self, namespace: str, text: str, vector: np.ndarray, now: float) -> tuple[int, float]:
+        """Index and similarity of the closest live entry that can answer `text`, or (-1, 0) if there is none."""
+        namespace_id = self._namespace_ids.get(namespace)
+        if namespace_id is None or not self._size:
+            return -1, 0.0
+        size = self._size
+        scores = self._vectors[:size] @ vector
+        live = (
+            (self._namespaces[:size] == namespace_id)
+            & (self._numbers[:size] == self._numbers_key(text))
+            & (self._expires_at[:size] > now)
+        )
+        scores = np.where(live, scores, -np.inf)
+        index = int(np.argmax(scores))
+        return (index, float(scores[index])) if live[index] else (-1, 0.0)
+
+    def get(self, namespace: str, text: str) -> Any | None:
+        now = time.time()
+        index, score = self._search(namespace, text, self.embedder.embed(text), now)
+        if index < 0 or score < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._last_used[index] = now
+        return self._values[index]
+
+    def set(self, namespace: str, text: str, value: Any) -> None:
+        now = time.time()
+        vector = self.embedder.embed(text)
+        index, score = self._search(namespace, text, vector, now)
+        if index < 0 or score < 1.0 - 1e-6:
+            # Not already cached, so take a free slot or the least recently used one
+            if self._size < self.capacity:
+                index = self._size
+                self._size += 1
+            else:
+                index = int(np.argmin(self._last_used))
+        self._vectors[index] = vector
+        self._namespaces[index] = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+        self._numbers[index] = self._numbers_key(text)
+        self._expires_at[index] = now + self.ttl
+        self._last_used[index] = now
+        self._values[index] = value
@@ -4,6 +4,7 @@ from typing import Annotated, Any
 
 from dotenv import find_dotenv
 from pydantic import (
+    BaseModel,
     BeforeValidator,
     Field,
     HttpUrl,
@@ -22,7 +23,9 @@ from schema.models import (
     OpenAICompatibleName,
     OpenAIModelName,
     Provider,
+    RouterModelName,
 )
+from schema.schema import Durability
 
 
 class DatabaseType(StrEnum):
@@ -35,6 +38,16 @@ def check_str_is_http(x: str) -> str:
     return str(http_url_adapter.validate_python(x))
 
 
+class AzureDeployment(BaseModel):
+    """An Azure OpenAI deployment of a model. Endpoint and key default to AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY."""
+
+    deployment: str
+    endpoint: str | None = None
+    api_key: SecretStr | None = None
+    # Share of requests relative to the model's other deployments
+    weight: float = Field(default=1, gt=0)
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=find_dotenv(),
@@ -47,8 +60,19 @@ class Settings(BaseSettings):
 
     HOST: str = "0.0.0.0"
     PORT: int = 8080
+    # On shutdown, in-flight runs get this long from SIGTERM to finish before they are cancelled.
+    # Cancelling them and closing the checkpointer takes up to 5s more, which must fit in the
+    # container's stop grace period (40s in compose.yaml).
+    SHUTDOWN_GRACE_SECONDS: int = 30
+    # With more than one worker, run_service.py starts a router on HOST:PORT that sends each
+    # thread_id to the same worker process. Workers listen on 127.0.0.1 from WORKER_BASE_PORT
+    # (PORT + 1 if unset).
+    WORKERS: int = 1
+    WORKER_BASE_PORT: int | None = None
 
     AUTH_SECRET: SecretStr | None = None
+    # Requests authenticated with this key are always scheduled as batch work
+    BATCH_AUTH_SECRET: SecretStr | None = None
 
     OPENAI_API_KEY: SecretStr | None = None
     GOOGLE_API_KEY: SecretStr | None = None
@@ -59,12 +83,107 @@ class Settings(BaseSettings):
     # If DEFAULT_MODEL is None, it will be set in model_post_init
     DEFAULT_MODEL: AllModelEnum | None = None  # type: ignore[assignment]
     AVAILABLE_MODELS: set[AllModelEnum] = set()  # type: ignore[assignment]
+    # Model variants (a model with a set of parameters such as temperature) kept built at once
+    MODEL_REGISTRY_MAX_ENTRIES: int = 32
+
+    # The "auto" model routes each turn to the cheap or the strong model by its complexity score,
+    # see core.router. Defaults to gpt-4o-mini and gpt-4o of the first provider that has both.
+    ROUTER_CHEAP_MODEL: AllModelEnum | None = None  # type: ignore[assignment]
+    ROUTER_STRONG_MODEL: AllModelEnum | None = None  # type: ignore[assignment]
+    # Turns scoring at least this use the strong model. Adjusted by feedback on routed runs,
+    # and the adjusted threshold is kept in the database, so this is only its starting value.
+    ROUTER_THRESHOLD: float = 0.5
+    # Feedback keys that adjust the threshold. If None, feedback with any key does.
+    ROUTER_FEEDBACK_KEYS: set[str] | None = None
+    # How much the threshold moves per feedback, and how much a slower strong model raises it
+    ROUTER_FEEDBACK_STEP: float = 0.02
+    ROUTER_LATENCY_WEIGHT: float = 0.1
+    # Append every routing decision and feedback as JSON lines to this file, for analysis
+    ROUTER_LOG_PATH: str | None = None
+
+    # Agents served by this deployment. If None, all agents are enabled.
+    ENABLED_AGENTS: set[str] | None = None
+    # Build models, bind tools and dry-run agents at startup before /ready passes
+    WARMUP: bool = True
+    # How often each worker publishes its runs' progress and picks up cancellations from other workers
+    RUN_SYNC_INTERVAL_SECONDS: float = 1
+    # Runs whose worker stopped refreshing them for this long are considered interrupted by a crash
+    RUN_ORPHAN_TIMEOUT_SECONDS: float = 30
+    # Resume interrupted runs from their last checkpoint automatically, rather than waiting for a client to
+    RESUME_INTERRUPTED_RUNS: bool = False
+    # Poll the source files of loaded agents this often and reload agents that changed. 0 disables.
+    AGENT_RELOAD_INTERVAL_SECONDS: float = 0
 
     # Set openai compatible api, mainly used for proof of concept
     COMPATIBLE_MODEL: str | None = None
     COMPATIBLE_API_KEY: SecretStr | None = None
     COMPATIBLE_BASE_URL: str | None = None
 
+    # Cache model responses to identical calls, for agents that opt in. RESPONSE_CACHE_PATH adds
+    # a SQLite file behind the in-memory LRU, shared across restarts and workers.
+    RESPONSE_CACHE: bool = False
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600
+    RESPONSE_CACHE_PATH: str | None = None
+
+    # Answer stateless turns (ephemeral runs) of agents that opt in from earlier answers to
+    # similar questions, without running the agent. Each entry takes about 4 KB of memory.
+    SEMANTIC_CACHE: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9
+    SEMANTIC_CACHE_CAPACITY: int = 5000
+    SEMANTIC_CACHE_TTL_SECONDS: float = 3600
+
+    # Hedge calls to the models in HEDGE_BACKUP_MODELS, a JSON map of model to backup model: if no
+    # token arrives within the HEDGE_PERCENTILE of the model's recent first-token latencies (clamped
+    # to the min and max delay), the backup is called too and whichever streams first is used.
+    HEDGE_BACKUP_MODELS: dict[str, str] = {}
+    HEDGE_PERCENTILE: float = 95
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    HEDGE_MAX_DELAY_SECONDS: float = 10
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_LATENCY_WINDOW: int = 500
+
+    # Circuit breaker of each model provider. Transport errors, timeouts, 429s and 5xx, and streams slower
+    # than CIRCUIT_SLOW_CALL_SECONDS to their first token, are failures; when CIRCUIT_FAILURE_RATE of at least
+    # CIRCUIT_MIN_CALLS calls in the window fail, the provider's calls fail fast, or go to the model's
+    # entry in CIRCUIT_FALLBACK_MODELS, for CIRCUIT_OPEN_SECONDS. Then a probe call decides whether to close.
+    CIRCUIT_BREAKER: bool = True
+    CIRCUIT_WINDOW_SECONDS: float = 60
+    CIRCUIT_MIN_CALLS: int = 5
+    CIRCUIT_FAILURE_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 30
+    CIRCUIT_OPEN_SECONDS: float = 30
+    CIRCUIT_FALLBACK_MODELS: dict[str, str] = {}
+
+    # Connection pool shared by the models of each provider endpoint. HTTP2 needs `pip install httpx[http2]`.
+    # The read timeout applies between received bytes, so streamed responses can take longer.
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60
+    HTTP2: bool = False
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_READ_TIMEOUT_SECONDS: float = 120
+    # Queue model requests that would exceed the request and token quotas the providers report
+    # in their x-ratelimit-* headers, and hold all requests to a quota for the Retry-After of a 429.
+    RATE_LIMIT_SCHEDULER: bool = True
+
+    # Prompts of the ReAct agents keep the system prompt and the current turn, then as many earlier
+    # turns as fit the model's context window (CONTEXT_WINDOW_TOKENS overrides the built-in sizes, by
+    # model name) less the room for the answer, and at most CONTEXT_MAX_TOKENS (0 for no cap). Models
+    # without a known window (Ollama, OpenAI-compatible) are only capped by CONTEXT_MAX_TOKENS. Tool
+    # results of earlier turns, and of earlier steps of a current turn too long to fit, are cut to
+    # CONTEXT_TOOL_RESULT_TOKENS.
+    CONTEXT_MAX_TOKENS: int = 32_000
+    CONTEXT_WINDOW_TOKENS: dict[str, int] = {}
+    CONTEXT_TOOL_RESULT_TOKENS: int = 1000
+
+    # Concurrent model calls and tool calls across all runs. 0 means unlimited.
+    # Waiting interactive requests are granted slots before batch requests, unless a
+    # batch request has waited longer than PRIORITY_MAX_WAIT_SECONDS.
+    MODEL_CONCURRENCY: int = 0
+    TOOL_CONCURRENCY: int = 0
+    PRIORITY_MAX_WAIT_SECONDS: float = 30
+
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_PROJECT: str = "default"
     LANGCHAIN_ENDPOINT: Annotated[str, BeforeValidator(check_str_is_http)] = "https://api.smith.langchain.com"
@@ -73,6 +192,17 @@ class Settings(BaseSettings):
     # Database Configuration
     DATABASE_TYPE: DatabaseType = DatabaseType.SQLITE  # Options: DatabaseType.SQLITE or DatabaseType.POSTGRES
     SQLITE_DB_PATH: str = "checkpoints.db"
+    # Default checkpoint durability for agents that don't set their own
+    CHECKPOINT_DURABILITY: Durability = Durability.ASYNC
+    # Group-commit checkpoint writes from concurrent runs within this window. 0 disables batching.
+    CHECKPOINT_GROUP_COMMIT_MS: int = 0
+    CHECKPOINT_GROUP_COMMIT_MAX_BATCH: int = 256
+    # Archive threads idle for longer than ARCHIVE_TTL_HOURS to ARCHIVE_DIR. Unset disables archiving.
+    ARCHIVE_DIR: str | None = None
+    ARCHIVE_TTL_HOURS: float = 24
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    # Output directory for Parquet exports (run_export.py and /admin/export)
+    EXPORT_DIR: str = "output/export"
 
     # PostgreSQL Configuration
     POSTGRES_USER: str | None = None
@@ -88,9 +218,14 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_KEY: SecretStr | None = None
     AZURE_OPENAI_ENDPOINT: str | None = None
     AZURE_OPENAI_API_VERSION: str | None = None
-    AZURE_OPENAI_DEPLOYMENT_MAP: dict[str, str] = Field(
-        default_factory=dict, description="Map of model names to Azure deployment IDs"
+    AZURE_OPENAI_DEPLOYMENT_MAP: dict[str, str | list[str | AzureDeployment]] = Field(
+        default_factory=dict, description="Map of model names to Azure deployment IDs, or lists of deployments"
     )
+    # Requests for a model with several deployments go to the deployment with the fewest requests
+    # in flight for its weight. A deployment is ejected after a 429 (for its Retry-After) or after
+    # AZURE_DEPLOYMENT_MAX_FAILURES consecutive errors (for AZURE_DEPLOYMENT_EJECT_SECONDS).
+    AZURE_DEPLOYMENT_MAX_FAILURES: int = 3
+    AZURE_DEPLOYMENT_EJECT_SECONDS: float = 30
 
     def model_post_init(self, __context: Any) -> None:
         api_keys = {
@@ -111,6 +246,7 @@ class Settings(BaseSettings):
                     if self.DEFAULT_MODEL is None:
                         self.DEFAULT_MODEL = OpenAIModelName.GPT_4O
                     self.AVAILABLE_MODELS.update(set(OpenAIModelName))
+                    self._default_router_models(OpenAIModelName.GPT_4O_MINI, OpenAIModelName.GPT_4O)
                 case Provider.OPENAI_COMPATIBLE:
                     if self.DEFAULT_MODEL is None:
                         self.DEFAULT_MODEL = OpenAICompatibleName.OPENAI_COMPATIBLE
@@ -131,6 +267,7 @@ class Settings(BaseSettings):
                     if self.DEFAULT_MODEL is None:
                         self.DEFAULT_MODEL = AzureOpenAIModelName.AZURE_GPT_4O
                     self.AVAILABLE_MODELS.update(set(AzureOpenAIModelName))
+                    self._default_router_models(AzureOpenAIModelName.AZURE_GPT_4O_MINI, AzureOpenAIModelName.AZURE_GPT_4O)
                     # Validate Azure OpenAI settings if Azure provider is available
                     if not self.AZURE_OPENAI_API_KEY:
                         raise ValueError("AZURE_OPENAI_API_KEY must be set")
@@ -148,12 +285,39 @@ class Settings(BaseSettings):
 
                     # Validate required deployments exist
                     required_models = {"gpt-4o", "gpt-4o-mini"}
-                    missing_models = required_models - set(self.AZURE_OPENAI_DEPLOYMENT_MAP.keys())
+                    missing_models = {model for model in required_models if not self.azure_deployments(model)}
                     if missing_models:
                         raise ValueError(f"Missing required Azure deployments: {missing_models}")
                 case _:
                     raise ValueError(f"Unknown provider: {provider}")
 
+        router_models = {self.ROUTER_CHEAP_MODEL, self.ROUTER_STRONG_MODEL}
+        if None not in router_models and router_models <= self.AVAILABLE_MODELS:
+            self.AVAILABLE_MODELS.add(RouterModelName.AUTO)
+
+    def azure_deployments(self, model: str) -> list[AzureDeployment]:
+        """The deployments of `model` in AZURE_OPENAI_DEPLOYMENT_MAP, with the default endpoint and key filled in."""
+        entries = self.AZURE_OPENAI_DEPLOYMENT_MAP.get(model) or []
+        if isinstance(entries, str):
+            entries = [entries]
+        deployments = []
+        for entry in entries:
+            deployment = AzureDeployment(deployment=entry) if isinstance(entry, str) else entry
+            deployments.append(
+                deployment.model_copy(
+                    update={
+                        "endpoint": deployment.endpoint or self.AZURE_OPENAI_ENDPOINT,
+                        "api_key": deployment.api_key or self.AZURE_OPENAI_API_KEY,
+                    }
+                )
+            )
+        return deployments
+
+    def _default_router_models(self, cheap: AllModelEnum, strong: AllModelEnum) -> None:
+        if self.ROUTER_CHEAP_MODEL is None and self.ROUTER_STRONG_MODEL is None:
+            self.ROUTER_CHEAP_MODEL = cheap
+            self.ROUTER_STRONG_MODEL = strong
+
     @computed_field
     @property
     def BASE_URL(self) -> str:
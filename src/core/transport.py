@@ -0,0 +1,99 @@
+import importlib.util
+import logging
+import threading
+from typing import Any
+
+import httpx
+
+from core.ratelimit import rate_limited_transport
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# httpcore trace events of a new connection being opened
+_CONNECT_EVENTS = {"connection.connect_tcp.complete", "connection.connect_unix_socket.complete"}
+_TLS_EVENT = "connection.start_tls.complete"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport that counts requests and the connections and TLS handshakes they
+    needed, so the share of requests that reused a pooled connection can be reported.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        trace = request.extensions.get("trace")
+
+        async def count_connections(event_name: str, info: dict[str, Any]) -> None:
+            if event_name in _CONNECT_EVENTS:
+                self.connections_opened += 1
+            elif event_name == _TLS_EVENT:
+                self.tls_handshakes += 1
+            if trace is not None:
+                result = trace(event_name, info)
+                if hasattr(result, "__await__"):
+                    await result
+
+        request.extensions = {**request.extensions, "trace": count_connections}
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_rate": (self.requests - self.connections_opened) / self.requests if self.requests else 0.0,
+        }
+
+
+_transports: dict[str, InstrumentedTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if not settings.HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def shared_transport(endpoint: str) -> httpx.AsyncBaseTransport:
+    """
+    The async transport, and so the connection pool, shared by every model calling
+    `endpoint`. Pool size, keep-alive and HTTP/2 come from the HTTP_* settings.
+    Requests are scheduled within the provider's rate limits, see core.ratelimit.
+    """
+    with _transports_lock:
+        if endpoint not in _transports:
+            limits = httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            )
+            _transports[endpoint] = InstrumentedTransport(
+                httpx.AsyncHTTPTransport(limits=limits, http2=_http2_enabled())
+            )
+        transport = _transports[endpoint]
+    return rate_limited_transport(endpoint, transport)
+
+
+def http_timeout() -> httpx.Timeout:
+    """Timeout of model requests. The read timeout applies between bytes, so streamed responses can run longer."""
+    return httpx.Timeout(settings.HTTP_READ_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+
+def transport_stats() -> dict[str, dict[str, Any]]:
+    """Connection reuse of each provider endpoint's transport."""
+    return {endpoint: transport.stats() for endpoint, transport in _transports.items()}
@@ -1,19 +1,58 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from datetime import timedelta
+
 from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from core.settings import DatabaseType, settings
-from memory.postgres import get_postgres_saver
-from memory.sqlite import get_sqlite_saver
+from memory.postgres import CoalescingPostgresSaver, get_postgres_saver
+from memory.sqlite import CoalescingSqliteSaver, get_sqlite_saver
 
 
-def initialize_database() -> BaseCheckpointSaver:
+@asynccontextmanager
+async def initialize_database(run_archiver: bool = True) -> AsyncIterator[BaseCheckpointSaver]:
     """
     Initialize the appropriate database checkpointer based on configuration.
-    Returns an initialized AsyncCheckpointer instance.
+    Yields an initialized AsyncCheckpointer instance.
+
+    If ARCHIVE_DIR is set, idle threads are periodically archived to cold storage
+    and restored transparently when they are accessed again. With several workers,
+    one at a time archives, chosen by a lease in the database. Set run_archiver=False
+    for short-lived tools that should restore archived threads but not archive.
+
+    Group-commit writes still queued on exit are committed before the connection closes.
     """
     if settings.DATABASE_TYPE == DatabaseType.POSTGRES:
-        return get_postgres_saver()
+        saver_cm = get_postgres_saver()
     else:  # Default to SQLite
-        return get_sqlite_saver()
+        saver_cm = get_sqlite_saver()
+
+    async with saver_cm as saver:
+        try:
+            if not settings.ARCHIVE_DIR:
+                yield saver
+                return
+
+            # Imported here since pyarrow is only needed when archiving is enabled
+            from memory.archive import ArchivingSaver, ThreadArchiver
+
+            archiver = ThreadArchiver(saver, settings.ARCHIVE_DIR, timedelta(hours=settings.ARCHIVE_TTL_HOURS))
+            if not run_archiver:
+                yield ArchivingSaver(saver, archiver)
+                return
+
+            archive_task = asyncio.create_task(archiver.run_periodically(settings.ARCHIVE_INTERVAL_SECONDS))
+            try:
+                yield ArchivingSaver(saver, archiver)
+            finally:
+                archive_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await archive_task
+        finally:
+            # Commit group-commit writes that are still queued before the connection closes
+            if isinstance(saver, CoalescingSqliteSaver | CoalescingPostgresSaver):
+                await saver.coalescer.flush()
 
 
 __all__ = ["initialize_database"]
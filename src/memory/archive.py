@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.utils import checkpoint_id_time, execute, latest_checkpoint_ids
+
+logger = logging.getLogger(__name__)
+
+_LEASE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS archiver_lease (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+)
+"""
+_ACQUIRE_LEASE_SQL = (
+    "INSERT INTO archiver_lease (id, owner, expires_at) VALUES (1, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+    "WHERE archiver_lease.owner = excluded.owner OR archiver_lease.expires_at < ?"
+)
+
+_ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("thread_id", pa.string()),
+        ("checkpoint_ns", pa.string()),
+        ("checkpoint_id", pa.string()),
+        ("parent_checkpoint_id", pa.string()),
+        ("checkpoint_type", pa.string()),
+        ("checkpoint", pa.binary()),
+        ("metadata_type", pa.string()),
+        ("metadata", pa.binary()),
+        ("writes_type", pa.string()),
+        ("writes", pa.binary()),
+    ]
+)
+
+
+class ThreadArchiver:
+    """
+    Moves threads that have been idle longer than `ttl` out of the checkpointer
+    into zstd-compressed Parquet files, one directory per archive day:
+
+        {archive_dir}/day=YYYY-MM-DD/{HHMMSS-ffffff}.parquet
+
+    Archived threads are restored into the checkpointer on first access.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, archive_dir: str | Path, ttl: timedelta) -> None:
+        self.saver = saver
+        self.archive_dir = Path(archive_dir)
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        # Identifies this process when it holds the archiving lease
+        self._owner = uuid4().hex
+        self._lease_table_ready = False
+        # thread_id -> most recent archive file holding it
+        self._index: dict[str, Path] = {}
+        self._scanned: set[Path] = set()
+        self._scanned_mtimes: tuple[int, int] | None = None
+        self._refresh_index()
+
+    def _refresh_index(self) -> None:
+        """
+        Index the archive files written since the last scan, by this process or another
+        one. Files are only added to the latest day directory, so the scan is skipped
+        while neither it nor the archive directory changed.
+        """
+        latest_day = max(self.archive_dir.glob("day=*"), default=None)
+        try:
+            mtimes = (self.archive_dir.stat().st_mtime_ns, latest_day.stat().st_mtime_ns if latest_day else 0)
+        except FileNotFoundError:
+            return
+        if mtimes == self._scanned_mtimes:
+            return
+        self._scanned_mtimes = mtimes
+        for path in sorted(self.archive_dir.glob("day=*/*.parquet")):
+            if path in self._scanned:
+                continue
+            self._scanned.add(path)
+            for thread_id in pq.read_table(path, columns=["thread_id"]).column("thread_id").unique().to_pylist():
+                self._index[thread_id] = path
+
+    def is_archived(self, thread_id: str) -> bool:
+        thread_id = str(thread_id)
+        if thread_id not in self._index:
+            self._refresh_index()
+        return thread_id in self._index
+
+    async def latest_checkpoint_ids(self) -> list[tuple[str, str]]:
+        """(thread_id, latest checkpoint_id) of every archived thread, read from the archive files."""
+        self._refresh_index()
+        latest: list[tuple[str, str]] = []
+        for path, thread_ids in _group_by_path(self._index).items():
+            table = await asyncio.to_thread(pq.read_table, path, columns=["thread_id", "checkpoint_id"])
+            for row in table.group_by("thread_id").aggregate([("checkpoint_id", "max")]).to_pylist():
+                if row["thread_id"] in thread_ids:
+                    latest.append((row["thread_id"], row["checkpoint_id_max"]))
+        return latest
+
+    async def read_checkpoints(self, thread_id: str, checkpoint_ns: str = "") -> list[Checkpoint]:
+        """Checkpoints of an archived thread, newest first, without restoring it."""
+        path = self._index.get(str(thread_id))
+        if path is None:
+            return []
+        rows = await self._read_rows(path, str(thread_id))
+        return [
+            self.saver.serde.loads_typed((row["checkpoint_type"], row["checkpoint"]))
+            for row in reversed(rows)
+            if row["checkpoint_ns"] == checkpoint_ns
+        ]
+
+    async def archive_idle_threads(self, now: datetime | None = None) -> int:
+        """Archive every thread with no checkpoint newer than the TTL. Returns the number archived."""
+        now = now or datetime.now(UTC)
+        async with self._lock:
+            idle = [
+                thread_id
+                for thread_id, latest_id in await latest_checkpoint_ids(self.saver)
+                if now - checkpoint_id_time(latest_id) > self.ttl
+            ]
+            if not idle:
+                return 0
+
+            rows: list[dict[str, Any]] = []
+            for thread_id in idle:
+                rows.extend([row async for row in self._export_thread(thread_id)])
+            rows.sort(key=lambda r: (r["thread_id"], r["checkpoint_ns"], r["checkpoint_id"]))
+            exported: dict[str, str] = {}
+            for row in rows:
+                exported[row["thread_id"]] = max(exported.get(row["thread_id"], ""), row["checkpoint_id"])
+
+            path = self.archive_dir / f"day={now:%Y-%m-%d}" / f"{now:%H%M%S-%f}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._scanned.add(path)
+            table = pa.Table.from_pylist(rows, schema=_ARCHIVE_SCHEMA)
+            await asyncio.to_thread(pq.write_table, table, path, compression="zstd")
+
+            # A thread that got a checkpoint since it was exported is kept, and dropped from the file
+            archived = []
+            for thread_id, latest_id in exported.items():
+                if await self._delete_thread(thread_id, latest_id):
+                    archived.append(thread_id)
+            if len(archived) < len(exported):
+                logger.info(f"Skipped archiving {len(exported) - len(archived)} threads that were written to meanwhile")
+                if not archived:
+                    path.unlink()
+                    return 0
+                table = table.filter(pc.is_in(table.column("thread_id"), pa.array(archived)))
+                await asyncio.to_thread(pq.write_table, table, path, compression="zstd")
+            for thread_id in archived:
+                self._index[thread_id] = path
+            logger.info(f"Archived {len(archived)} idle threads to {path}")
+            return len(archived)
+
+    async def restore_thread(self, thread_id: str) -> bool:
+        """Load an archived thread back into the checkpointer. Returns False if it isn't archived."""
+        thread_id = str(thread_id)
+        if not self.is_archived(thread_id):
+            return False
+        async with self._lock:
+            path = self._index.get(thread_id)
+            if path is None:
+                # Restored by a concurrent caller
+                return True
+            config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+            if await self.saver.aget_tuple(config) is not None:
+                # Restored by another process, or archived again since
+                del self._index[thread_id]
+                return False
+            serde = self.saver.serde
+            for row in await self._read_rows(path, thread_id):
+                checkpoint: Checkpoint = serde.loads_typed((row["checkpoint_type"], row["checkpoint"]))
+                config = {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": row["checkpoint_ns"],
+                        "checkpoint_id": row["parent_checkpoint_id"],
+                    }
+                }
+                config = await self.saver.aput(
+                    config,
+                    checkpoint,
+                    serde.loads_typed((row["metadata_type"], row["metadata"])),
+                    checkpoint["channel_versions"],
+                )
+                writes_by_task: dict[str, list[tuple[str, Any]]] = {}
+                for task_id, channel, value in serde.loads_typed((row["writes_type"], row["writes"])):
+                    writes_by_task.setdefault(task_id, []).append((channel, value))
+                for task_id, writes in writes_by_task.items():
+                    await self.saver.aput_writes(config, writes, task_id)
+            del self._index[thread_id]
+            logger.info(f"Restored archived thread {thread_id} from {path}")
+            return True
+
+    async def run_periodically(self, interval: float) -> None:
+        """
+        Archive idle threads every `interval` seconds. Every worker runs this, but only
+        the one holding the archiving lease archives, so threads aren't archived twice.
+        A lease not renewed for two intervals, because its worker died, is taken over.
+        """
+        while True:
+            try:
+                if await self.acquire_lease(2 * interval):
+                    await self.archive_idle_threads()
+            except Exception as e:
+                logger.error(f"Error archiving idle threads: {e}")
+            await asyncio.sleep(interval)
+
+    async def acquire_lease(self, duration: float) -> bool:
+        """Take or renew the archiving lease for `duration` seconds. Returns False if another process holds it."""
+        if not self._lease_table_ready:
+            await execute(self.saver, _LEASE_TABLE_SQL)
+            self._lease_table_ready = True
+        now = time.time()
+        return bool(await execute(self.saver, _ACQUIRE_LEASE_SQL, (self._owner, now + duration, now)))
+
+    async def _read_rows(self, path: Path, thread_id: str) -> list[dict[str, Any]]:
+        """Archived checkpoints of the thread, oldest first."""
+        table = await asyncio.to_thread(pq.read_table, path, filters=[("thread_id", "=", thread_id)])
+        return sorted(table.to_pylist(), key=lambda r: r["checkpoint_id"])
+
+    async def _export_thread(self, thread_id: str) -> AsyncIterator[dict[str, Any]]:
+        serde = self.saver.serde
+        async for checkpoint_tuple in self.saver.alist({"configurable": {"thread_id": thread_id}}):
+            configurable = checkpoint_tuple.config["configurable"]
+            parent = checkpoint_tuple.parent_config
+            checkpoint_type, checkpoint = serde.dumps_typed(checkpoint_tuple.checkpoint)
+            metadata_type, metadata = serde.dumps_typed(checkpoint_tuple.metadata)
+            writes_type, writes = serde.dumps_typed([list(w) for w in checkpoint_tuple.pending_writes or []])
+            yield {
+                "thread_id": thread_id,
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": configurable["checkpoint_id"],
+                "parent_checkpoint_id": parent["configurable"]["checkpoint_id"] if parent else None,
+                "checkpoint_type": checkpoint_type,
+                "checkpoint": checkpoint,
+                "metadata_type": metadata_type,
+                "metadata": metadata,
+                "writes_type": writes_type,
+                "writes": writes,
+            }
+
+    async def _delete_thread(self, thread_id: str, latest_id: str) -> bool:
+        """
+        Delete the thread if its latest checkpoint is still `latest_id`. Returns False, and
+        deletes nothing, if a run wrote to it after it was exported.
+        """
+        if isinstance(self.saver, AsyncSqliteSaver):
+            if coalescer := getattr(self.saver, "coalescer", None):
+                await coalescer.wait_for_thread(thread_id)
+            async with self.saver.lock:
+                query = "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ?"
+                async with self.saver.conn.execute(query, (thread_id,)) as cur:
+                    if (await cur.fetchone())[0] != latest_id:
+                        return False
+                await self.saver.conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id <= ?", (thread_id, latest_id)
+                )
+                await self.saver.conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id <= ?", (thread_id, latest_id)
+                )
+                await self.saver.conn.commit()
+            return True
+        if isinstance(self.saver, AsyncPostgresSaver):
+            async with self.saver._cursor() as cur, cur.connection.transaction():
+                await cur.execute(
+                    "SELECT MAX(checkpoint_id) AS checkpoint_id FROM checkpoints WHERE thread_id = %s", (thread_id,)
+                )
+                if (await cur.fetchone())["checkpoint_id"] != latest_id:
+                    return False
+                # A checkpoint committed meanwhile is kept, along with the blobs it references
+                for table in ("checkpoints", "checkpoint_writes"):
+                    await cur.execute(
+                        f"DELETE FROM {table} WHERE thread_id = %s AND checkpoint_id <= %s", (thread_id, latest_id)
+                    )
+                await cur.execute(
+                    "DELETE FROM checkpoint_blobs WHERE thread_id = %s"
+                    " AND NOT EXISTS (SELECT 1 FROM checkpoints WHERE thread_id = %s)",
+                    (thread_id, thread_id),
+                )
+            return True
+        raise TypeError(f"Archiving is not supported for {type(self.saver).__name__}")
+
+
+def _group_by_path(index: dict[str, Path]) -> dict[Path, set[str]]:
+    by_path: dict[Path, set[str]] = {}
+    for thread_id, path in index.items():
+        by_path.setdefault(path, set()).add(thread_id)
+    return by_path
+
+
+class ArchivingSaver(BaseCheckpointSaver):
+    """Checkpointer wrapper that transparently restores archived threads on lookup."""
+
+    def __init__(self, saver: BaseCheckpointSaver, archiver: ThreadArchiver) -> None:
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.archiver = archiver
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    async def setup(self) -> None:
+        await self.saver.setup()
+
+    def get_next_version(self, current: Any, channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is None and await self.archiver.restore_thread(config["configurable"]["thread_id"]):
+            checkpoint_tuple = await self.saver.aget_tuple(config)
+        return checkpoint_tuple
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        checkpoint_tuple = self.saver.get_tuple(config)
+        thread_id = config["configurable"]["thread_id"]
+        if checkpoint_tuple is None and self.archiver.is_archived(thread_id):
+            asyncio.run_coroutine_threadsafe(self.archiver.restore_thread(thread_id), self.saver.loop).result()
+            checkpoint_tuple = self.saver.get_tuple(config)
+        return checkpoint_tuple
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config and self.archiver.is_archived(config["configurable"]["thread_id"]):
+            await self.archiver.restore_thread(config["configurable"]["thread_id"])
+        async for checkpoint_tuple in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
@@ -0,0 +1,97 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+# A statement to run with executemany: (sql, rows)
+Statement = tuple[str, Sequence[Sequence[Any]]]
+
+
+@dataclass
+class _PendingWrite:
+    thread_id: str
+    statements: list[Statement]
+    future: asyncio.Future = field(repr=False)
+
+
+class WriteCoalescer:
+    """
+    Group-commits checkpoint writes from concurrent runs.
+
+    Writes submitted within `window` seconds of each other (or until `max_batch`
+    writes are queued) are handed to `commit_batch` in submission order and
+    committed in a single transaction. `submit` only returns once the write is
+    durable, so callers keep the same semantics as an unbatched saver.
+    """
+
+    def __init__(
+        self,
+        commit_batch: Callable[[list[Statement]], Awaitable[None]],
+        *,
+        window: float,
+        max_batch: int,
+    ) -> None:
+        self._commit_batch = commit_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[_PendingWrite] = []
+        self._inflight: list[_PendingWrite] = []
+        self._flush_now = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.commits = 0
+        self.writes = 0
+
+    async def submit(self, thread_id: str, statements: list[Statement]) -> None:
+        """Queue statements for the next group commit and wait until they are committed."""
+        write = _PendingWrite(str(thread_id), statements, asyncio.get_running_loop().create_future())
+        self._pending.append(write)
+        if len(self._pending) >= self.max_batch:
+            self._flush_now.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+        # Shield so a cancelled run doesn't cancel a write other runs are batched with
+        await asyncio.shield(write.future)
+
+    async def wait_for_thread(self, thread_id: str) -> None:
+        """Wait until every queued write for the thread is committed, flushing early if needed."""
+        thread_id = str(thread_id)
+        futures = [w.future for w in (*self._inflight, *self._pending) if w.thread_id == thread_id]
+        if not futures:
+            return
+        self._flush_now.set()
+        await asyncio.gather(*(asyncio.shield(f) for f in futures), return_exceptions=True)
+
+    async def flush(self) -> None:
+        """Commit all queued writes immediately."""
+        futures = [w.future for w in (*self._inflight, *self._pending)]
+        if not futures:
+            return
+        self._flush_now.set()
+        await asyncio.gather(*(asyncio.shield(f) for f in futures), return_exceptions=True)
+
+    async def _run(self) -> None:
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.window)
+            except TimeoutError:
+                pass
+            self._flush_now.clear()
+
+            self._inflight = self._pending[: self.max_batch]
+            self._pending = self._pending[self.max_batch :]
+            if len(self._pending) >= self.max_batch:
+                self._flush_now.set()
+            try:
+                await self._commit_batch([s for w in self._inflight for s in w.statements])
+            except Exception as e:
+                for w in self._inflight:
+                    if not w.future.done():
+                        w.future.set_exception(e)
+            else:
+                self.commits += 1
+                self.writes += len(self._inflight)
+                for w in self._inflight:
+                    if not w.future.done():
+                        w.future.set_result(None)
+            finally:
+                self._inflight = []
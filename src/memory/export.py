@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncGenerator, AsyncIterator, Sequence
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint
+from langgraph.constants import PREVIOUS
+
+from memory.archive import ArchivingSaver, ThreadArchiver
+from memory.utils import latest_checkpoint_ids
+from schema import ExportResult
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_FILE = "_watermark"
+
+_SCHEMAS = {
+    "messages": pa.schema(
+        [
+            ("thread_id", pa.string()),
+            ("message_id", pa.string()),
+            ("position", pa.int64()),
+            ("type", pa.string()),
+            ("name", pa.string()),
+            ("content", pa.string()),
+            ("tool_call_id", pa.string()),
+            ("checkpoint_id", pa.string()),
+            ("updated_at", pa.string()),
+            ("date", pa.string()),
+        ]
+    ),
+    "tool_calls": pa.schema(
+        [
+            ("thread_id", pa.string()),
+            ("message_id", pa.string()),
+            ("tool_call_id", pa.string()),
+            ("name", pa.string()),
+            ("args", pa.string()),
+            ("date", pa.string()),
+        ]
+    ),
+    "token_usage": pa.schema(
+        [
+            ("thread_id", pa.string()),
+            ("message_id", pa.string()),
+            ("model_name", pa.string()),
+            ("input_tokens", pa.int64()),
+            ("output_tokens", pa.int64()),
+            ("total_tokens", pa.int64()),
+            ("date", pa.string()),
+        ]
+    ),
+}
+
+
+def read_watermark(output_dir: str | Path) -> str | None:
+    path = Path(output_dir) / WATERMARK_FILE
+    if not path.exists():
+        return None
+    return path.read_text().strip() or None
+
+
+def _state_messages(channel_values: dict[str, Any]) -> Sequence[BaseMessage]:
+    # StateGraph agents keep messages in a channel, functional API agents in their saved value
+    if "messages" in channel_values:
+        return channel_values["messages"]
+    return (channel_values.get(PREVIOUS) or {}).get("messages", [])
+
+
+class _PartitionedWriter:
+    """Buffers rows per table and flushes them as date-partitioned Parquet files."""
+
+    def __init__(self, output_dir: Path, batch_rows: int) -> None:
+        self.output_dir = output_dir
+        self.batch_rows = batch_rows
+        self.export_id = uuid4().hex
+        self.rows: dict[str, list[dict[str, Any]]] = {table: [] for table in _SCHEMAS}
+        self.counts: dict[str, int] = {table: 0 for table in _SCHEMAS}
+        self._parts = 0
+
+    async def add(self, table: str, row: dict[str, Any]) -> None:
+        self.rows[table].append(row)
+        self.counts[table] += 1
+        if len(self.rows[table]) >= self.batch_rows:
+            await self.flush(table)
+
+    async def flush(self, table: str) -> None:
+        if not self.rows[table]:
+            return
+        arrow_table = pa.Table.from_pylist(self.rows[table], schema=_SCHEMAS[table])
+        self.rows[table] = []
+        self._parts += 1
+        await asyncio.to_thread(
+            pq.write_to_dataset,
+            arrow_table,
+            self.output_dir / table,
+            partition_cols=["date"],
+            basename_template=f"{self.export_id}-{self._parts:05d}-{{i}}.parquet",
+            compression="zstd",
+        )
+
+    async def close(self) -> None:
+        for table in self.rows:
+            await self.flush(table)
+
+
+async def _root_checkpoints(saver: BaseCheckpointSaver, thread_id: str) -> AsyncIterator[Checkpoint]:
+    # Closed explicitly when the export stops early, since the SQLite saver holds its lock until then
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    async with aclosing(saver.alist(config)) as checkpoint_tuples:
+        async for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple.checkpoint
+
+
+async def _archived_checkpoints(archiver: ThreadArchiver, thread_id: str) -> AsyncIterator[Checkpoint]:
+    for checkpoint in await archiver.read_checkpoints(thread_id):
+        yield checkpoint
+
+
+async def _export_thread(
+    writer: _PartitionedWriter,
+    thread_id: str,
+    checkpoints: AsyncGenerator[Checkpoint, None],
+    since: str | None,
+    until: str,
+) -> str | None:
+    """
+    Write the rows of the messages added to the thread after `since` and up to `until`,
+    given its checkpoints newest first. Each message is stamped with the checkpoint that
+    added it. Returns the ID of the latest checkpoint exported, or None if there is none
+    after `since`.
+    """
+    latest: Checkpoint | None = None
+    # Message ID -> (ID, timestamp) of the oldest checkpoint after `since` holding it, which added it
+    added: dict[str, tuple[str, str]] = {}
+    exported_ids: set[str] = set()
+    async with aclosing(checkpoints):
+        async for checkpoint in checkpoints:
+            # Written since the export started, so left to the next one
+            if checkpoint["id"] > until:
+                continue
+            messages = _state_messages(checkpoint["channel_values"])
+            if since and checkpoint["id"] <= since:
+                exported_ids = {m.id for m in messages}
+                break
+            latest = latest or checkpoint
+            for message in messages:
+                added[message.id] = (checkpoint["id"], checkpoint["ts"])
+    if latest is None:
+        return None
+
+    for position, message in enumerate(_state_messages(latest["channel_values"])):
+        if message.id in exported_ids:
+            continue
+        checkpoint_id, updated_at = added[message.id]
+        date = updated_at[:10]
+        await writer.add(
+            "messages",
+            {
+                "thread_id": thread_id,
+                "message_id": message.id,
+                "position": position,
+                "type": message.type,
+                "name": message.name,
+                "content": message.text(),
+                "tool_call_id": message.tool_call_id if isinstance(message, ToolMessage) else None,
+                "checkpoint_id": checkpoint_id,
+                "updated_at": updated_at,
+                "date": date,
+            },
+        )
+        if not isinstance(message, AIMessage):
+            continue
+        for tool_call in message.tool_calls:
+            await writer.add(
+                "tool_calls",
+                {
+                    "thread_id": thread_id,
+                    "message_id": message.id,
+                    "tool_call_id": tool_call["id"],
+                    "name": tool_call["name"],
+                    "args": json.dumps(tool_call["args"], ensure_ascii=False),
+                    "date": date,
+                },
+            )
+        if message.usage_metadata:
+            await writer.add(
+                "token_usage",
+                {
+                    "thread_id": thread_id,
+                    "message_id": message.id,
+                    "model_name": message.response_metadata.get("model_name"),
+                    "input_tokens": message.usage_metadata["input_tokens"],
+                    "output_tokens": message.usage_metadata["output_tokens"],
+                    "total_tokens": message.usage_metadata["total_tokens"],
+                    "date": date,
+                },
+            )
+    return latest["id"]
+
+
+async def export_conversations(
+    saver: BaseCheckpointSaver,
+    output_dir: str | Path,
+    *,
+    since: str | None = None,
+    full: bool = False,
+    batch_rows: int = 10_000,
+) -> ExportResult:
+    """
+    Export messages, tool calls and token usage of every thread updated after the
+    `since` watermark to date-partitioned Parquet tables under `output_dir`:
+
+        {output_dir}/{messages,tool_calls,token_usage}/date=YYYY-MM-DD/*.parquet
+
+    Threads are read one at a time and rows are flushed every `batch_rows`, so memory
+    stays bounded regardless of the checkpointer size. Only messages added since the
+    watermark are written. If `since` is not given, the watermark stored by the previous
+    export is used, unless `full` is set. Archived threads are read from the archive
+    without restoring them.
+    """
+    output_dir = Path(output_dir)
+    if since is None and not full:
+        since = read_watermark(output_dir)
+    hot_saver = saver.saver if isinstance(saver, ArchivingSaver) else saver
+
+    latest = await latest_checkpoint_ids(hot_saver)
+    hot_ids = {thread_id for thread_id, _ in latest}
+    archiver = saver.archiver if isinstance(saver, ArchivingSaver) else None
+    if archiver is not None:
+        latest += [
+            (thread_id, checkpoint_id)
+            for thread_id, checkpoint_id in await archiver.latest_checkpoint_ids()
+            if thread_id not in hot_ids
+        ]
+    # Each thread is exported up to its checkpoint in this snapshot
+    changed = sorted((thread_id, checkpoint_id) for thread_id, checkpoint_id in latest if not since or checkpoint_id > since)
+
+    writer = _PartitionedWriter(output_dir, batch_rows)
+    exported = 0
+    for thread_id, checkpoint_id in changed:
+        if thread_id in hot_ids:
+            checkpoints = _root_checkpoints(hot_saver, thread_id)
+        else:
+            checkpoints = _archived_checkpoints(archiver, thread_id)
+        if await _export_thread(writer, thread_id, checkpoints, since, until=checkpoint_id):
+            exported += 1
+    await writer.close()
+
+    # Checkpoint IDs are time-ordered, so the next export continues after the snapshot this one
+    # was taken from. Checkpoints written to any thread during the export are after it.
+    watermark = max([since or "", *(checkpoint_id for _, checkpoint_id in latest)])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / WATERMARK_FILE).write_text(watermark)
+    logger.info(f"Exported {exported} threads to {output_dir}")
+    return ExportResult(
+        watermark=watermark,
+        threads=exported,
+        messages=writer.counts["messages"],
+        tool_calls=writer.counts["tool_calls"],
+        token_usage=writer.counts["token_usage"],
+    )
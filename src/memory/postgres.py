@@ -1,9 +1,25 @@
+import asyncio
 import logging
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
 
-from langgraph.checkpoint.base import BaseCheckpointSaver
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver, Conn
+from psycopg import AsyncPipeline
+from psycopg.types.json import Jsonb
 
 from core.settings import settings
+from memory.coalescer import Statement, WriteCoalescer
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +55,114 @@ def get_postgres_connection_string() -> str:
     )
 
 
+class CoalescingPostgresSaver(AsyncPostgresSaver):
+    """AsyncPostgresSaver that group-commits `aput`/`aput_writes` from concurrent runs."""
+
+    def __init__(
+        self,
+        conn: Conn,
+        pipe: AsyncPipeline | None = None,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(conn, pipe=pipe, serde=serde)
+        self.coalescer = WriteCoalescer(
+            self._commit_batch,
+            window=settings.CHECKPOINT_GROUP_COMMIT_MS / 1000,
+            max_batch=settings.CHECKPOINT_GROUP_COMMIT_MAX_BATCH,
+        )
+
+    async def _commit_batch(self, statements: list[Statement]) -> None:
+        async with self._cursor() as cur, cur.connection.transaction():
+            for query, rows in statements:
+                if rows:
+                    await cur.executemany(query, rows)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.coalescer.wait_for_thread(config["configurable"]["thread_id"])
+        return await super().aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config:
+            await self.coalescer.wait_for_thread(config["configurable"]["thread_id"])
+        else:
+            await self.coalescer.flush()
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"].copy()
+        thread_id = configurable.pop("thread_id")
+        checkpoint_ns = configurable.pop("checkpoint_ns")
+        checkpoint_id = configurable.pop("checkpoint_id", configurable.pop("thread_ts", None))
+
+        copy = checkpoint.copy()
+        blobs = await asyncio.to_thread(
+            self._dump_blobs,
+            thread_id,
+            checkpoint_ns,
+            copy.pop("channel_values"),  # type: ignore[misc]
+            new_versions,
+        )
+        checkpoint_row = (
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            checkpoint_id,
+            Jsonb(self._dump_checkpoint(copy)),
+            self._dump_metadata(get_checkpoint_metadata(config, metadata)),
+        )
+        await self.coalescer.submit(
+            thread_id,
+            [(self.UPSERT_CHECKPOINT_BLOBS_SQL, blobs), (self.UPSERT_CHECKPOINTS_SQL, [checkpoint_row])],
+        )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        query = (
+            self.UPSERT_CHECKPOINT_WRITES_SQL
+            if all(w[0] in WRITES_IDX_MAP for w in writes)
+            else self.INSERT_CHECKPOINT_WRITES_SQL
+        )
+        rows = await asyncio.to_thread(
+            self._dump_writes,
+            config["configurable"]["thread_id"],
+            config["configurable"]["checkpoint_ns"],
+            config["configurable"]["checkpoint_id"],
+            task_id,
+            task_path,
+            writes,
+        )
+        await self.coalescer.submit(config["configurable"]["thread_id"], [(query, rows)])
+
+
 def get_postgres_saver() -> BaseCheckpointSaver:
     """Initialize and return a PostgreSQL saver instance."""
     validate_postgres_config()
+    if settings.CHECKPOINT_GROUP_COMMIT_MS > 0:
+        return CoalescingPostgresSaver.from_conn_string(get_postgres_connection_string())
     return AsyncPostgresSaver.from_conn_string(get_postgres_connection_string())
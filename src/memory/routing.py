@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core.router import ModelRouter, log_feedback, threshold_change, tunes_routing
+from core.settings import settings
+from memory.utils import execute, fetchall
+
+logger = logging.getLogger(__name__)
+
+_SETUP_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS router_decisions (
+        run_id TEXT PRIMARY KEY,
+        tier TEXT NOT NULL,
+        decided_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS router_feedback (
+        run_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (run_id, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS router_threshold (
+        id INTEGER PRIMARY KEY,
+        threshold REAL NOT NULL
+    )
+    """,
+]
+
+# Feedback on runs routed longer ago than this is ignored
+_DECISION_TTL = timedelta(days=7)
+_PRUNE_INTERVAL = timedelta(hours=1)
+
+
+class RoutingStore:
+    """
+    Routing decisions of the "auto" model and its threshold, kept in the database next
+    to the checkpoints so that every worker routes with the same threshold and feedback
+    can reach any worker.
+
+    Workers save their decisions and pick up the threshold every sync interval, and
+    feedback on a run moves the shared threshold once per feedback key.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver) -> None:
+        from memory.archive import ArchivingSaver
+
+        self.saver = saver.saver if isinstance(saver, ArchivingSaver) else saver
+        if not isinstance(self.saver, AsyncSqliteSaver | AsyncPostgresSaver):
+            raise TypeError(f"Routing store is not supported for {type(self.saver).__name__}")
+        self._pruned_at = datetime.min.replace(tzinfo=UTC)
+
+    async def setup(self) -> None:
+        for query in _SETUP_SQL:
+            await execute(self.saver, query)
+        await execute(
+            self.saver,
+            "INSERT INTO router_threshold (id, threshold) VALUES (1, ?) ON CONFLICT DO NOTHING",
+            (settings.ROUTER_THRESHOLD,),
+        )
+
+    async def sync(self, router: ModelRouter) -> None:
+        """Save the router's new decisions and pick up the shared threshold."""
+        now = datetime.now(UTC)
+        for run_id, tier in router.unsaved_decisions().items():
+            await execute(
+                self.saver,
+                "INSERT INTO router_decisions (run_id, tier, decided_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET tier = excluded.tier, decided_at = excluded.decided_at",
+                (run_id, tier, now.isoformat()),
+            )
+        if now - self._pruned_at > _PRUNE_INTERVAL:
+            await self._prune(now - _DECISION_TTL)
+            self._pruned_at = now
+        rows = await fetchall(self.saver, "SELECT threshold FROM router_threshold WHERE id = 1")
+        if rows:
+            router.threshold = rows[0][0]
+
+    async def record_feedback(self, router: ModelRouter, run_id: str, key: str, score: float) -> None:
+        """Adjust the shared threshold from feedback between 0 (bad) and 1 (good) on a routed run."""
+        # The run may have been routed by this worker since the last sync
+        await self.sync(router)
+        if not tunes_routing(key):
+            return
+        rows = await fetchall(self.saver, "SELECT tier FROM router_decisions WHERE run_id = ?", (run_id,))
+        if not rows:
+            return
+        tier = rows[0][0]
+        claimed = await execute(
+            self.saver,
+            "INSERT INTO router_feedback (run_id, key) VALUES (?, ?) ON CONFLICT DO NOTHING",
+            (run_id, key),
+        )
+        if not claimed:
+            return
+        change = threshold_change(tier, score)
+        # Clamped in the update itself, so concurrent feedback on several workers adds up
+        await execute(
+            self.saver,
+            "UPDATE router_threshold SET threshold = "
+            "CASE WHEN threshold + ? < 0 THEN 0 WHEN threshold + ? > 1 THEN 1 ELSE threshold + ? END WHERE id = 1",
+            (change, change, change),
+        )
+        rows = await fetchall(self.saver, "SELECT threshold FROM router_threshold WHERE id = 1")
+        router.threshold = rows[0][0]
+        log_feedback(run_id, key, tier, score)
+
+    async def run_periodically(self, router: ModelRouter, interval: float) -> None:
+        while True:
+            try:
+                await self.sync(router)
+            except Exception as e:
+                logger.error(f"Error syncing the model router: {e}")
+            await asyncio.sleep(interval)
+
+    async def _prune(self, before: datetime) -> None:
+        await execute(self.saver, "DELETE FROM router_decisions WHERE decided_at < ?", (before.isoformat(),))
+        await execute(
+            self.saver, "DELETE FROM router_feedback WHERE run_id NOT IN (SELECT run_id FROM router_decisions)"
+        )
@@ -0,0 +1,155 @@
+from datetime import UTC, datetime
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.utils import execute, fetchall
+from schema import RunInfo
+
+_SETUP_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS active_runs (
+        run_id TEXT PRIMARY KEY,
+        thread_id TEXT,
+        agent_id TEXT NOT NULL,
+        current_node TEXT,
+        started_at TEXT NOT NULL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'running',
+        heartbeat_at TEXT,
+        user_input TEXT
+    )
+    """,
+]
+
+# A run is "running" while its worker keeps its heartbeat fresh, and "interrupted" once
+# its worker died or shut down mid-run. Only runs with a saved user_input can be resumed.
+RUNNING = "running"
+INTERRUPTED = "interrupted"
+
+_COLUMNS = ("run_id", "thread_id", "agent_id", "started_at", "current_node")
+
+
+class RunIndex:
+    """
+    Runs in progress across every worker, kept in an `active_runs` table next to the
+    checkpoints. Workers publish their runs here and poll it for cancellations
+    requested through another worker.
+
+    Workers also refresh a heartbeat on their runs, so runs left behind by a worker
+    that crashed can be found and resumed from their thread's last checkpoint.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver) -> None:
+        from memory.archive import ArchivingSaver
+
+        self.saver = saver.saver if isinstance(saver, ArchivingSaver) else saver
+        if not isinstance(self.saver, AsyncSqliteSaver | AsyncPostgresSaver):
+            raise TypeError(f"Run index is not supported for {type(self.saver).__name__}")
+
+    async def setup(self) -> None:
+        for query in _SETUP_SQL:
+            await self._execute(query)
+
+    async def add(
+        self,
+        run_id: str,
+        *,
+        thread_id: str | None,
+        agent_id: str,
+        started_at: datetime,
+        user_input: str | None = None,
+    ) -> None:
+        """Publish a run. `user_input` is the JSON request to resume it with, if it can be resumed."""
+        await self._execute(
+            "INSERT INTO active_runs (run_id, thread_id, agent_id, started_at, heartbeat_at, user_input) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, thread_id, agent_id, started_at.isoformat(), started_at.isoformat(), user_input),
+        )
+
+    async def remove(self, run_id: str) -> None:
+        await self._execute("DELETE FROM active_runs WHERE run_id = ?", (run_id,))
+
+    async def set_current_nodes(self, nodes: dict[str, str | None]) -> None:
+        for run_id, node in nodes.items():
+            await self._execute("UPDATE active_runs SET current_node = ? WHERE run_id = ?", (node, run_id))
+
+    async def list_runs(self, status: str = RUNNING) -> list[RunInfo]:
+        rows = await self._fetchall(
+            f"SELECT {', '.join(_COLUMNS)} FROM active_runs WHERE status = ? ORDER BY started_at", (status,)
+        )
+        return [RunInfo(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    async def get_run(self, run_id: str) -> RunInfo | None:
+        rows = await self._fetchall(f"SELECT {', '.join(_COLUMNS)} FROM active_runs WHERE run_id = ?", (run_id,))
+        return RunInfo(**dict(zip(_COLUMNS, rows[0]))) if rows else None
+
+    async def request_cancel(self, run_id: str) -> None:
+        """Ask the worker running a run to cancel it. An interrupted run is discarded instead."""
+        await self._execute(
+            "UPDATE active_runs SET cancel_requested = 1 WHERE run_id = ? AND status = ?", (run_id, RUNNING)
+        )
+        await self._execute("DELETE FROM active_runs WHERE run_id = ? AND status = ?", (run_id, INTERRUPTED))
+
+    async def heartbeat(self, run_ids: list[str], now: datetime) -> None:
+        """Mark runs as still running. This also revives runs that were wrongly considered interrupted."""
+        if not run_ids:
+            return
+        placeholders = ", ".join("?" * len(run_ids))
+        await self._execute(
+            f"UPDATE active_runs SET heartbeat_at = ?, status = ? WHERE run_id IN ({placeholders})",
+            (now.isoformat(), RUNNING, *run_ids),
+        )
+
+    async def mark_interrupted(self, run_id: str) -> None:
+        await self._execute("UPDATE active_runs SET status = ? WHERE run_id = ?", (INTERRUPTED, run_id))
+
+    async def sweep_orphans(self, stale_before: datetime) -> None:
+        """
+        Find running runs whose heartbeat stopped before `stale_before`, because their
+        worker died. Resumable ones are marked interrupted and the others are removed.
+        """
+        params = (RUNNING, stale_before.isoformat())
+        await self._execute(
+            "DELETE FROM active_runs WHERE status = ? AND heartbeat_at < ? AND user_input IS NULL", params
+        )
+        await self._execute(
+            "UPDATE active_runs SET status = ? WHERE status = ? AND heartbeat_at < ?", (INTERRUPTED, *params)
+        )
+
+    async def claim_interrupted(self, run_id: str) -> tuple[str, str] | None:
+        """
+        Claim an interrupted run to resume it, returning its agent and JSON user input.
+        Returns None if it isn't interrupted or another worker claimed it first.
+
+        The run is marked running again rather than removed, so if the claiming worker
+        dies before the resumed run starts heartbeating, it is found orphaned and
+        interrupted again. The resumed run then takes the entry over with `rename`.
+        """
+        claimed = await self._execute(
+            "UPDATE active_runs SET status = ?, heartbeat_at = ? WHERE run_id = ? AND status = ?",
+            (RUNNING, datetime.now(UTC).isoformat(), run_id, INTERRUPTED),
+        )
+        if not claimed:
+            return None
+        rows = await self._fetchall("SELECT agent_id, user_input FROM active_runs WHERE run_id = ?", (run_id,))
+        return rows[0] if rows else None
+
+    async def rename(self, run_id: str, new_run_id: str) -> None:
+        """Hand a claimed run's entry, with its user input, over to the run resuming it."""
+        await self._execute(
+            "UPDATE active_runs SET run_id = ?, started_at = ?, cancel_requested = 0 WHERE run_id = ?",
+            (new_run_id, datetime.now(UTC).isoformat(), run_id),
+        )
+
+    async def cancel_requests(self) -> set[str]:
+        """IDs of runs that have been asked to cancel and haven't finished yet."""
+        return {row[0] for row in await self._fetchall("SELECT run_id FROM active_runs WHERE cancel_requested = 1")}
+
+    async def _execute(self, query: str, params: tuple = ()) -> int:
+        """Run a statement and return the number of rows it changed."""
+        return await execute(self.saver, query, params)
+
+    async def _fetchall(self, query: str, params: tuple = ()) -> list[tuple]:
+        return await fetchall(self.saver, query, params)
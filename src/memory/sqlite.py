@@ -1,9 +1,126 @@
-from langgraph.checkpoint.base import BaseCheckpointSaver
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_metadata,
+)
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 from core.settings import settings
+from memory.coalescer import Statement, WriteCoalescer
+
+_UPSERT_CHECKPOINT_SQL = "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)"
+_UPSERT_WRITES_SQL = "INSERT OR REPLACE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_WRITES_SQL = "INSERT OR IGNORE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+class CoalescingSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver that group-commits `aput`/`aput_writes` from concurrent runs."""
+
+    def __init__(self, conn: aiosqlite.Connection, *, serde: SerializerProtocol | None = None) -> None:
+        super().__init__(conn, serde=serde)
+        self.coalescer = WriteCoalescer(
+            self._commit_batch,
+            window=settings.CHECKPOINT_GROUP_COMMIT_MS / 1000,
+            max_batch=settings.CHECKPOINT_GROUP_COMMIT_MAX_BATCH,
+        )
+
+    async def _commit_batch(self, statements: list[Statement]) -> None:
+        async with self.lock:
+            try:
+                for query, rows in statements:
+                    if rows:
+                        await self.conn.executemany(query, rows)
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.coalescer.wait_for_thread(config["configurable"]["thread_id"])
+        return await super().aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config:
+            await self.coalescer.wait_for_thread(config["configurable"]["thread_id"])
+        else:
+            await self.coalescer.flush()
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+        row = (
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            type_,
+            serialized_checkpoint,
+            serialized_metadata,
+        )
+        await self.coalescer.submit(thread_id, [(_UPSERT_CHECKPOINT_SQL, [row])])
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.setup()
+        query = _UPSERT_WRITES_SQL if all(w[0] in WRITES_IDX_MAP for w in writes) else _INSERT_WRITES_SQL
+        thread_id = str(config["configurable"]["thread_id"])
+        rows = [
+            (
+                thread_id,
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        await self.coalescer.submit(thread_id, [(query, rows)])
 
 
 def get_sqlite_saver() -> BaseCheckpointSaver:
     """Initialize and return a SQLite saver instance."""
+    if settings.CHECKPOINT_GROUP_COMMIT_MS > 0:
+        return CoalescingSqliteSaver.from_conn_string(settings.SQLITE_DB_PATH)
     return AsyncSqliteSaver.from_conn_string(settings.SQLITE_DB_PATH)
@@ -0,0 +1,121 @@
+import base64
+import json
+from datetime import UTC, datetime
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.utils import execute, fetchall
+from schema import ThreadInfo, ThreadList
+
+TITLE_LENGTH = 80
+
+_SETUP_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS thread_metadata (
+        thread_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        agent_id TEXT NOT NULL,
+        title TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS thread_metadata_updated_idx ON thread_metadata (updated_at DESC, thread_id DESC)",
+    "CREATE INDEX IF NOT EXISTS thread_metadata_user_idx ON thread_metadata (user_id, updated_at DESC, thread_id DESC)",
+    "CREATE INDEX IF NOT EXISTS thread_metadata_agent_idx ON thread_metadata (agent_id, updated_at DESC, thread_id DESC)",
+]
+
+_UPSERT_SQL = """
+    INSERT INTO thread_metadata (thread_id, user_id, agent_id, title, message_count, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (thread_id) DO UPDATE SET
+        agent_id = excluded.agent_id,
+        message_count = thread_metadata.message_count + excluded.message_count,
+        updated_at = excluded.updated_at
+"""
+
+_COLUMNS = ("thread_id", "user_id", "agent_id", "title", "message_count", "created_at", "updated_at")
+
+
+def _encode_cursor(updated_at: str, thread_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([updated_at, thread_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        updated_at, thread_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return updated_at, thread_id
+
+
+class ThreadIndex:
+    """
+    Per-thread metadata (owner, agent, title, message count, timestamps) kept in a
+    `thread_metadata` table next to the checkpoints, so threads can be listed
+    without reading checkpoint blobs.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver) -> None:
+        from memory.archive import ArchivingSaver
+
+        self.saver = saver.saver if isinstance(saver, ArchivingSaver) else saver
+        if not isinstance(self.saver, AsyncSqliteSaver | AsyncPostgresSaver):
+            raise TypeError(f"Thread index is not supported for {type(self.saver).__name__}")
+
+    async def setup(self) -> None:
+        for query in _SETUP_SQL:
+            await execute(self.saver, query)
+
+    async def record_run(
+        self,
+        thread_id: str,
+        *,
+        agent_id: str,
+        user_id: str | None,
+        title: str,
+        new_messages: int,
+    ) -> None:
+        """Create or update a thread's metadata after a run. Title and owner are only set on creation."""
+        now = datetime.now(UTC).isoformat()
+        await execute(
+            self.saver, _UPSERT_SQL, (thread_id, user_id, agent_id, title[:TITLE_LENGTH], new_messages, now, now)
+        )
+
+    async def list_threads(
+        self,
+        *,
+        user_id: str | None = None,
+        agent_id: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> ThreadList:
+        """List threads, most recently updated first, using keyset pagination."""
+        conditions: list[str] = []
+        params: list[Any] = []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if agent_id is not None:
+            conditions.append("agent_id = ?")
+            params.append(agent_id)
+        if cursor:
+            conditions.append("(updated_at, thread_id) < (?, ?)")
+            params.extend(_decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            f"SELECT {', '.join(_COLUMNS)} FROM thread_metadata {where} "
+            "ORDER BY updated_at DESC, thread_id DESC LIMIT ?"
+        )
+        rows = await fetchall(self.saver, query, (*params, limit + 1))
+
+        threads = [ThreadInfo(**dict(zip(_COLUMNS, row))) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = _encode_cursor(last[_COLUMNS.index("updated_at")], last[0])
+        return ThreadList(threads=threads, next_cursor=next_cursor)
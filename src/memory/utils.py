@@ -0,0 +1,62 @@
+from datetime import UTC, datetime
+from uuid import UUID
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# 100-ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_id_time(checkpoint_id: str) -> datetime:
+    """Decode the creation time embedded in a LangGraph (UUIDv6) checkpoint id."""
+    value = UUID(checkpoint_id).int
+    timestamp = ((value >> 80) << 12) | ((value >> 64) & 0x0FFF)
+    return datetime.fromtimestamp((timestamp - _UUID_EPOCH_OFFSET) / 1e7, tz=UTC)
+
+
+async def latest_checkpoint_ids(saver: BaseCheckpointSaver) -> list[tuple[str, str]]:
+    """
+    Return (thread_id, latest checkpoint_id) for every thread in the checkpointer.
+    Only the checkpoints table index is read, never the checkpoint blobs.
+    """
+    query = "SELECT thread_id, MAX(checkpoint_id) AS checkpoint_id FROM checkpoints GROUP BY thread_id"
+    if isinstance(saver, AsyncSqliteSaver):
+        await saver.setup()
+        async with saver.lock, saver.conn.execute(query) as cur:
+            return [(str(thread_id), checkpoint_id) async for thread_id, checkpoint_id in cur]
+    if isinstance(saver, AsyncPostgresSaver):
+        async with saver._cursor() as cur:
+            await cur.execute(query)
+            return [(row["thread_id"], row["checkpoint_id"]) for row in await cur.fetchall()]
+    raise TypeError(f"Listing threads is not supported for {type(saver).__name__}")
+
+
+async def execute(saver: BaseCheckpointSaver, query: str, params: tuple = ()) -> int:
+    """Run a statement, with ? placeholders, in the checkpointer's database and return the number of rows changed."""
+    if isinstance(saver, AsyncSqliteSaver):
+        await saver.setup()
+        async with saver.lock:
+            cur = await saver.conn.execute(query, params)
+            await saver.conn.commit()
+            return cur.rowcount
+    if isinstance(saver, AsyncPostgresSaver):
+        async with saver._cursor() as cur:
+            await cur.execute(query.replace("?", "%s"), params)
+            return cur.rowcount
+    raise TypeError(f"Executing statements is not supported for {type(saver).__name__}")
+
+
+async def fetchall(saver: BaseCheckpointSaver, query: str, params: tuple = ()) -> list[tuple]:
+    """Run a query, with ? placeholders, in the checkpointer's database and return its rows as tuples."""
+    if isinstance(saver, AsyncSqliteSaver):
+        await saver.setup()
+        async with saver.lock, saver.conn.execute(query, params) as cur:
+            return list(await cur.fetchall())
+    if isinstance(saver, AsyncPostgresSaver):
+        async with saver._cursor() as cur:
+            await cur.execute(query.replace("?", "%s"), params)
+            # Postgres rows are dicts keyed by column, in select order
+            return [tuple(row.values()) for row in await cur.fetchall()]
+    raise TypeError(f"Querying is not supported for {type(saver).__name__}")
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from core import settings  # noqa: E402
+from memory import initialize_database  # noqa: E402
+from memory.export import export_conversations  # noqa: E402
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with initialize_database(run_archiver=False) as saver:
+        await saver.setup()
+        result = await export_conversations(saver, args.output, since=args.since, full=args.full)
+    print(result.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export conversations, tool calls and token usage to Parquet.")
+    parser.add_argument("--output", default=settings.EXPORT_DIR, help="Output directory (default: EXPORT_DIR)")
+    parser.add_argument("--since", default=None, help="Checkpoint watermark to export from")
+    parser.add_argument("--full", action="store_true", help="Ignore the stored watermark and export everything")
+    asyncio.run(main(parser.parse_args()))
@@ -8,6 +8,20 @@ from core import settings
 
 load_dotenv()
 
+
+def worker_port(index: int) -> int:
+    return (settings.WORKER_BASE_PORT or settings.PORT + 1) + index
+
+
+def run_worker(index: int) -> None:
+    uvicorn.run(
+        "service:app",
+        host="127.0.0.1",
+        port=worker_port(index),
+        timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_SECONDS,
+    )
+
+
 if __name__ == "__main__":
     # Set Compatible event loop policy on Windows Systems.
     # On Windows systems, the default ProactorEventLoop can cause issues with
@@ -19,4 +33,25 @@ if __name__ == "__main__":
     # https://www.psycopg.org/psycopg3/docs/advanced/async.html#asynchronous-operations
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    uvicorn.run("service:app", host=settings.HOST, port=settings.PORT, reload=settings.is_dev())
+
+    if settings.WORKERS > 1:
+        # Multi-worker mode: a router on HOST:PORT sends each thread to the same worker process
+        from service.cluster import WorkerSupervisor, create_router_app
+
+        supervisor = WorkerSupervisor(run_worker, settings.WORKERS, stop_timeout=settings.SHUTDOWN_GRACE_SECONDS + 5)
+        worker_urls = [f"http://127.0.0.1:{worker_port(i)}" for i in range(settings.WORKERS)]
+        uvicorn.run(
+            create_router_app(worker_urls, supervisor=supervisor),
+            host=settings.HOST,
+            port=settings.PORT,
+            timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_SECONDS,
+        )
+    else:
+        uvicorn.run(
+            "service:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            reload=settings.is_dev(),
+            # Let in-flight SSE streams finish before the lifespan shutdown closes the checkpointer
+            timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_SECONDS,
+        )
@@ -4,10 +4,18 @@ from schema.schema import (
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
+    CircuitState,
+    Durability,
+    ExportInput,
+    ExportResult,
     Feedback,
     FeedbackResponse,
+    Priority,
+    RunInfo,
     ServiceMetadata,
     StreamInput,
+    ThreadInfo,
+    ThreadList,
     UserInput,
 )
 
@@ -16,10 +24,18 @@ __all__ = [
     "AllModelEnum",
     "UserInput",
     "ChatMessage",
+    "CircuitState",
+    "Durability",
+    "Priority",
     "ServiceMetadata",
     "StreamInput",
     "Feedback",
     "FeedbackResponse",
     "ChatHistoryInput",
     "ChatHistory",
+    "ExportInput",
+    "ExportResult",
+    "ThreadInfo",
+    "ThreadList",
+    "RunInfo",
 ]
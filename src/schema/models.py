@@ -54,6 +54,18 @@ class FakeModelName(StrEnum):
     FAKE = "fake"
 
 
+class RouterModelName(StrEnum):
+    """Picks a cheap or a strong model for each turn, see core.router"""
+
+    AUTO = "auto"
+
+
 AllModelEnum: TypeAlias = (
-    OpenAIModelName | OpenAICompatibleName | AzureOpenAIModelName | GoogleModelName | OllamaModelName | FakeModelName
+    OpenAIModelName
+    | OpenAICompatibleName
+    | AzureOpenAIModelName
+    | GoogleModelName
+    | OllamaModelName
+    | FakeModelName
+    | RouterModelName
 )
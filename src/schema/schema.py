@@ -1,3 +1,5 @@
+from datetime import datetime
+from enum import StrEnum
 from typing import Any, Literal, NotRequired
 
 from pydantic import BaseModel, Field, SerializeAsAny
@@ -6,6 +8,32 @@ from typing_extensions import TypedDict
 from schema.models import AllModelEnum, OpenAIModelName
 
 
+class Durability(StrEnum):
+    """When a run persists its graph state to the checkpointer.
+
+    ASYNC writes a checkpoint after every step in the background.
+    EXIT only writes the checkpoint at the end of the run (or when it is interrupted).
+    """
+
+    ASYNC = "async"
+    EXIT = "exit"
+
+
+class CircuitState(StrEnum):
+    """State of a model provider's circuit breaker. Calls are refused, or go to a fallback model, while it is open."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class Priority(StrEnum):
+    """Scheduling class of a request. Interactive requests get model and tool slots first."""
+
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
 class AgentInfo(BaseModel):
     """Info about an available agent."""
 
@@ -35,6 +63,11 @@ class ServiceMetadata(BaseModel):
     default_model: AllModelEnum = Field(
         description="Default model used when none is specified.",
     )
+    circuit_breakers: dict[str, CircuitState] = Field(
+        default={},
+        description="State of the circuit breaker of each model provider that has been called.",
+        examples=[{"openai": "closed", "google": "open"}],
+    )
 
 
 class UserInput(BaseModel):
@@ -50,16 +83,49 @@ class UserInput(BaseModel):
         default=OpenAIModelName.GPT_4O,
         examples=[OpenAIModelName.GPT_4O],
     )
+    temperature: float | None = Field(
+        description="Sampling temperature of the model. Defaults to the model's configured temperature.",
+        default=None,
+        ge=0,
+        le=2,
+        examples=[0.2],
+    )
+    max_tokens: int | None = Field(
+        description="Maximum number of tokens the model may generate per call.",
+        default=None,
+        ge=1,
+        examples=[1024],
+    )
     thread_id: str | None = Field(
-        description="Thread ID to persist and continue a multi-turn conversation.",
+        description="Thread ID to persist and continue a multi-turn conversation. "
+        "If omitted, the run is ephemeral and nothing is persisted.",
         default=None,
         examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
     )
+    ephemeral: bool = Field(
+        description="Run without loading or saving any conversation state, even if thread_id is set.",
+        default=False,
+    )
     agent_config: dict[str, Any] = Field(
         description="Additional configuration to pass through to the agent",
         default={},
         examples=[{"spicy_level": 0.8}],
     )
+    durability: Durability | None = Field(
+        description="Checkpoint durability for this run. Defaults to the agent's configured durability.",
+        default=None,
+        examples=[Durability.EXIT],
+    )
+    user_id: str | None = Field(
+        description="ID of the user the thread belongs to, used to list a user's threads.",
+        default=None,
+        examples=["user-123"],
+    )
+    coalesce: bool = Field(
+        description="If the thread already has a run in progress, merge this message with any others "
+        "queued behind it into a single run. Merged requests all receive that run's final response.",
+        default=False,
+    )
 
 
 class StreamInput(UserInput):
@@ -168,3 +234,92 @@ class ChatHistoryInput(BaseModel):
 
 class ChatHistory(BaseModel):
     messages: list[ChatMessage]
+
+
+class ExportInput(BaseModel):
+    """Input for exporting conversations to Parquet."""
+
+    since: str | None = Field(
+        description="Checkpoint watermark to export from. Defaults to the watermark of the previous export.",
+        default=None,
+        examples=["1efb3b6c-6a3e-6b1e-8003-8a0c6d7e2f11"],
+    )
+    full: bool = Field(
+        description="Ignore the stored watermark and export every thread.",
+        default=False,
+    )
+
+
+class ExportResult(BaseModel):
+    """Summary of a conversation export."""
+
+    watermark: str = Field(
+        description="Watermark to pass as `since` for the next incremental export.",
+    )
+    threads: int = Field(description="Number of threads exported.")
+    messages: int = Field(description="Number of message rows written.")
+    tool_calls: int = Field(description="Number of tool call rows written.")
+    token_usage: int = Field(description="Number of token usage rows written.")
+
+
+class ThreadInfo(BaseModel):
+    """Metadata about a conversation thread."""
+
+    thread_id: str = Field(
+        description="Thread ID.",
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+    user_id: str | None = Field(
+        description="ID of the user the thread belongs to.",
+        default=None,
+        examples=["user-123"],
+    )
+    agent_id: str = Field(
+        description="Agent that last ran on the thread.",
+        examples=["research-assistant"],
+    )
+    title: str | None = Field(
+        description="Thread title, taken from the first user message.",
+        default=None,
+        examples=["What is the weather in Tokyo?"],
+    )
+    message_count: int = Field(
+        description="Number of messages in the thread.",
+        examples=[4],
+    )
+    created_at: datetime = Field(description="When the thread was created.")
+    updated_at: datetime = Field(description="When the thread was last updated.")
+
+
+class RunInfo(BaseModel):
+    """An agent run in progress."""
+
+    run_id: str = Field(
+        description="Run ID.",
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+    thread_id: str | None = Field(
+        description="Thread the run belongs to, or null for ephemeral runs.",
+        default=None,
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+    agent_id: str = Field(
+        description="Agent executing the run.",
+        examples=["research-assistant"],
+    )
+    started_at: datetime = Field(description="When the run started.")
+    current_node: str | None = Field(
+        description="Graph node the run is currently executing.",
+        default=None,
+        examples=["model"],
+    )
+
+
+class ThreadList(BaseModel):
+    """A page of threads, most recently updated first."""
+
+    threads: list[ThreadInfo]
+    next_cursor: str | None = Field(
+        description="Cursor for the next page, or null if this is the last page.",
+        default=None,
+    )
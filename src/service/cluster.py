@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager, suppress
+from multiprocessing.process import BaseProcess
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from service.utils import on_shutdown_signal
+
+logger = logging.getLogger(__name__)
+
+# Hop-by-hop headers are per connection and must not be forwarded by a proxy
+_HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+}
+
+
+def worker_for_thread(thread_id: str, workers: int) -> int:
+    """Stable mapping of a thread to a worker. Python's hash() is salted per process, so it can't be used."""
+    digest = hashlib.blake2b(thread_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest) % workers
+
+
+def _request_thread_id(request: Request, body: bytes) -> str | None:
+    if thread_id := request.query_params.get("thread_id"):
+        return thread_id
+    if not body or not request.headers.get("content-type", "").startswith("application/json"):
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    thread_id = payload.get("thread_id") if isinstance(payload, dict) else None
+    return str(thread_id) if thread_id else None
+
+
+def create_router_app(
+    worker_urls: list[str],
+    *,
+    supervisor: "WorkerSupervisor | None" = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> FastAPI:
+    """
+    Front app that proxies every request to one of the workers.
+
+    Requests for a thread always go to the same worker, so per-process state such
+    as the run serialization locks and model caches stays coherent. Requests without
+    a thread_id are spread round-robin.
+    """
+    clients = [httpx.AsyncClient(base_url=url, timeout=None, transport=transport) for url in worker_urls]
+    round_robin = itertools.cycle(range(len(clients)))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+        watch_task = None
+        if supervisor is not None:
+            supervisor.start()
+            watch_task = asyncio.create_task(supervisor.watch())
+            # Workers start draining right away, while this router waits for its proxied requests
+            on_shutdown_signal(supervisor.terminate)
+        try:
+            yield
+        finally:
+            if watch_task is not None:
+                watch_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await watch_task
+                await asyncio.to_thread(supervisor.stop)
+            for client in clients:
+                await client.aclose()
+
+    app = FastAPI(lifespan=lifespan, openapi_url=None)
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    async def readiness_check():
+        """Ready only once every worker is ready."""
+
+        async def worker_ready(client: httpx.AsyncClient) -> bool:
+            try:
+                return (await client.get("/ready", timeout=5)).status_code == 200
+            except httpx.HTTPError:
+                return False
+
+        ready = await asyncio.gather(*(worker_ready(c) for c in clients))
+        if not all(ready):
+            return JSONResponse({"detail": f"{len(ready) - sum(ready)} workers not ready"}, status_code=503)
+        return {"status": "ready"}
+
+    @app.post("/admin/agents/{agent_id}/reload")
+    async def reload(request: Request) -> JSONResponse:
+        """
+        Reload the agent in every worker, since each one imports its own copy. Returns the
+        response of each worker, with the most severe of their status codes.
+        """
+        body = await request.body()
+
+        async def reload_worker(index: int) -> dict:
+            client = clients[index]
+            try:
+                response = await client.send(_worker_request(client, request, body))
+            except httpx.HTTPError as e:
+                logger.error(f"Worker {index} is unavailable: {e}")
+                return {"worker": index, "status_code": 503, "body": {"detail": "Worker unavailable"}}
+            try:
+                content = response.json()
+            except ValueError:
+                content = response.text
+            return {"worker": index, "status_code": response.status_code, "body": content}
+
+        results = await asyncio.gather(*(reload_worker(i) for i in range(len(clients))))
+        return JSONResponse({"workers": results}, status_code=max(r["status_code"] for r in results))
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def proxy(request: Request) -> Response:
+        body = await request.body()
+        thread_id = _request_thread_id(request, body)
+        index = worker_for_thread(thread_id, len(clients)) if thread_id else next(round_robin)
+        client = clients[index]
+        worker_request = _worker_request(client, request, body)
+        try:
+            worker_response = await client.send(worker_request, stream=True)
+        except httpx.HTTPError as e:
+            logger.error(f"Worker {index} is unavailable: {e}")
+            return JSONResponse({"detail": "Worker unavailable"}, status_code=503)
+        # The body is re-streamed decoded, so its original encoding and length no longer apply
+        response_headers = {
+            k: v
+            for k, v in worker_response.headers.items()
+            if k.lower() not in (*_HOP_BY_HOP_HEADERS, "content-encoding", "content-length")
+        }
+        # Stream chunks through as they arrive so SSE responses aren't buffered
+        return StreamingResponse(
+            worker_response.aiter_bytes(),
+            status_code=worker_response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(worker_response.aclose),
+        )
+
+    return app
+
+
+def _worker_request(client: httpx.AsyncClient, request: Request, body: bytes) -> httpx.Request:
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_BY_HOP_HEADERS]
+    return client.build_request(
+        request.method,
+        request.url.path,
+        params=request.query_params,
+        headers=headers,
+        content=body,
+    )
+
+
+class WorkerSupervisor:
+    """Runs `target(index)` in one process per worker and restarts workers that exit."""
+
+    def __init__(self, target: Callable[[int], None], workers: int, *, stop_timeout: float = 30) -> None:
+        self.target = target
+        self.workers = workers
+        self.stop_timeout = stop_timeout
+        self.processes: list[BaseProcess | None] = [None] * workers
+        self.restarts = 0
+        # Spawn rather than fork, so workers don't inherit the supervisor's event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = False
+        self._stop_deadline = 0.0
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._start_worker(index)
+
+    def _start_worker(self, index: int) -> None:
+        process = self._context.Process(target=self.target, args=(index,), name=f"agent-worker-{index}", daemon=False)
+        process.start()
+        self.processes[index] = process
+
+    async def watch(self, interval: float = 1) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self._stopping:
+                return
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.warning(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._start_worker(index)
+
+    def terminate(self) -> None:
+        """Ask every worker to shut down gracefully, without waiting for them. They get `stop_timeout` from now."""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._stop_deadline = time.monotonic() + self.stop_timeout
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+
+    def stop(self) -> None:
+        """Ask every worker to shut down gracefully, killing any that haven't exited by the stop deadline."""
+        self.terminate()
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(self._stop_deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {self.stop_timeout}s, killing it")
+                process.kill()
+                process.join()
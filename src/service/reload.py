@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import os
+
+from agents import agent_source_files, get_all_agent_info, reload_agent
+
+logger = logging.getLogger(__name__)
+
+
+def _mtimes(files: list[str]) -> dict[str, float]:
+    mtimes = {}
+    for file in files:
+        try:
+            mtimes[file] = os.stat(file).st_mtime
+        except OSError:
+            continue
+    return mtimes
+
+
+async def watch_agents(interval: float) -> None:
+    """
+    Reload loaded agents whenever one of their source files changes.
+
+    File modification times are polled, so no file watching dependency is needed. A
+    change that fails to import is logged and the agent keeps serving its previous graph.
+    """
+    seen: dict[str, dict[str, float]] = {}
+    while True:
+        for agent_info in get_all_agent_info():
+            agent_id = agent_info.key
+            mtimes = _mtimes(agent_source_files(agent_id))
+            if not mtimes:
+                # Not loaded yet, so it will be imported fresh on first use
+                continue
+            previous = seen.setdefault(agent_id, mtimes)
+            if mtimes == previous:
+                continue
+            try:
+                await asyncio.to_thread(reload_agent, agent_id)
+                logger.info(f"Reloaded agent {agent_id}")
+            except Exception as e:
+                logger.error(f"Failed to reload agent {agent_id}: {e}")
+            # Only retry a failed reload once the files change again
+            seen[agent_id] = _mtimes(agent_source_files(agent_id))
+        await asyncio.sleep(interval)
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from memory.runs import INTERRUPTED, RunIndex
+from schema import RunInfo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class RunBatch:
+    """
+    The user messages sent to an agent in one run, and that run's result.
+
+    `merged` is True for requests whose message was merged into a run started by
+    another request. Those requests don't run the agent themselves and should await
+    `result`, which the request running the agent sets once it has its output.
+    """
+
+    messages: list[str]
+    result: asyncio.Future = field(repr=False)
+    merged: bool = False
+    followers: int = field(default=0, repr=False)
+
+
+@dataclass(eq=False)
+class _ThreadState:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Batch waiting for the lock that later messages can still be merged into
+    open_batch: RunBatch | None = None
+    users: int = 0
+
+
+class ThreadRunQueue:
+    """
+    Serializes runs on the same thread within this process.
+
+    Two concurrent runs on a thread would read the same checkpoint and race, so each
+    run holds the thread's lock from the state lookup until its last checkpoint write.
+    With `coalesce=True`, messages arriving while the thread is busy are merged into a
+    single queued run instead of each making its own LLM round trip.
+    """
+
+    def __init__(self) -> None:
+        self._threads: dict[str, _ThreadState] = {}
+
+    def is_busy(self, thread_id: str) -> bool:
+        state = self._threads.get(thread_id)
+        return state is not None and state.lock.locked()
+
+    @asynccontextmanager
+    async def run(self, thread_id: str | None, message: str, coalesce: bool = False) -> AsyncIterator[RunBatch]:
+        loop = asyncio.get_running_loop()
+        if thread_id is None:
+            # Nothing is persisted, so there is nothing to race on
+            yield RunBatch(messages=[message], result=loop.create_future())
+            return
+
+        state = self._threads.setdefault(thread_id, _ThreadState())
+        state.users += 1
+        try:
+            if coalesce and state.open_batch is not None:
+                batch = state.open_batch
+                batch.messages.append(message)
+                batch.followers += 1
+                yield RunBatch(messages=batch.messages, result=batch.result, merged=True)
+                return
+
+            batch = RunBatch(messages=[message], result=loop.create_future())
+            if coalesce:
+                state.open_batch = batch
+            try:
+                async with state.lock:
+                    if state.open_batch is batch:
+                        state.open_batch = None
+                    try:
+                        yield batch
+                    except Exception as e:
+                        if batch.followers and not batch.result.done():
+                            batch.result.set_exception(e)
+                        raise
+                    finally:
+                        if batch.followers and not batch.result.done():
+                            batch.result.set_exception(RuntimeError("Run ended without a result"))
+            finally:
+                if state.open_batch is batch:
+                    state.open_batch = None
+        finally:
+            state.users -= 1
+            if not state.users:
+                del self._threads[thread_id]
+
+
+@dataclass
+class ActiveRun:
+    run_id: str
+    thread_id: str | None
+    agent_id: str
+    started_at: datetime
+    task: asyncio.Task | None = field(default=None, repr=False)
+    current_node: str | None = None
+    # Set when the run is cancelled on request, as opposed to by a shutdown
+    cancel_requested: bool = False
+
+    def info(self) -> RunInfo:
+        return RunInfo(
+            run_id=self.run_id,
+            thread_id=self.thread_id,
+            agent_id=self.agent_id,
+            started_at=self.started_at,
+            current_node=self.current_node,
+        )
+
+
+class NodeTracker(BaseCallbackHandler):
+    """Callback handler that records the graph node a run is executing."""
+
+    # Called directly on the event loop rather than in an executor, it only sets an attribute
+    run_inline = True
+
+    def __init__(self, run: ActiveRun) -> None:
+        self.run = run
+
+    def on_chain_start(
+        self, serialized: Any, inputs: Any, *, metadata: dict[str, Any] | None = None, **kwargs: Any
+    ) -> None:
+        if metadata and (node := metadata.get("langgraph_node")):
+            self.run.current_node = node
+
+
+class RunRegistry:
+    """Agent runs in progress in this process, so they can be cancelled or drained on shutdown."""
+
+    def __init__(self) -> None:
+        self.runs: dict[str, ActiveRun] = {}
+        self.draining = False
+        self._drain_deadline: float | None = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextmanager
+    def track(self, run_id: str, *, thread_id: str | None, agent_id: str) -> Iterator[ActiveRun]:
+        run = ActiveRun(run_id, thread_id, agent_id, datetime.now(UTC), asyncio.current_task())
+        self.runs[run_id] = run
+        self._idle.clear()
+        try:
+            yield run
+        finally:
+            del self.runs[run_id]
+            if not self.runs:
+                self._idle.set()
+
+    def cancel(self, run_id: str) -> bool:
+        """Cancel a run in this process. Cancelling its task releases any model or tool slot it holds."""
+        run = self.runs.get(run_id)
+        if run is None or run.task is None:
+            return False
+        run.cancel_requested = True
+        run.task.cancel()
+        return True
+
+    def start_draining(self, grace_period: float) -> None:
+        """Stop accepting runs, giving in-flight runs `grace_period` seconds from now to finish."""
+        if self._drain_deadline is None:
+            self._drain_deadline = time.monotonic() + grace_period
+        self.draining = True
+
+    async def drain(self, grace_period: float) -> int:
+        """
+        Stop accepting runs and wait up to `grace_period` seconds for in-flight runs to
+        finish, counted from `start_draining` if it was called. Runs still going after
+        that are cancelled. Returns how many were cancelled.
+        """
+        self.start_draining(grace_period)
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(self._drain_deadline - time.monotonic(), 0))
+        except TimeoutError:
+            pass
+        finally:
+            self._drain_deadline = None
+        tasks = [run.task for run in self.runs.values() if run.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+        return len(tasks)
+
+
+async def sync_run_index(
+    registry: RunRegistry,
+    index: RunIndex,
+    interval: float,
+    orphan_timeout: float,
+    on_interrupted: Callable[[RunInfo], None] | None = None,
+) -> None:
+    """
+    Keep the shared run index in step with this process's runs: refresh their heartbeat
+    and current node, and cancel runs whose cancellation was requested through another
+    worker.
+
+    Runs whose heartbeat is older than `orphan_timeout` seconds were left behind by a
+    worker that died, and are marked interrupted. `on_interrupted` is called with each
+    interrupted run, for example to resume it.
+    """
+    published: dict[str, str | None] = {}
+    while True:
+        try:
+            now = datetime.now(UTC)
+            await index.heartbeat(list(registry.runs), now)
+            nodes = {run_id: run.current_node for run_id, run in registry.runs.items()}
+            await index.set_current_nodes({k: v for k, v in nodes.items() if published.get(k) != v})
+            published = nodes
+            for run_id in await index.cancel_requests():
+                run = registry.runs.get(run_id)
+                if run is not None and not run.cancel_requested and registry.cancel(run_id):
+                    logger.info(f"Cancelled run {run_id} on request")
+            await index.sweep_orphans(now - timedelta(seconds=orphan_timeout))
+            if on_interrupted is not None:
+                for run_info in await index.list_runs(INTERRUPTED):
+                    on_interrupted(run_info)
+        except Exception as e:
+            logger.error(f"Error syncing the run index: {e}")
+        await asyncio.sleep(interval)
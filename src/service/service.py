@@ -1,56 +1,124 @@
+import asyncio
 import json
 import logging
 import warnings
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
-from typing import Annotated, Any
+from contextlib import AbstractAsyncContextManager, asynccontextmanager, suppress
+from typing import TYPE_CHECKING, Annotated, Any
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langchain_core._api import LangChainBetaWarning
 from langchain_core.messages import AIMessage, AIMessageChunk, AnyMessage, HumanMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.constants import CONFIG_KEY_CHECKPOINTER
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command, Interrupt
 
-from agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents import (
+    DEFAULT_AGENT,
+    get_agent,
+    get_agent_durability,
+    get_all_agent_info,
+    reload_agent,
+    set_agent_checkpointer,
+    uses_response_cache,
+    uses_semantic_cache,
+)
 from core import settings
+from core.cache import CACHE_CONFIG_KEY, response_cache
+from core.breaker import CircuitOpenError, circuit_breakers, circuit_states
+from core.context import context_stats
+from core.deployments import deployment_stats
+from core.hedging import hedge_stats
+from core.ratelimit import rate_limit_stats
+from core.router import model_router
+from core.transport import transport_stats
 from memory import initialize_database
+from memory.routing import RoutingStore
+from memory.runs import INTERRUPTED, RunIndex
+from memory.threads import ThreadIndex
 from schema import (
+    AgentInfo,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
+    Durability,
+    ExportInput,
+    ExportResult,
     Feedback,
     FeedbackResponse,
+    Priority,
+    RunInfo,
     ServiceMetadata,
     StreamInput,
+    ThreadList,
     UserInput,
 )
+from service.reload import watch_agents
+from service.runs import ActiveRun, NodeTracker, RunBatch, RunRegistry, ThreadRunQueue, sync_run_index
 from service.utils import (
     convert_message_content_to_string,
     langchain_to_chat_message,
+    on_shutdown_signal,
     remove_tool_calls,
 )
+from service.warmup import warm_up
+
+if TYPE_CHECKING:
+    from core.semantic_cache import SemanticCache
 
 warnings.filterwarnings("ignore", category=LangChainBetaWarning)
 logger = logging.getLogger(__name__)
 
+# Runs on a thread are serialized so they never read and write the same checkpoint concurrently
+thread_runs = ThreadRunQueue()
+# Runs in progress, drained on shutdown
+active_runs = RunRegistry()
+# Interrupted runs being resumed in the background
+_resume_tasks: set[asyncio.Task] = set()
+# Runs whose resume failed in this process, which are only retried on request
+_failed_resumes: set[str] = set()
+# Answers to stateless turns. Imported only when enabled, so NumPy isn't loaded at startup otherwise.
+semantic_cache: "SemanticCache | None" = None
+if settings.SEMANTIC_CACHE:
+    from core.semantic_cache import SemanticCache
+
+    semantic_cache = SemanticCache(
+        settings.SEMANTIC_CACHE_CAPACITY, settings.SEMANTIC_CACHE_THRESHOLD, settings.SEMANTIC_CACHE_TTL_SECONDS
+    )
+
+
+bearer = HTTPBearer(description="Please provide AUTH_SECRET api key.", auto_error=False)
+
 
 def verify_bearer(
-    http_auth: Annotated[
-        HTTPAuthorizationCredentials | None,
-        Depends(HTTPBearer(description="Please provide AUTH_SECRET api key.", auto_error=False)),
-    ],
+    http_auth: Annotated[HTTPAuthorizationCredentials | None, Depends(bearer)],
 ) -> None:
     if not settings.AUTH_SECRET:
         return
-    auth_secret = settings.AUTH_SECRET.get_secret_value()
-    if not http_auth or http_auth.credentials != auth_secret:
+    auth_secrets = {s.get_secret_value() for s in (settings.AUTH_SECRET, settings.BATCH_AUTH_SECRET) if s}
+    if not http_auth or http_auth.credentials not in auth_secrets:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
 
+def request_priority(
+    http_auth: Annotated[HTTPAuthorizationCredentials | None, Depends(bearer)],
+    x_priority: Annotated[Priority | None, Header()] = None,
+) -> Priority:
+    """
+    Scheduling priority of a request. Requests made with BATCH_AUTH_SECRET are always
+    batch, otherwise the X-Priority header decides and defaults to interactive.
+    """
+    batch_secret = settings.BATCH_AUTH_SECRET
+    if batch_secret and http_auth and http_auth.credentials == batch_secret.get_secret_value():
+        return Priority.BATCH
+    return x_priority or Priority.INTERACTIVE
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
@@ -59,16 +127,64 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     try:
         async with initialize_database() as saver:
             await saver.setup()
-            agents = get_all_agent_info()
-            for a in agents:
-                agent = get_agent(a.key)
-                agent.checkpointer = saver
-            yield
+            thread_index = ThreadIndex(saver)
+            await thread_index.setup()
+            app.state.thread_index = thread_index
+            run_index = RunIndex(saver)
+            await run_index.setup()
+            app.state.run_index = run_index
+            routing_store = RoutingStore(saver)
+            await routing_store.setup()
+            app.state.routing_store = routing_store
+            # Agents are loaded lazily and pick up the checkpointer when first used
+            set_agent_checkpointer(saver)
+            active_runs.draining = False
+            # Stop taking runs as soon as shutdown starts, rather than after uvicorn's grace period,
+            # and let in-flight runs use what is left of SHUTDOWN_GRACE_SECONDS after that
+            on_shutdown_signal(lambda: active_runs.start_draining(settings.SHUTDOWN_GRACE_SECONDS))
+            # /ready fails until warm-up is done, while /health passes as soon as the server is up
+            background_tasks = [
+                asyncio.create_task(_warm_up(app, saver)),
+                asyncio.create_task(
+                    sync_run_index(
+                        active_runs,
+                        run_index,
+                        settings.RUN_SYNC_INTERVAL_SECONDS,
+                        settings.RUN_ORPHAN_TIMEOUT_SECONDS,
+                        on_interrupted=_resume_in_background if settings.RESUME_INTERRUPTED_RUNS else None,
+                    )
+                ),
+                asyncio.create_task(routing_store.run_periodically(model_router, settings.RUN_SYNC_INTERVAL_SECONDS)),
+            ]
+            if settings.AGENT_RELOAD_INTERVAL_SECONDS > 0:
+                background_tasks.append(asyncio.create_task(watch_agents(settings.AGENT_RELOAD_INTERVAL_SECONDS)))
+            try:
+                yield
+            finally:
+                for task in background_tasks:
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+                # Let in-flight runs finish before the saver flushes pending writes and closes
+                if cancelled := await active_runs.drain(settings.SHUTDOWN_GRACE_SECONDS):
+                    logger.warning(f"Cancelled {cancelled} runs still in progress after the shutdown grace period")
     except Exception as e:
         logger.error(f"Error during database initialization: {e}")
         raise
 
 
+async def _warm_up(app: FastAPI, saver: BaseCheckpointSaver) -> None:
+    app.state.ready = False
+    try:
+        if settings.WARMUP:
+            await warm_up(saver)
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+    finally:
+        # Warm-up only saves the first requests some latency, so the service is ready regardless
+        app.state.ready = True
+
+
 app = FastAPI(lifespan=lifespan)
 router = APIRouter(dependencies=[Depends(verify_bearer)])
 
@@ -82,18 +198,66 @@ async def info() -> ServiceMetadata:
         models=models,
         default_agent=DEFAULT_AGENT,
         default_model=settings.DEFAULT_MODEL,
+        circuit_breakers=circuit_states(),
     )
 
 
-async def _handle_input(user_input: UserInput, agent: CompiledStateGraph) -> tuple[dict[str, Any], UUID]:
+def _is_ephemeral(user_input: UserInput) -> bool:
+    """One-shot requests without a thread_id can never be continued, so they aren't persisted."""
+    return user_input.ephemeral or not user_input.thread_id
+
+
+def _semantic_cache_namespace(user_input: UserInput, agent_id: str) -> str | None:
+    """
+    Semantic cache namespace of a turn, or None if it can't be answered from the cache.
+    Only stateless turns are, since an answer that depends on earlier messages of a
+    thread can't be reused for another thread.
+    """
+    if semantic_cache is None or not _is_ephemeral(user_input) or not uses_semantic_cache(agent_id):
+        return None
+    model = [user_input.model, user_input.temperature, user_input.max_tokens]
+    return json.dumps([agent_id, model, user_input.agent_config], sort_keys=True, default=str)
+
+
+def _model_configurable(user_input: UserInput, streaming: bool) -> dict[str, Any]:
+    """The model and its parameters, which agents read with core.config_model_params."""
+    return {
+        "model": user_input.model,
+        "temperature": user_input.temperature,
+        "max_tokens": user_input.max_tokens,
+        "streaming": streaming,
+    }
+
+
+async def _handle_input(
+    user_input: UserInput,
+    agent: CompiledStateGraph,
+    agent_id: str = DEFAULT_AGENT,
+    messages: list[str] | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    streaming: bool = True,
+) -> tuple[dict[str, Any], UUID]:
     """
     Parse user input and handle any required interrupt resumption.
     Returns kwargs for agent invocation and the run_id.
+
+    `messages` overrides the user input's message when several coalesced messages
+    are sent in one run. `streaming` picks the model variant that streams every call,
+    which is only worth it when the response is streamed to the client.
+    Ephemeral runs skip the checkpointer entirely: no state lookup and no checkpoint writes.
     """
+    messages = messages or [user_input.message]
     run_id = uuid4()
     thread_id = user_input.thread_id or str(uuid4())
 
-    configurable = {"thread_id": thread_id, "model": user_input.model}
+    # Model and tool calls are scheduled by the run's priority, see core.scheduler
+    configurable = {
+        "thread_id": thread_id,
+        "run_id": str(run_id),
+        **_model_configurable(user_input, streaming),
+        "priority": priority,
+        CACHE_CONFIG_KEY: uses_response_cache(agent_id),
+    }
 
     if user_input.agent_config:
         if overlap := configurable.keys() & user_input.agent_config.keys():
@@ -103,32 +267,142 @@ async def _handle_input(user_input: UserInput, agent: CompiledStateGraph) -> tup
             )
         configurable.update(user_input.agent_config)
 
+    ephemeral = _is_ephemeral(user_input)
+    if ephemeral:
+        configurable[CONFIG_KEY_CHECKPOINTER] = None
+
     config = RunnableConfig(
         configurable=configurable,
         run_id=run_id,
     )
 
-    # Check for interrupts that need to be resumed
-    state = await agent.aget_state(config=config)
-    interrupted_tasks = [task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts]
+    interrupted_tasks = []
+    if not ephemeral:
+        # Check for interrupts that need to be resumed
+        state = await agent.aget_state(config=config)
+        interrupted_tasks = [task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts]
 
     if interrupted_tasks:
         # assume user input is response to resume agent execution from interrupt
-        input = Command(resume=user_input.message)
+        input = Command(resume="\n\n".join(messages))
     else:
-        input = {"messages": [HumanMessage(content=user_input.message)]}
+        input = {"messages": [HumanMessage(content=message) for message in messages]}
+
+    # With EXIT durability only the final (or interrupted) state is checkpointed,
+    # skipping the intermediate model -> tools -> model writes.
+    durability = user_input.durability or get_agent_durability(agent_id)
 
     kwargs = {
         "input": input,
         "config": config,
+        "checkpoint_during": durability != Durability.EXIT,
     }
 
     return kwargs, run_id
 
 
+def _check_accepting_runs() -> None:
+    if active_runs.draining:
+        raise HTTPException(status_code=503, detail="Service is shutting down", headers={"Retry-After": "1"})
+
+
+def _thread_run(user_input: UserInput) -> AbstractAsyncContextManager[RunBatch]:
+    """Wait for the thread's turn to run. Ephemeral runs don't share state, so they never wait."""
+    thread_id = None if _is_ephemeral(user_input) else user_input.thread_id
+    return thread_runs.run(thread_id, user_input.message, coalesce=user_input.coalesce)
+
+
+@asynccontextmanager
+async def _track_run(
+    run_id: UUID, user_input: UserInput, agent_id: str, kwargs: dict[str, Any], resumed: bool = False
+) -> AsyncGenerator[ActiveRun, None]:
+    """
+    Register a run so it can be listed and cancelled, locally and through the shared
+    run index. Index failures are logged, never raised.
+
+    Persisted runs that checkpoint every step are saved with their input, so if the
+    process dies or shuts down mid-run they can be resumed from their last checkpoint.
+    A `resumed` run already took over the index entry of the run it resumes, and puts
+    it back as interrupted if it fails.
+    """
+    run_index: RunIndex | None = getattr(app.state, "run_index", None)
+    config: RunnableConfig = kwargs["config"]
+    resumable = not _is_ephemeral(user_input) and kwargs["checkpoint_during"]
+    interrupted = False
+    with active_runs.track(str(run_id), thread_id=user_input.thread_id, agent_id=agent_id) as run:
+        config["callbacks"] = [*(config.get("callbacks") or []), NodeTracker(run)]
+        if run_index is not None and not resumed:
+            try:
+                await run_index.add(
+                    run.run_id,
+                    thread_id=run.thread_id,
+                    agent_id=agent_id,
+                    started_at=run.started_at,
+                    user_input=user_input.model_dump_json() if resumable else None,
+                )
+            except Exception as e:
+                logger.error(f"Error publishing run: {e}")
+                run_index = None
+        try:
+            yield run
+        except asyncio.CancelledError:
+            # Cut short by a shutdown rather than a cancel request, so it can be picked up again
+            interrupted = resumable and active_runs.draining and not run.cancel_requested
+            raise
+        except Exception:
+            interrupted = resumed
+            raise
+        finally:
+            if run_index is not None:
+                try:
+                    if interrupted:
+                        await run_index.mark_interrupted(run.run_id)
+                    else:
+                        await run_index.remove(run.run_id)
+                except Exception as e:
+                    logger.error(f"Error removing run from the index: {e}")
+
+
+def _cancelled_on_request(run: ActiveRun) -> bool:
+    """Whether a run's CancelledError came from a cancel request rather than a shutdown or disconnect."""
+    if not run.cancel_requested:
+        return False
+    # The request itself carries on to report the cancellation
+    asyncio.current_task().uncancel()
+    return True
+
+
+def _count_update_messages(updates: Any) -> int:
+    """Count the messages a node added to the graph state in an "updates" stream event."""
+    if not isinstance(updates, dict):
+        return 0
+    return len(updates.get("messages", []))
+
+
+async def _record_run(user_input: UserInput, agent_id: str, config: RunnableConfig, new_messages: int) -> None:
+    """Update the thread metadata index after a run. Failures are logged, never raised."""
+    thread_index: ThreadIndex | None = getattr(app.state, "thread_index", None)
+    if thread_index is None or _is_ephemeral(user_input):
+        return
+    try:
+        await thread_index.record_run(
+            config["configurable"]["thread_id"],
+            agent_id=agent_id,
+            user_id=user_input.user_id,
+            title=user_input.message,
+            new_messages=new_messages,
+        )
+    except Exception as e:
+        logger.error(f"Error updating thread metadata: {e}")
+
+
 @router.post("/{agent_id}/invoke")
 @router.post("/invoke")
-async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMessage:
+async def invoke(
+    user_input: UserInput,
+    agent_id: str = DEFAULT_AGENT,
+    priority: Annotated[Priority, Depends(request_priority)] = Priority.INTERACTIVE,
+) -> ChatMessage:
     """
     Invoke an agent with user input to retrieve a final response.
 
@@ -141,8 +415,45 @@ async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMe
     # in interrupt-agent, or a tool step in research-assistant), it's omitted. Arguably,
     # you'd want to include it. You could update the API to return a list of ChatMessages
     # in that case.
+    _check_accepting_runs()
     agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = await _handle_input(user_input, agent)
+    cache_namespace = _semantic_cache_namespace(user_input, agent_id)
+    if cache_namespace is not None and (cached := semantic_cache.get(cache_namespace, user_input.message)):
+        return cached.model_copy(update={"run_id": str(uuid4())})
+    async with _thread_run(user_input) as batch:
+        if batch.merged:
+            # The message was sent as part of a run started by another request
+            try:
+                output: ChatMessage | None = await batch.result
+            except Exception as e:
+                logger.error(f"An exception occurred: {e}")
+                raise HTTPException(status_code=500, detail="Unexpected error")
+            if output is None:
+                # A streamed run can end without a final message
+                raise HTTPException(status_code=500, detail="The run ended without a response")
+            return output.model_copy()
+        kwargs, run_id = await _handle_input(user_input, agent, agent_id, batch.messages, priority, streaming=False)
+        async with _track_run(run_id, user_input, agent_id, kwargs) as run:
+            try:
+                output = await _invoke_agent(user_input, agent, agent_id, kwargs, run_id, len(batch.messages))
+            except asyncio.CancelledError:
+                if not _cancelled_on_request(run):
+                    raise
+                raise HTTPException(status_code=409, detail="Run was cancelled")
+        batch.result.set_result(output)
+        if cache_namespace is not None:
+            semantic_cache.set(cache_namespace, user_input.message, output)
+        return output
+
+
+async def _invoke_agent(
+    user_input: UserInput,
+    agent: CompiledStateGraph,
+    agent_id: str,
+    kwargs: dict[str, Any],
+    run_id: UUID,
+    input_messages: int,
+) -> ChatMessage:
     try:
         response_events = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])
         response_type, response = response_events[-1]
@@ -156,89 +467,212 @@ async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMe
         else:
             raise ValueError(f"Unexpected response type: {response_type}")
 
+        new_messages = 0 if isinstance(kwargs["input"], Command) else input_messages
+        for event_type, event in response_events:
+            if event_type == "updates":
+                new_messages += sum(_count_update_messages(updates) for updates in event.values())
+        await _record_run(user_input, agent_id, kwargs["config"], new_messages)
+
         output.run_id = str(run_id)
         return output
+    except CircuitOpenError as e:
+        retry_after = str(int(settings.CIRCUIT_OPEN_SECONDS))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": retry_after})
     except Exception as e:
         logger.error(f"An exception occurred: {e}")
         raise HTTPException(status_code=500, detail="Unexpected error")
 
 
-async def message_generator(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> AsyncGenerator[str, None]:
+async def _resume_run(run_id: str, priority: Priority = Priority.INTERACTIVE) -> ChatMessage | None:
+    """
+    Continue an interrupted run from its thread's last checkpoint. Steps that completed
+    before the interruption, including their tool calls, are not run again. A run
+    interrupted before it checkpointed its input is started over with that input.
+
+    The resumed run takes over the interrupted run's entry in the run index, which
+    goes back to interrupted if the resumed run fails.
+
+    Returns None if the run isn't interrupted or was already claimed by another worker.
+    """
+    run_index: RunIndex | None = getattr(app.state, "run_index", None)
+    claimed = await run_index.claim_interrupted(run_id) if run_index is not None else None
+    if claimed is None:
+        return None
+    agent_id, user_input_json = claimed
+    index_run_id = run_id
+    try:
+        user_input = UserInput.model_validate_json(user_input_json)
+        agent: CompiledStateGraph = get_agent(agent_id)
+        async with thread_runs.run(user_input.thread_id, user_input.message) as batch:
+            state = await agent.aget_state(config=RunnableConfig(configurable={"thread_id": user_input.thread_id}))
+            if state.metadata and state.metadata.get("run_id") == run_id:
+                new_run_id = uuid4()
+                configurable = {
+                    "thread_id": user_input.thread_id,
+                    "run_id": str(new_run_id),
+                    **_model_configurable(user_input, streaming=False),
+                    "priority": priority,
+                    CACHE_CONFIG_KEY: uses_response_cache(agent_id),
+                }
+                configurable.update(user_input.agent_config)
+                # No input makes the graph pick up the pending tasks of its last checkpoint
+                kwargs = {
+                    "input": None,
+                    "config": RunnableConfig(configurable=configurable, run_id=new_run_id),
+                    "checkpoint_during": True,
+                }
+            else:
+                # The last checkpoint is from an earlier run, so the input was never saved
+                kwargs, new_run_id = await _handle_input(
+                    user_input, agent, agent_id, priority=priority, streaming=False
+                )
+            await run_index.rename(run_id, str(new_run_id))
+            index_run_id = str(new_run_id)
+            async with _track_run(new_run_id, user_input, agent_id, kwargs, resumed=True):
+                input_messages = 0 if kwargs["input"] is None else 1
+                output = await _invoke_agent(user_input, agent, agent_id, kwargs, new_run_id, input_messages)
+            batch.result.set_result(output)
+    except Exception:
+        _failed_resumes.add(index_run_id)
+        if index_run_id == run_id:
+            # Failed before the resumed run took the entry over
+            await run_index.mark_interrupted(run_id)
+        raise
+    logger.info(f"Resumed interrupted run {run_id} as {new_run_id}")
+    return output
+
+
+def _resume_in_background(run_info: RunInfo) -> None:
+    if run_info.run_id in _failed_resumes:
+        return
+
+    async def resume() -> None:
+        try:
+            await _resume_run(run_info.run_id, Priority.BATCH)
+        except Exception as e:
+            logger.error(f"Failed to resume run {run_info.run_id}: {e}")
+
+    task = asyncio.create_task(resume())
+    _resume_tasks.add(task)
+    task.add_done_callback(_resume_tasks.discard)
+
+
+async def message_generator(
+    user_input: StreamInput, agent_id: str = DEFAULT_AGENT, priority: Priority = Priority.INTERACTIVE
+) -> AsyncGenerator[str, None]:
     """
     Generate a stream of messages from the agent.
 
     This is the workhorse method for the /stream endpoint.
     """
     agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = await _handle_input(user_input, agent)
-
-    # Process streamed events from the graph and yield messages over the SSE stream.
-    async for stream_event in agent.astream(**kwargs, stream_mode=["updates", "messages", "custom"]):
-        if not isinstance(stream_event, tuple):
-            continue
-        stream_mode, event = stream_event
-        new_messages = []
-        if stream_mode == "updates":
-            for node, updates in event.items():
-                # A simple approach to handle agent interrupts.
-                # In a more sophisticated implementation, we could add
-                # some structured ChatMessage type to return the interrupt value.
-                if node == "__interrupt__":
-                    interrupt: Interrupt
-                    for interrupt in updates:
-                        new_messages.append(AIMessage(content=interrupt.value))
-                    continue
-                update_messages = updates.get("messages", [])
-                # special cases for using langgraph-supervisor library
-                if node == "supervisor":
-                    # Get only the last AIMessage since supervisor includes all previous messages
-                    ai_messages = [msg for msg in update_messages if isinstance(msg, AIMessage)]
-                    if ai_messages:
-                        update_messages = [ai_messages[-1]]
-                if node in ("research_expert", "math_expert"):
-                    # By default the sub-agent output is returned as an AIMessage.
-                    # Convert it to a ToolMessage so it displays in the UI as a tool response.
-                    msg = ToolMessage(
-                        content=update_messages[0].content,
-                        name=node,
-                        tool_call_id="",
-                    )
-                    update_messages = [msg]
-                new_messages.extend(update_messages)
-
-        if stream_mode == "custom":
-            new_messages = [event]
-
-        for message in new_messages:
+    cache_namespace = _semantic_cache_namespace(user_input, agent_id)
+    if cache_namespace is not None and (cached := semantic_cache.get(cache_namespace, user_input.message)):
+        cached = cached.model_copy(update={"run_id": str(uuid4())})
+        yield f"data: {json.dumps({'type': 'message', 'content': cached.model_dump()})}\n\n"
+        yield "data: [DONE]\n\n"
+        return
+    async with _thread_run(user_input) as batch:
+        if batch.merged:
+            # Sent as part of a run started by another request, so only the final response is streamed
             try:
-                chat_message = langchain_to_chat_message(message)
-                chat_message.run_id = str(run_id)
+                output: ChatMessage | None = await batch.result
             except Exception as e:
-                logger.error(f"Error parsing message: {e}")
+                logger.error(f"An exception occurred: {e}")
                 yield f"data: {json.dumps({'type': 'error', 'content': 'Unexpected error'})}\n\n"
-                continue
-            # LangGraph re-sends the input message, which feels weird, so drop it
-            if chat_message.type == "human" and chat_message.content == user_input.message:
-                continue
-            yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
-
-        if stream_mode == "messages":
-            if not user_input.stream_tokens:
-                continue
-            msg, metadata = event
-            if "skip_stream" in metadata.get("tags", []):
-                continue
-            # For some reason, astream("messages") causes non-LLM nodes to send extra messages.
-            # Drop them.
-            if not isinstance(msg, AIMessageChunk):
-                continue
-            content = remove_tool_calls(msg.content)
-            if content:
-                # Empty content in the context of OpenAI usually means
-                # that the model is asking for a tool to be invoked.
-                # So we only print non-empty content.
-                yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
-    yield "data: [DONE]\n\n"
+            else:
+                if output is not None:
+                    yield f"data: {json.dumps({'type': 'message', 'content': output.model_dump()})}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+        kwargs, run_id = await _handle_input(
+            user_input, agent, agent_id, batch.messages, priority, streaming=user_input.stream_tokens
+        )
+        new_message_count = 0 if isinstance(kwargs["input"], Command) else len(batch.messages)
+        last_message: ChatMessage | None = None
+
+        async with _track_run(run_id, user_input, agent_id, kwargs) as run:
+            try:
+                # Process streamed events from the graph and yield messages over the SSE stream.
+                async for stream_event in agent.astream(**kwargs, stream_mode=["updates", "messages", "custom"]):
+                    if not isinstance(stream_event, tuple):
+                        continue
+                    stream_mode, event = stream_event
+                    new_messages = []
+                    if stream_mode == "updates":
+                        for node, updates in event.items():
+                            # A simple approach to handle agent interrupts.
+                            # In a more sophisticated implementation, we could add
+                            # some structured ChatMessage type to return the interrupt value.
+                            if node == "__interrupt__":
+                                interrupt: Interrupt
+                                for interrupt in updates:
+                                    new_messages.append(AIMessage(content=interrupt.value))
+                                continue
+                            new_message_count += _count_update_messages(updates)
+                            update_messages = updates.get("messages", [])
+                            # special cases for using langgraph-supervisor library
+                            if node == "supervisor":
+                                # Get only the last AIMessage since supervisor includes all previous messages
+                                ai_messages = [msg for msg in update_messages if isinstance(msg, AIMessage)]
+                                if ai_messages:
+                                    update_messages = [ai_messages[-1]]
+                            if node in ("research_expert", "math_expert"):
+                                # By default the sub-agent output is returned as an AIMessage.
+                                # Convert it to a ToolMessage so it displays in the UI as a tool response.
+                                msg = ToolMessage(
+                                    content=update_messages[0].content,
+                                    name=node,
+                                    tool_call_id="",
+                                )
+                                update_messages = [msg]
+                            new_messages.extend(update_messages)
+
+                    if stream_mode == "custom":
+                        new_messages = [event]
+
+                    for message in new_messages:
+                        try:
+                            chat_message = langchain_to_chat_message(message)
+                            chat_message.run_id = str(run_id)
+                        except Exception as e:
+                            logger.error(f"Error parsing message: {e}")
+                            yield f"data: {json.dumps({'type': 'error', 'content': 'Unexpected error'})}\n\n"
+                            continue
+                        # LangGraph re-sends the input message, which feels weird, so drop it
+                        if chat_message.type == "human" and chat_message.content in batch.messages:
+                            continue
+                        if chat_message.type == "ai":
+                            last_message = chat_message
+                        yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
+
+                    if stream_mode == "messages":
+                        if not user_input.stream_tokens:
+                            continue
+                        msg, metadata = event
+                        if "skip_stream" in metadata.get("tags", []):
+                            continue
+                        # For some reason, astream("messages") causes non-LLM nodes to send extra messages.
+                        # Drop them.
+                        if not isinstance(msg, AIMessageChunk):
+                            continue
+                        content = remove_tool_calls(msg.content)
+                        if content:
+                            # Empty content in the context of OpenAI usually means
+                            # that the model is asking for a tool to be invoked.
+                            # So we only print non-empty content.
+                            yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
+            except asyncio.CancelledError:
+                if not _cancelled_on_request(run):
+                    raise
+                yield f"data: {json.dumps({'type': 'error', 'content': 'Run was cancelled'})}\n\n"
+                yield "data: [DONE]\n\n"
+                return
+            await _record_run(user_input, agent_id, kwargs["config"], new_message_count)
+            batch.result.set_result(last_message)
+        if cache_namespace is not None and last_message is not None:
+            semantic_cache.set(cache_namespace, user_input.message, last_message)
+        yield "data: [DONE]\n\n"
 
 
 def _sse_response_example() -> dict[int, Any]:
@@ -261,7 +695,11 @@ def _sse_response_example() -> dict[int, Any]:
     responses=_sse_response_example(),
 )
 @router.post("/stream", response_class=StreamingResponse, responses=_sse_response_example())
-async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> StreamingResponse:
+async def stream(
+    user_input: StreamInput,
+    agent_id: str = DEFAULT_AGENT,
+    priority: Annotated[Priority, Depends(request_priority)] = Priority.INTERACTIVE,
+) -> StreamingResponse:
     """
     Stream an agent's response to a user input, including intermediate messages and tokens.
 
@@ -271,8 +709,9 @@ async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> Stre
 
     Set `stream_tokens=false` to return intermediate messages but not token-by-token.
     """
+    _check_accepting_runs()
     return StreamingResponse(
-        message_generator(user_input, agent_id),
+        message_generator(user_input, agent_id, priority),
         media_type="text/event-stream",
     )
 
@@ -284,6 +723,15 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
     """
     # TODO: save feedback to db
     logger.debug(feedback)
+    # Feedback on runs of the "auto" model tunes its routing, on every worker
+    routing_store: RoutingStore | None = getattr(app.state, "routing_store", None)
+    if routing_store is not None:
+        try:
+            await routing_store.record_feedback(model_router, feedback.run_id, feedback.key, feedback.score)
+            return FeedbackResponse()
+        except Exception as e:
+            logger.error(f"Error recording feedback in the routing store: {e}")
+    model_router.record_feedback(feedback.run_id, feedback.key, feedback.score)
     return FeedbackResponse()
 
 
@@ -310,10 +758,169 @@ def history(input: ChatHistoryInput) -> ChatHistory:
         raise HTTPException(status_code=500, detail="Unexpected error")
 
 
+@router.get("/threads")
+async def list_threads(
+    user_id: str | None = None,
+    agent_id: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    cursor: str | None = None,
+) -> ThreadList:
+    """
+    List threads, most recently updated first.
+
+    Filter by `user_id` and/or `agent_id`. Pass the returned `next_cursor` as `cursor`
+    to fetch the next page.
+    """
+    thread_index: ThreadIndex | None = getattr(app.state, "thread_index", None)
+    if thread_index is None:
+        raise HTTPException(status_code=503, detail="Thread index is not available")
+    try:
+        return await thread_index.list_threads(user_id=user_id, agent_id=agent_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/runs/active")
+async def list_active_runs() -> list[RunInfo]:
+    """List the runs in progress on every worker, oldest first."""
+    run_index: RunIndex | None = getattr(app.state, "run_index", None)
+    if run_index is None:
+        return [run.info() for run in active_runs.runs.values()]
+    try:
+        return await run_index.list_runs()
+    except Exception as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+
+
+@router.post("/runs/{run_id}/cancel")
+async def cancel_run(run_id: str) -> RunInfo:
+    """
+    Cancel a run in progress. A run on this worker is cancelled immediately, releasing
+    its model and tool slots. A run on another worker is flagged in the shared run
+    index and cancelled by its worker within RUN_SYNC_INTERVAL_SECONDS. Cancelling an
+    interrupted run discards it.
+    """
+    if run := active_runs.runs.get(run_id):
+        active_runs.cancel(run_id)
+        return run.info()
+    run_index: RunIndex | None = getattr(app.state, "run_index", None)
+    run_info = await run_index.get_run(run_id) if run_index is not None else None
+    if run_info is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    await run_index.request_cancel(run_id)
+    return run_info
+
+
+@router.get("/runs/interrupted")
+async def list_interrupted_runs() -> list[RunInfo]:
+    """
+    List runs cut short by a worker crash or shutdown that can be resumed from their
+    last checkpoint. `current_node` is the node the run was executing when it stopped.
+    """
+    run_index: RunIndex | None = getattr(app.state, "run_index", None)
+    if run_index is None:
+        return []
+    try:
+        return await run_index.list_runs(INTERRUPTED)
+    except Exception as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+
+
+@router.post("/runs/{run_id}/resume")
+async def resume_run(
+    run_id: str,
+    priority: Annotated[Priority, Depends(request_priority)] = Priority.INTERACTIVE,
+) -> ChatMessage:
+    """
+    Resume an interrupted run from its last checkpoint and return its final response.
+    Work the run completed before it was interrupted is not repeated.
+    """
+    _check_accepting_runs()
+    output = await _resume_run(run_id, priority)
+    if output is None:
+        raise HTTPException(status_code=404, detail=f"Interrupted run {run_id} not found")
+    return output
+
+
+@router.post("/admin/export")
+async def export(export_input: ExportInput) -> ExportResult:
+    """
+    Export conversations, tool calls and token usage to partitioned Parquet files in EXPORT_DIR.
+
+    Only threads updated after the `since` watermark are exported. If it is omitted,
+    the export continues from the watermark of the previous export.
+    """
+    # pyarrow is only imported when exporting, to keep service startup fast
+    from memory.export import export_conversations
+
+    agent: CompiledStateGraph = get_agent(DEFAULT_AGENT)
+    try:
+        return await export_conversations(
+            agent.checkpointer,
+            settings.EXPORT_DIR,
+            since=export_input.since,
+            full=export_input.full,
+        )
+    except Exception as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+
+
+@router.post("/admin/agents/{agent_id}/reload")
+async def reload(agent_id: str) -> AgentInfo:
+    """
+    Re-import an agent and serve new runs with the new graph. Runs in progress finish
+    on the graph they started with. If the agent fails to import, the old graph is kept.
+    With several workers, the router sends the reload to each of them.
+    """
+    agent_info = next((a for a in get_all_agent_info() if a.key == agent_id), None)
+    if agent_info is None:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+    try:
+        await asyncio.to_thread(reload_agent, agent_id)
+    except Exception as e:
+        logger.error(f"Failed to reload agent {agent_id}: {e}")
+        raise HTTPException(status_code=500, detail="Reload failed")
+    return agent_info
+
+
+@router.get("/metrics")
+async def metrics() -> dict[str, Any]:
+    """
+    Counters of the service's caches, connection reuse per model provider endpoint,
+    provider rate limit budgets and circuit breakers, the load and health of Azure
+    OpenAI deployments, model call hedging, the "auto" model's routing and the prompt
+    sizes of the ReAct agents before and after context budgeting.
+    """
+    return {
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "http_transports": transport_stats(),
+        "rate_limits": rate_limit_stats(),
+        "circuit_breakers": {provider: breaker.stats() for provider, breaker in circuit_breakers.items()},
+        "azure_deployments": deployment_stats(),
+        "hedging": {model: stats.stats() for model, stats in hedge_stats.items()},
+        "router": model_router.stats(),
+        "context": context_stats.stats(),
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check endpoint. Fails until the startup warm-up has completed, and while shutting down."""
+    if active_runs.draining:
+        raise HTTPException(status_code=503, detail="Shutting down")
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
+
+
 app.include_router(router)
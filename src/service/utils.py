@@ -1,3 +1,7 @@
+import signal
+import threading
+from collections.abc import Callable
+
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -72,3 +76,25 @@ def remove_tool_calls(content: str | list[str | dict]) -> str | list[str | dict]
     return [
         content_item for content_item in content if isinstance(content_item, str) or content_item["type"] != "tool_use"
     ]
+
+
+def on_shutdown_signal(callback: Callable[[], None]) -> None:
+    """
+    Call `callback` as soon as the process gets SIGINT or SIGTERM, before the handler
+    that was installed (uvicorn's) starts the graceful shutdown. Signal handlers can
+    only be set from the main thread, so this does nothing elsewhere, as under TestClient.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+
+        def handler(signum: int, frame: object, previous: object = previous) -> None:
+            callback()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        signal.signal(sig, handler)
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.constants import CONFIG_KEY_CHECKPOINTER
+
+from agents import get_agent, get_all_agent_info, prebind_agent_tools
+from core import get_model, settings
+from core.llm import SERVICE_MODEL_PARAMS
+from schema.models import FakeModelName
+
+logger = logging.getLogger(__name__)
+
+WARMUP_THREAD_ID = "__warmup__"
+
+
+async def warm_up(saver: BaseCheckpointSaver) -> None:
+    """
+    Do the work the first requests after a deploy would otherwise pay for: the
+    checkpointer's first query, building the AVAILABLE_MODELS clients, loading each
+    enabled agent with its tools bound to those models, and a dry run of each agent
+    graph with the fake model.
+
+    Failures are logged and skipped, so one misconfigured model or agent doesn't keep
+    the service from becoming ready.
+    """
+    start = time.perf_counter()
+    try:
+        await saver.aget_tuple({"configurable": {"thread_id": WARMUP_THREAD_ID, "checkpoint_ns": ""}})
+    except Exception as e:
+        logger.warning(f"Warm-up could not query the checkpointer: {e}")
+
+    model_names = []
+    for model_name in sorted(settings.AVAILABLE_MODELS):
+        try:
+            for params in SERVICE_MODEL_PARAMS:
+                await asyncio.to_thread(get_model, model_name, params)
+            model_names.append(model_name)
+        except Exception as e:
+            logger.warning(f"Warm-up could not build model {model_name}: {e}")
+
+    for agent_info in get_all_agent_info():
+        try:
+            # Importing an agent and converting tool schemas is blocking work
+            await asyncio.to_thread(prebind_agent_tools, agent_info.key, model_names)
+            # Dry run without a checkpointer, so nothing is persisted
+            config = RunnableConfig(
+                configurable={
+                    "thread_id": WARMUP_THREAD_ID,
+                    "model": FakeModelName.FAKE,
+                    CONFIG_KEY_CHECKPOINTER: None,
+                }
+            )
+            await get_agent(agent_info.key).ainvoke({"messages": [HumanMessage(content="Hello")]}, config=config)
+        except Exception as e:
+            logger.warning(f"Warm-up failed for agent {agent_info.key}: {e}")
+
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
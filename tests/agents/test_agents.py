@@ -0,0 +1,113 @@
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+from agents.agents import Agent, agent_source_files, get_agent, get_all_agent_info, reload_agent, set_agent_checkpointer
+
+
+@pytest.fixture
+def lazy_agent():
+    agent = Agent(description="A lazy agent.", import_path="lazy_graph_module:graph")
+    module = Mock(graph=Mock(checkpointer=None))
+    with (
+        patch.dict("agents.agents.agents", {"lazy-agent": agent}, clear=True),
+        patch.dict(sys.modules, {"lazy_graph_module": module}),
+        patch("agents.agents._checkpointer", None),
+    ):
+        yield agent, module.graph
+
+
+def test_agent_loaded_on_first_use(lazy_agent) -> None:
+    agent, graph = lazy_agent
+    assert agent.graph is None
+
+    assert get_agent("lazy-agent") is graph
+    assert agent.graph is graph
+
+
+def test_checkpointer_bound_to_lazily_loaded_agents(lazy_agent) -> None:
+    _, graph = lazy_agent
+    saver = Mock()
+    set_agent_checkpointer(saver)
+    assert get_agent("lazy-agent").checkpointer is saver
+
+    # Already loaded agents are rebound when the checkpointer changes
+    other_saver = Mock()
+    set_agent_checkpointer(other_saver)
+    assert graph.checkpointer is other_saver
+
+
+def test_enabled_agents(lazy_agent) -> None:
+    with patch("agents.agents.settings.ENABLED_AGENTS", {"other-agent"}):
+        assert get_all_agent_info() == []
+        with pytest.raises(KeyError):
+            get_agent("lazy-agent")
+
+    with patch("agents.agents.settings.ENABLED_AGENTS", {"lazy-agent"}):
+        assert [a.key for a in get_all_agent_info()] == ["lazy-agent"]
+
+
+GRAPH_MODULE = """
+from hot_agent_pkg.prompts import PROMPT
+
+
+class Graph:
+    checkpointer = None
+    prompt = PROMPT
+
+
+graph = Graph()
+"""
+
+
+@pytest.fixture
+def hot_agent(tmp_path, monkeypatch):
+    package = tmp_path / "hot_agent_pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "prompts.py").write_text('PROMPT = "v1"\n')
+    (package / "graph.py").write_text(GRAPH_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # Rewritten files may keep their size and mtime, so don't let a stale .pyc be used
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    agent = Agent(description="A reloadable agent.", import_path="hot_agent_pkg.graph:graph")
+    with (
+        patch.dict("agents.agents.agents", {"hot-agent": agent}, clear=True),
+        patch.dict(sys.modules),
+        patch("agents.agents._checkpointer", None),
+    ):
+        yield agent, package
+
+
+def test_reload_agent_swaps_graph(hot_agent) -> None:
+    agent, package = hot_agent
+    saver = Mock()
+    set_agent_checkpointer(saver)
+    old_graph = get_agent("hot-agent")
+    assert old_graph.prompt == "v1"
+    assert set(agent_source_files("hot-agent")) == {str(package / "graph.py"), str(package / "prompts.py")}
+
+    (package / "prompts.py").write_text('PROMPT = "v2"\n')
+    new_graph = reload_agent("hot-agent")
+
+    assert get_agent("hot-agent") is new_graph
+    assert new_graph.prompt == "v2"
+    assert new_graph.checkpointer is saver
+    # Runs holding the old graph keep its code and globals
+    assert old_graph.prompt == "v1"
+    assert type(old_graph) is not type(new_graph)
+
+
+def test_reload_agent_keeps_graph_on_error(hot_agent) -> None:
+    agent, package = hot_agent
+    old_graph = get_agent("hot-agent")
+    old_prompts = sys.modules["hot_agent_pkg.prompts"]
+
+    (package / "prompts.py").write_text('PROMPT = "v2"\n')
+    (package / "graph.py").write_text("raise RuntimeError('broken agent')\n")
+    with pytest.raises(RuntimeError, match="broken agent"):
+        reload_agent("hot-agent")
+
+    assert get_agent("hot-agent") is old_graph
+    assert sys.modules["hot_agent_pkg.prompts"] is old_prompts
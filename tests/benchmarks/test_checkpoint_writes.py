@@ -0,0 +1,55 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.sqlite import CoalescingSqliteSaver
+
+RUNS = 100
+PUTS_PER_RUN = 10
+
+
+async def _run_writes(saver) -> list[float]:
+    latencies: list[float] = []
+
+    async def run(i: int) -> None:
+        config = {"configurable": {"thread_id": f"thread-{i}", "checkpoint_ns": ""}}
+        for step in range(PUTS_PER_RUN):
+            checkpoint = empty_checkpoint()
+            start = time.perf_counter()
+            config = await saver.aput(config, checkpoint, {"step": step}, {})
+            await saver.aput_writes(config, [("messages", f"step {step}")], task_id=f"task-{step}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(run(i) for i in range(RUNS)))
+    return latencies
+
+
+def _report(name: str, latencies: list[float], elapsed: float, commits: int) -> None:
+    print(  # noqa: T201
+        f"{name}: {len(latencies) / elapsed:.0f} steps/s, {commits / elapsed:.0f} commits/s, "
+        f"p99 write latency {np.percentile(latencies, 99) * 1000:.1f} ms"
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_checkpoint_write_throughput(tmp_path) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "plain.db")) as saver:
+        await saver.setup()
+        start = time.perf_counter()
+        latencies = await _run_writes(saver)
+        # Every aput and aput_writes is its own transaction
+        _report("baseline", latencies, time.perf_counter() - start, 2 * len(latencies))
+
+    with patch("memory.sqlite.settings.CHECKPOINT_GROUP_COMMIT_MS", 5):
+        async with CoalescingSqliteSaver.from_conn_string(str(tmp_path / "coalesced.db")) as saver:
+            await saver.setup()
+            start = time.perf_counter()
+            latencies = await _run_writes(saver)
+            _report("group commit", latencies, time.perf_counter() - start, saver.coalescer.commits)
+            assert saver.coalescer.commits < saver.coalescer.writes
@@ -0,0 +1,102 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+from core.semantic_cache import SemanticCache
+
+TOPICS = [
+    "GDP growth",
+    "inflation rate",
+    "unemployment rate",
+    "export revenue",
+    "foreign direct investment",
+    "retail sales",
+    "interest rate",
+    "credit growth",
+    "public debt",
+    "trade balance",
+    "industrial production",
+    "consumer confidence",
+    "housing prices",
+    "tourism revenue",
+    "rice exports",
+]
+PLACES = ["Vietnam", "Hanoi", "Ho Chi Minh City", "Da Nang", "the Mekong Delta", "Thailand", "Indonesia"]
+PERIODS = ["in 2023", "in 2024", "last quarter", "this year", "in the first half of 2024"]
+# Questions and ways of rephrasing them
+TEMPLATES = {
+    "What was the {t} of {p} {d}?": [
+        "What was the {t} of {p} {d}",
+        "what was {p}'s {t} {d}?",
+        "Can you tell me what the {t} of {p} was {d}?",
+        "Please tell me the {t} of {p} {d}.",
+        "What was the {t} for {p} {d}?",
+        "{d}, what was the {t} of {p}?",
+    ],
+    "Summarize the {t} trend in {p} {d}.": [
+        "Give me a summary of the {t} trend in {p} {d}",
+        "Summarise the {t} trend in {p} {d}",
+        "Could you summarize the trend of {t} in {p} {d}?",
+        "summarize {t} trend {p} {d}",
+        "Please summarize the {t} trends in {p} {d}.",
+    ],
+}
+THRESHOLD = 0.9
+
+
+def _swap_letters(text: str, rng: random.Random) -> str:
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2 :]
+
+
+def _paraphrase_set() -> tuple[list[str], list[str], list[str]]:
+    """Questions, a paraphrase of each (a third with a typo), and the question's period."""
+    rng = random.Random(0)
+    questions, paraphrases, periods = [], [], []
+    for template, rephrasings in TEMPLATES.items():
+        for topic in TOPICS:
+            for place in PLACES:
+                for period in PERIODS:
+                    questions.append(template.format(t=topic, p=place, d=period))
+                    paraphrase = rng.choice(rephrasings).format(t=topic, p=place, d=period)
+                    paraphrases.append(_swap_letters(paraphrase, rng) if rng.random() < 0.3 else paraphrase)
+                    periods.append(period)
+    return questions, paraphrases, periods
+
+
+@pytest.mark.benchmark
+def test_semantic_cache_recall_and_latency() -> None:
+    questions, paraphrases, periods = _paraphrase_set()
+    cache = SemanticCache(capacity=len(questions), threshold=THRESHOLD, ttl=3600)
+    for i, question in enumerate(questions):
+        cache.set("agent", question, i)
+
+    correct = wrong = 0
+    latencies: list[float] = []
+    for i, paraphrase in enumerate(paraphrases):
+        start = time.perf_counter()
+        answer = cache.get("agent", paraphrase)
+        latencies.append(time.perf_counter() - start)
+        correct += answer == i
+        wrong += answer is not None and answer != i
+
+    # Questions about periods that were never cached must miss rather than get a near-duplicate's answer
+    cached_periods = PERIODS[:3]
+    unseen = SemanticCache(capacity=len(questions), threshold=THRESHOLD, ttl=3600)
+    for i, question in enumerate(questions):
+        if periods[i] in cached_periods:
+            unseen.set("agent", question, i)
+    unseen_paraphrases = [p for p, period in zip(paraphrases, periods) if period not in cached_periods]
+    false_hits = sum(unseen.get("agent", p) is not None for p in unseen_paraphrases)
+
+    recall = correct / len(paraphrases)
+    print(  # noqa: T201
+        f"{len(questions)} entries: recall {recall:.2f}, wrong answers {wrong / len(paraphrases):.3f}, "
+        f"false hits on unseen questions {false_hits / len(unseen_paraphrases):.3f}, "
+        f"p50 lookup {np.percentile(latencies, 50) * 1000:.2f} ms, p99 {np.percentile(latencies, 99) * 1000:.2f} ms"
+    )
+    assert recall > 0.6
+    assert wrong / len(paraphrases) < 0.02
+    assert false_hits / len(unseen_paraphrases) < 0.02
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).parents[2] / "src"
+
+# Agent tool dependencies and provider SDKs that must not be imported until they're used
+LAZY_MODULES = [
+    "langchain_openai",
+    "langchain_google_genai",
+    "langchain_ollama",
+    "langchain_community",
+    "docx",
+    "numexpr",
+    "pyarrow",
+    "numpy",
+]
+
+_PROBE = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import service
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+@pytest.mark.benchmark
+def test_service_startup() -> None:
+    env = {**os.environ, "USE_FAKE_MODEL": "true", "PYTHONPATH": str(SRC_DIR)}
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], env=env, cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    print(  # noqa: T201
+        f"import service: {stats['import_seconds']:.2f} s, max RSS {stats['max_rss_mb']:.0f} MB"
+    )
+    assert stats["loaded"] == []
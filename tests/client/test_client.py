@@ -6,7 +6,7 @@ import pytest
 from httpx import Request, Response
 
 from client import AgentClient, AgentClientError
-from schema import AgentInfo, ChatHistory, ChatMessage, ServiceMetadata
+from schema import AgentInfo, ChatHistory, ChatMessage, Priority, ServiceMetadata, ThreadList
 from schema.models import OpenAIModelName
 
 
@@ -40,6 +40,10 @@ def test_headers(mock_env):
         client = AgentClient(get_info=False)
         assert client._headers == {"Authorization": "Bearer test-secret"}
 
+    # Test with priority
+    client = AgentClient(get_info=False, priority=Priority.BATCH)
+    assert client._headers == {"X-Priority": "batch"}
+
 
 def test_invoke(agent_client):
     """Test synchronous invocation."""
@@ -282,6 +286,38 @@ def test_get_history(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_list_threads(agent_client):
+    """Test thread listing."""
+    THREADS = {
+        "threads": [
+            {
+                "thread_id": "test-thread",
+                "user_id": "alice",
+                "agent_id": "chatbot",
+                "title": "What is the weather?",
+                "message_count": 2,
+                "created_at": "2026-01-01T00:00:00+00:00",
+                "updated_at": "2026-01-01T00:01:00+00:00",
+            }
+        ],
+        "next_cursor": "next",
+    }
+
+    mock_response = Response(200, json=THREADS, request=Request("GET", "http://test/threads"))
+    with patch("httpx.get", return_value=mock_response) as mock_get:
+        threads = agent_client.list_threads(user_id="alice", limit=1)
+        assert isinstance(threads, ThreadList)
+        assert threads.threads[0].thread_id == "test-thread"
+        assert threads.next_cursor == "next"
+        assert mock_get.call_args.kwargs["params"] == {"limit": 1, "user_id": "alice"}
+
+    error_response = Response(500, text="Internal Server Error", request=Request("GET", "http://test/threads"))
+    with patch("httpx.get", return_value=error_response):
+        with pytest.raises(AgentClientError) as exc:
+            agent_client.list_threads()
+        assert "500 Internal Server Error" in str(exc.value)
+
+
 def test_info(agent_client):
     assert agent_client.info is None
     assert agent_client.agent == "test-agent"
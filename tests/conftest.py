@@ -6,10 +6,12 @@ import pytest
 
 def pytest_addoption(parser):
     parser.addoption("--run-docker", action="store_true", default=False, help="run docker integration tests")
+    parser.addoption("--run-benchmark", action="store_true", default=False, help="run performance benchmarks")
 
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "docker: mark test as requiring docker containers")
+    config.addinivalue_line("markers", "benchmark: mark test as a performance benchmark")
 
 
 def pytest_collection_modifyitems(config, items):
@@ -18,6 +20,11 @@ def pytest_collection_modifyitems(config, items):
         for item in items:
             if "docker" in item.keywords:
                 item.add_marker(skip_docker)
+    if not config.getoption("--run-benchmark"):
+        skip_benchmark = pytest.mark.skip(reason="need --run-benchmark option to run")
+        for item in items:
+            if "benchmark" in item.keywords:
+                item.add_marker(skip_benchmark)
 
 
 @pytest.fixture
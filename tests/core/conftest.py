@@ -0,0 +1,65 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+
+class FakeModel(BaseChatModel):
+    """
+    Provider model that streams `content` word by word after waiting `delay` seconds
+    for its first token, or raises `error` instead while it is set.
+    """
+
+    content: str
+    delay: float = 0
+    error: Exception | None = None
+    calls: int = 0
+    cancelled: bool = False
+    call_kwargs: dict[str, Any] = {}
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-provider"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[f"{self.content}:{tool}" for tool in tools])
+
+    def _chunks(self) -> Iterator[ChatGenerationChunk]:
+        if self.error is not None:
+            raise self.error
+        for word in self.content.split():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{word} "))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        self.call_kwargs = kwargs
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        for chunk in self._chunks():
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(iter([chunk async for chunk in self._astream(messages, stop, **kwargs)]))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        self.call_kwargs = kwargs
+        time.sleep(self.delay)
+        return generate_from_stream(self._chunks())
+
+
+@pytest.fixture
+def fake_model() -> type[FakeModel]:
+    """Fixture returning the FakeModel class, to build provider models with."""
+    return FakeModel
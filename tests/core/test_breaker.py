@@ -0,0 +1,110 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from core.breaker import CircuitBreakerChatModel, CircuitOpenError, circuit_breakers, circuit_states
+from schema import CircuitState
+
+
+class StatusError(Exception):
+    """Error of a provider API, with its HTTP status like the OpenAI client's errors."""
+
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings():
+    circuit_breakers.clear()
+    with (
+        patch("core.breaker.settings.CIRCUIT_MIN_CALLS", 2),
+        patch("core.breaker.settings.CIRCUIT_FAILURE_RATE", 0.5),
+        patch("core.breaker.settings.CIRCUIT_OPEN_SECONDS", 0.05),
+        patch("core.breaker.settings.CIRCUIT_SLOW_CALL_SECONDS", 0.05),
+    ):
+        yield
+    circuit_breakers.clear()
+
+
+async def _call(model: BaseChatModel) -> str:
+    return "".join([chunk.content async for chunk in model.astream([HumanMessage(content="Hi")])])
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_and_recovers(fake_model) -> None:
+    provider = fake_model(content="answer", error=ConnectionError("provider is down"))
+    model = CircuitBreakerChatModel(model=provider, provider="google")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await _call(model)
+    assert circuit_states() == {"google": CircuitState.OPEN}
+
+    # While open, calls fail without reaching the provider
+    with pytest.raises(CircuitOpenError):
+        await _call(model)
+    assert provider.calls == 2
+
+    # After the open period, a failed probe opens the circuit again and a successful one closes it
+    await asyncio.sleep(0.06)
+    assert circuit_states() == {"google": CircuitState.HALF_OPEN}
+    with pytest.raises(ConnectionError):
+        await _call(model)
+    assert circuit_states() == {"google": CircuitState.OPEN}
+    provider.error = None
+    await asyncio.sleep(0.06)
+    assert await _call(model) == "answer "
+    assert circuit_states() == {"google": CircuitState.CLOSED}
+    stats = circuit_breakers["google"].stats()
+    assert (stats["opened"], stats["rejected"]) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_uses_fallback(fake_model) -> None:
+    fallback = fake_model(content="fallback answer")
+    model = CircuitBreakerChatModel(model=fake_model(content="answer", delay=0.1), fallback=fallback, provider="ollama")
+    # A whole answer isn't slow however long it takes, since that depends on its length
+    assert (await model.ainvoke([HumanMessage(content="Hi")])).content == "answer "
+    assert circuit_breakers["ollama"].stats()["recent_failure_rate"] == 0
+    # Slow streams count as failures, but their answers are still returned
+    assert await _call(model) == "answer "
+    assert circuit_states() == {"ollama": CircuitState.OPEN}
+
+    assert await _call(model) == "fallback answer "
+    assert fallback.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_only_provider_errors_are_failures(fake_model) -> None:
+    provider = fake_model(content="answer", error=StatusError(400))
+    model = CircuitBreakerChatModel(model=provider, provider="openai")
+    # Errors about the request itself, like a prompt over the context window, say nothing about the provider
+    for error in (StatusError(400), ValueError("content filtered")):
+        provider.error = error
+        with pytest.raises(type(error)):
+            await _call(model)
+    assert circuit_breakers["openai"].stats()["recent_calls"] == 0
+
+    provider.error = StatusError(429)
+    with pytest.raises(StatusError):
+        await model.ainvoke([HumanMessage(content="Hi")])
+    provider.error = StatusError(503)
+    with pytest.raises(StatusError):
+        await _call(model)
+    assert circuit_states() == {"openai": CircuitState.OPEN}
+
+
+def test_sync_calls_use_the_breaker(fake_model) -> None:
+    provider = fake_model(content="answer", error=httpx.ConnectError("connection refused"))
+    fallback = fake_model(content="fallback answer")
+    model = CircuitBreakerChatModel(model=provider, fallback=fallback, provider="openai")
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            model.invoke([HumanMessage(content="Hi")])
+    assert circuit_states() == {"openai": CircuitState.OPEN}
+    assert model.invoke([HumanMessage(content="Hi")]).content == "fallback answer "
+    assert (provider.calls, fallback.calls) == (2, 1)
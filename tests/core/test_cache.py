@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration
+from langgraph.graph import END, MessagesState, StateGraph
+
+from core.cache import ResponseCache, cache_key, with_response_cache
+
+
+def test_cache_key_normalizes_messages() -> None:
+    def conversation(tool_call_id: str, message_id: str) -> list:
+        return [
+            HumanMessage(content="What is 2 + 2?", id=message_id),
+            AIMessage(content="", tool_calls=[{"name": "calculator", "args": {"expr": "2 + 2"}, "id": tool_call_id}]),
+            ToolMessage(content="4", tool_call_id=tool_call_id),
+        ]
+
+    assert cache_key("gpt-4o", conversation("call_a", "1")) == cache_key("gpt-4o", conversation("call_b", "2"))
+    assert cache_key("gpt-4o", conversation("call_a", "1")) != cache_key("gpt-4o-mini", conversation("call_a", "1"))
+    assert cache_key("gpt-4o", [HumanMessage(content="a")]) != cache_key("gpt-4o", [HumanMessage(content="b")])
+
+
+def generations(content: str) -> list[ChatGeneration]:
+    return [ChatGeneration(message=AIMessage(content=content))]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_eviction_and_ttl() -> None:
+    cache = ResponseCache(max_entries=2, ttl=60)
+    with patch("core.cache.time.time", return_value=1000):
+        await cache.set("a", generations("A"))
+        await cache.set("b", generations("B"))
+        assert (await cache.get("a"))[0].message.content == "A"
+        # "b" is now the least recently used entry
+        await cache.set("c", generations("C"))
+        assert await cache.get("b") is None
+        assert await cache.get("c") is not None
+
+    with patch("core.cache.time.time", return_value=1061):
+        assert await cache.get("a") is None
+
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "entries": 1}
+
+
+@pytest.mark.asyncio
+async def test_response_cache_sqlite(tmp_path) -> None:
+    path = str(tmp_path / "cache.db")
+    await ResponseCache(max_entries=10, ttl=60, path=path).set("a", generations("A"))
+
+    # A new process starts with an empty memory cache but finds the entry on disk
+    cache = ResponseCache(max_entries=10, ttl=60, path=path)
+    assert (await cache.get("a"))[0].message.content == "A"
+    with patch("core.cache.time.time", return_value=10**10):
+        assert await ResponseCache(max_entries=10, ttl=60, path=path).get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_model_replays_stream() -> None:
+    cache = ResponseCache(max_entries=10, ttl=60)
+    with patch("core.cache.response_cache", cache):
+        model = with_response_cache(FakeListChatModel)(responses=["first answer", "second answer"])
+
+    async def call_model(state: MessagesState):
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("model", call_model)
+    builder.set_entry_point("model")
+    builder.add_edge("model", END)
+    graph = builder.compile()
+
+    async def ask(response_cache: bool) -> tuple[str, str]:
+        tokens, final = [], None
+        config = {"configurable": {"response_cache": response_cache}}
+        inputs = {"messages": [HumanMessage(content="Hello")]}
+        async for mode, event in graph.astream(inputs, config, stream_mode=["messages", "values"]):
+            if mode == "messages" and isinstance(event[0], AIMessageChunk):
+                tokens.append(event[0].content)
+            if mode == "values":
+                final = event["messages"][-1]
+        return "".join(tokens), final
+
+    with patch("core.cache.response_cache", cache):
+        assert (await ask(True))[1].content == "first answer"
+        # Served from the cache, and streamed as tokens
+        tokens, message = await ask(True)
+        assert tokens == message.content == "first answer"
+        assert message.response_metadata["cached"]
+        # Runs that don't opt in always call the model
+        assert (await ask(False))[1].content == "second answer"
+
+    assert cache.hits == 1
+    assert cache.misses == 1
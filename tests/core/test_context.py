@@ -0,0 +1,108 @@
+import sys
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from core.context import build_context, context_budget, context_stats, estimate_tokens
+from schema.models import FakeModelName, OpenAIModelName
+
+
+def _turn(i: int, result: str = "result") -> list:
+    return [
+        HumanMessage(content=f"question {i} " * 20, id=f"human-{i}"),
+        AIMessage(content="", tool_calls=[{"name": "search", "args": {"q": str(i)}, "id": f"call-{i}"}], id=f"ai-{i}"),
+        ToolMessage(content=result, tool_call_id=f"call-{i}", id=f"tool-{i}"),
+        AIMessage(content=f"answer {i} " * 20, id=f"answer-{i}"),
+    ]
+
+
+def test_context_within_budget_is_unchanged() -> None:
+    messages = _turn(1)
+    context = build_context("Be helpful.", messages, budget=10_000)
+    assert isinstance(context[0], SystemMessage)
+    assert context[1:] == messages
+    # Estimates are cached by message ID
+    assert estimate_tokens(messages[0]) == estimate_tokens(HumanMessage(content="", id="human-1"))
+
+
+def test_context_keeps_recent_turns() -> None:
+    thread = [m for i in range(10) for m in _turn(i)] + [HumanMessage(content="Latest question", id="latest")]
+    tokens = sum(estimate_tokens(m) for m in thread)
+    before = context_stats.stats()["trimmed"]
+
+    context = build_context("Be helpful.", thread, budget=tokens // 2)
+    assert sum(estimate_tokens(m) for m in context) <= tokens // 2
+    assert context[-1].id == "latest"
+    # Whole turns are dropped from the start, so the context resumes at a human message
+    assert isinstance(context[1], HumanMessage)
+    assert [m.id for m in context[1:]] == [m.id for m in thread[-len(context) + 1 :]]
+    assert context_stats.stats()["trimmed"] == before + 1
+
+    # The current turn is kept, with the results of its latest tool calls whole
+    current = _turn(10)[:3]
+    context = build_context("Be helpful.", thread + current[1:], budget=1)
+    assert [m.id for m in context[1:]] == ["latest", "ai-10", "tool-10"]
+
+
+def test_context_never_splits_tool_calls() -> None:
+    thread = _turn(0) + [
+        HumanMessage(content="Search twice", id="human-1"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "search", "args": {}, "id": "a"}, {"name": "search", "args": {}, "id": "b"}],
+            id="ai-1",
+        ),
+        ToolMessage(content="x" * 400, tool_call_id="a", id="tool-a"),
+        ToolMessage(content="y" * 400, tool_call_id="b", id="tool-b"),
+        AIMessage(content="Both searched", id="answer-1"),
+        HumanMessage(content="Thanks", id="human-2"),
+    ]
+    for budget in range(20, 400, 10):
+        ids = [m.id for m in build_context("", thread, budget)[1:]]
+        for call, results in (("ai-0", ["tool-0"]), ("ai-1", ["tool-a", "tool-b"])):
+            assert all(result in ids for result in results) == (call in ids)
+            assert any(result in ids for result in results) == (call in ids)
+
+
+def test_context_elides_earlier_tool_results() -> None:
+    thread = _turn(20, result="r" * 20_000) + _turn(21, result="s" * 20_000)
+    with patch("core.context.settings.CONTEXT_TOOL_RESULT_TOKENS", 100):
+        context = build_context("", thread, budget=6000)
+    earlier, current = context[3], context[7]
+    assert len(earlier.content) < 600 and "omitted" in earlier.content
+    assert earlier.tool_call_id == "call-20"
+    assert current.content == "s" * 20_000
+
+
+def test_context_elides_tool_loop_of_current_turn() -> None:
+    thread = _turn(0) + [HumanMessage(content="Research this", id="human-1")]
+    for step in range(3):
+        thread += [
+            AIMessage(content="", tool_calls=[{"name": "search", "args": {}, "id": f"step-{step}"}], id=f"ai-step-{step}"),
+            ToolMessage(content=str(step) * 20_000, tool_call_id=f"step-{step}", id=f"tool-step-{step}"),
+        ]
+    with patch("core.context.settings.CONTEXT_TOOL_RESULT_TOKENS", 100):
+        context = build_context("", thread, budget=6000)
+        assert sum(estimate_tokens(m) for m in context) <= 6000
+        results = [m for m in context if isinstance(m, ToolMessage) and m.tool_call_id.startswith("step")]
+        assert [m.tool_call_id for m in results] == ["step-0", "step-1", "step-2"]
+        assert all(len(m.content) < 600 for m in results[:2])
+        assert results[2].content == "2" * 20_000
+
+        # A current turn that fits is left whole, and earlier turns are dropped instead
+        turn_tokens = sum(estimate_tokens(m) for m in thread[4:])
+        context = build_context("", thread, budget=turn_tokens + estimate_tokens(SystemMessage(content="")))
+        assert context[1:] == thread[4:]
+
+
+def test_context_budget() -> None:
+    with patch("core.context.settings.CONTEXT_MAX_TOKENS", 0):
+        assert context_budget(OpenAIModelName.GPT_4O) == 128_000 - 4096
+        assert context_budget(OpenAIModelName.GPT_4O, max_tokens=1000) == 127_000
+        # Models without a known window aren't budgeted, unless their window is set
+        assert context_budget(FakeModelName.FAKE) == sys.maxsize
+        with patch("core.context.settings.CONTEXT_WINDOW_TOKENS", {"fake": 16_000}):
+            assert context_budget(FakeModelName.FAKE, max_tokens=1000) == 15_000
+    with patch("core.context.settings.CONTEXT_MAX_TOKENS", 32_000):
+        assert context_budget(OpenAIModelName.GPT_4O) == 32_000
+        assert context_budget(FakeModelName.FAKE) == 32_000
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from langchain_core.messages import HumanMessage
+from langchain_openai import AzureChatOpenAI
+from openai import DefaultAsyncHttpxClient
+from pydantic import SecretStr
+
+from core.deployments import DeploymentRouter
+from core.settings import AzureDeployment
+
+
+class FakeAzureOpenAI:
+    """Local OpenAI-compatible server with Azure deployment routes, recording which deployment served each call."""
+
+    def __init__(self) -> None:
+        self.app = FastAPI()
+        self.calls: list[tuple[str, str]] = []
+        self.rate_limited: set[str] = set()
+        self.failing: set[str] = set()
+        self.delay = 0.0
+        self.app.post("/openai/deployments/{deployment}/chat/completions")(self.chat_completions)
+
+    async def chat_completions(self, deployment: str, request: Request) -> Response:
+        self.calls.append((deployment, request.headers["api-key"]))
+        if deployment in self.rate_limited:
+            return Response(status_code=429, headers={"retry-after": "30"}, content='{"error": {"code": "429"}}')
+        if deployment in self.failing:
+            return Response(status_code=500, content='{"error": {"code": "500"}}')
+        await asyncio.sleep(self.delay)
+        body = await request.json()
+        return Response(
+            media_type="application/json",
+            headers={"x-ratelimit-remaining-requests": "99", "x-ratelimit-remaining-tokens": "9000"},
+            content=(
+                '{"id": "1", "object": "chat.completion", "created": 0, "model": "gpt-4o", "choices": [{"index": 0, '
+                f'"finish_reason": "stop", "message": {{"role": "assistant", "content": "answer from {deployment}"}}}}], '
+                f'"usage": {{"prompt_tokens": {len(body["messages"])}, "completion_tokens": 3, "total_tokens": 4}}}}'
+            ),
+        )
+
+
+@pytest_asyncio.fixture
+async def fake_azure() -> AsyncIterator[tuple[FakeAzureOpenAI, str]]:
+    fake = FakeAzureOpenAI()
+    server = uvicorn.Server(uvicorn.Config(fake.app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield fake, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    await task
+
+
+def routed_model(router: DeploymentRouter) -> AzureChatOpenAI:
+    first = router.deployments[0]
+    return AzureChatOpenAI(
+        azure_endpoint=first.endpoint,
+        deployment_name=first.name,
+        api_key=SecretStr(first.api_key),
+        api_version="2024-10-21",
+        max_retries=0,
+        http_async_client=DefaultAsyncHttpxClient(transport=router),
+    )
+
+
+@pytest.mark.asyncio
+async def test_router_spreads_load(fake_azure) -> None:
+    fake, endpoint = fake_azure
+    router = DeploymentRouter(
+        [
+            AzureDeployment(deployment="east", endpoint=endpoint, api_key=SecretStr("key-east")),
+            AzureDeployment(deployment="west", endpoint=endpoint, api_key=SecretStr("key-west"), weight=2),
+        ]
+    )
+    model = routed_model(router)
+
+    # Concurrent requests go to the deployment with the fewest in flight
+    fake.delay = 0.2
+    responses = await asyncio.gather(*(model.ainvoke([HumanMessage(content="Hi")]) for _ in range(6)))
+    assert {response.content for response in responses} == {"answer from east", "answer from west"}
+    assert sorted(fake.calls) == [("east", "key-east")] * 2 + [("west", "key-west")] * 4
+    stats = router.stats()
+    assert stats["west@127.0.0.1"]["outstanding"] == 0
+    assert stats["west@127.0.0.1"]["remaining_tokens"] == 9000
+
+    # Sequential requests are shared by weight too
+    fake.delay = 0
+    fake.calls.clear()
+    for _ in range(3):
+        await model.ainvoke([HumanMessage(content="Hi")])
+    assert sorted(fake.calls) == [("east", "key-east")] + [("west", "key-west")] * 2
+
+
+@pytest.mark.asyncio
+async def test_router_ejects_unhealthy_deployments(fake_azure) -> None:
+    fake, endpoint = fake_azure
+    router = DeploymentRouter(
+        [AzureDeployment(deployment=name, endpoint=endpoint, api_key=SecretStr("key")) for name in ("a", "b", "c")]
+    )
+    model = routed_model(router)
+
+    # A rate-limited deployment is retried elsewhere and ejected for its Retry-After
+    fake.rate_limited.add("a")
+    assert (await model.ainvoke([HumanMessage(content="Hi")])).content == "answer from b"
+    assert [deployment for deployment, _ in fake.calls] == ["a", "b"]
+    assert router.stats()["a@127.0.0.1"]["rate_limited"] == 1
+    assert router.stats()["a@127.0.0.1"]["ejected_seconds"] > 25
+
+    # Repeated errors eject a deployment
+    fake.failing.add("c")
+    fake.calls.clear()
+    with patch("core.deployments.settings.AZURE_DEPLOYMENT_MAX_FAILURES", 2):
+        for _ in range(4):
+            assert (await model.ainvoke([HumanMessage(content="Hi")])).content == "answer from b"
+    assert [deployment for deployment, _ in fake.calls].count("c") == 2
+    assert router.stats()["c@127.0.0.1"]["errors"] == 2
+    assert router.pick([]) is router.deployments[1]
+
+    # With every deployment ejected, requests go to the one back soonest and its error is returned
+    fake.rate_limited.add("b")
+    router.deployments[1].ejected_until = time.monotonic() + 1
+    with pytest.raises(Exception, match="429"):
+        await model.ainvoke([HumanMessage(content="Hi")])
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from core.hedging import HedgedChatModel, HedgeStats, hedge_stats
+
+
+@pytest.fixture(autouse=True)
+def clear_stats():
+    hedge_stats.clear()
+    with patch("core.hedging.settings.HEDGE_MAX_DELAY_SECONDS", 0.05):
+        yield
+
+
+def hedged(primary: BaseChatModel, backup: BaseChatModel) -> HedgedChatModel:
+    return HedgedChatModel(primary=primary, backup=backup, stats_key="primary")
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(fake_model) -> None:
+    backup = fake_model(content="backup")
+    response = await hedged(fake_model(content="primary answer"), backup).ainvoke([HumanMessage(content="Hi")])
+    assert response.content == "primary answer "
+    assert backup.call_kwargs == {}
+    assert hedge_stats["primary"].stats()["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged(fake_model) -> None:
+    primary = fake_model(content="primary answer", delay=5)
+    model = hedged(primary, fake_model(content="backup answer"))
+    tokens = [chunk.content async for chunk in model.astream([HumanMessage(content="Hi")])]
+    # Only the winner's tokens are streamed, and the loser's request is cancelled
+    assert tokens == ["backup ", "answer "]
+    assert primary.cancelled
+    stats = hedge_stats["primary"].stats()
+    assert (stats["calls"], stats["hedged"], stats["backup_wins"], stats["backup_win_rate"]) == (1, 1, 1, 1.0)
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_fails_over(fake_model) -> None:
+    primary = fake_model(content="primary", error=RuntimeError("provider error"))
+    backup = fake_model(content="backup")
+    response = await hedged(primary, backup).bind_tools(["search"]).ainvoke([HumanMessage(content="Hi")])
+    assert response.content == "backup "
+    # Each model gets tools in its own format
+    assert primary.call_kwargs == {"tools": ["primary:search"]}
+    assert backup.call_kwargs == {"tools": ["backup:search"]}
+    assert hedge_stats["primary"].failovers == 1
+
+    backup.error = RuntimeError("provider error")
+    with pytest.raises(RuntimeError, match="provider error"):
+        await hedged(primary, backup).ainvoke([HumanMessage(content="Hi")])
+
+
+@pytest.mark.asyncio
+async def test_empty_answer(fake_model) -> None:
+    response = await hedged(fake_model(content=""), fake_model(content="backup")).ainvoke([HumanMessage(content="Hi")])
+    assert response.content == ""
+    assert hedge_stats["primary"].stats()["hedged"] == 0
+
+
+def test_sync_call_fails_over(fake_model) -> None:
+    primary = fake_model(content="primary answer", delay=0.1)
+    backup = fake_model(content="backup")
+    assert hedged(primary, backup).invoke([HumanMessage(content="Hi")]).content == "primary answer "
+    # Sync calls are never hedged, only failed over
+    assert backup.calls == 0
+
+    primary.error = RuntimeError("provider error")
+    response = hedged(primary, backup).bind_tools(["search"]).invoke([HumanMessage(content="Hi")])
+    assert response.content == "backup "
+    assert backup.call_kwargs == {"tools": ["backup:search"]}
+    stats = hedge_stats["primary"].stats()
+    assert (stats["calls"], stats["hedged"], stats["failovers"]) == (2, 0, 1)
+
+
+def test_hedge_delay() -> None:
+    stats = HedgeStats()
+    assert stats.hedge_delay() == 0.05
+    stats.latencies.extend(i / 100 for i in range(100))
+    with (
+        patch("core.hedging.settings.HEDGE_MAX_DELAY_SECONDS", 10),
+        patch("core.hedging.settings.HEDGE_MIN_DELAY_SECONDS", 0.5),
+    ):
+        assert stats.hedge_delay() == 0.95
+        with patch("core.hedging.settings.HEDGE_PERCENTILE", 10):
+            assert stats.hedge_delay() == 0.5
@@ -6,31 +6,101 @@ from langchain_community.chat_models import FakeListChatModel
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 
-from core.llm import get_model
+from core.breaker import CircuitBreakerChatModel
+from core.hedging import HedgedChatModel
+from core.llm import ModelParams, _models, get_model
+from core.router import RouterChatModel
+from core.transport import shared_transport
 from schema.models import (
     FakeModelName,
+    GoogleModelName,
     OllamaModelName,
     OpenAIModelName,
+    RouterModelName,
 )
 
 
 def test_get_model_openai():
     with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
         model = get_model(OpenAIModelName.GPT_4O_MINI)
+        assert isinstance(model, CircuitBreakerChatModel)
+        assert model.provider == "openai"
+        model = model.model
         assert isinstance(model, ChatOpenAI)
         assert model.model_name == "gpt-4o-mini"
         assert model.temperature == 0.5
         assert model.streaming is True
 
 
+def test_get_model_variants():
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        model = get_model(OpenAIModelName.GPT_4O)
+        variant = get_model(OpenAIModelName.GPT_4O, ModelParams(temperature=0.1, max_tokens=100, streaming=False))
+        assert get_model(OpenAIModelName.GPT_4O, ModelParams()) is model
+        model, variant = model.model, variant.model
+        assert (variant.temperature, variant.max_tokens, variant.streaming) == (0.1, 100, False)
+        # Variants of an endpoint share its connection pools
+        assert variant.http_async_client is model.http_async_client
+        assert model.http_async_client._transport is shared_transport("openai")
+        assert variant.root_async_client._client is model.root_async_client._client
+
+
+def test_get_model_hedged():
+    _models.clear()
+    with (
+        patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}),
+        patch("core.llm.settings.HEDGE_BACKUP_MODELS", {"gpt-4o": "gpt-4o-mini"}),
+    ):
+        model = get_model(OpenAIModelName.GPT_4O)
+        assert isinstance(model, HedgedChatModel)
+        assert (model.primary.model.model_name, model.backup.model.model_name) == ("gpt-4o", "gpt-4o-mini")
+        assert not isinstance(get_model(OpenAIModelName.GPT_4O_MINI), HedgedChatModel)
+    _models.clear()
+
+
+def test_get_model_auto():
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        model = get_model(RouterModelName.AUTO)
+        assert isinstance(model, RouterChatModel)
+        assert (model.cheap.model.model_name, model.strong.model.model_name) == ("gpt-4o-mini", "gpt-4o")
+        assert model.cheap is get_model(OpenAIModelName.GPT_4O_MINI)
+
+
+def test_get_model_lru():
+    _models.clear()
+    with patch("core.llm.settings.MODEL_REGISTRY_MAX_ENTRIES", 2):
+        model = get_model(FakeModelName.FAKE, ModelParams(temperature=0))
+        get_model(FakeModelName.FAKE, ModelParams(temperature=1))
+        assert get_model(FakeModelName.FAKE, ModelParams(temperature=0)) is model
+        # temperature=1 is now the least recently used variant
+        get_model(FakeModelName.FAKE, ModelParams(temperature=2))
+        assert list(_models) == [
+            (FakeModelName.FAKE, ModelParams(temperature=0)),
+            (FakeModelName.FAKE, ModelParams(temperature=2)),
+        ]
+
+
 def test_get_model_ollama():
     with patch("core.settings.settings.OLLAMA_MODEL", "llama3.3"):
-        model = get_model(OllamaModelName.OLLAMA_GENERIC)
+        model = get_model(OllamaModelName.OLLAMA_GENERIC).model
         assert isinstance(model, ChatOllama)
         assert model.model == "llama3.3"
         assert model.temperature == 0.5
 
 
+def test_get_model_circuit_fallback():
+    _models.clear()
+    with (
+        patch.dict(os.environ, {"OPENAI_API_KEY": "test_key", "GOOGLE_API_KEY": "test_key"}),
+        patch("core.llm.settings.CIRCUIT_FALLBACK_MODELS", {"gemini-1.5-flash": "gpt-4o-mini"}),
+    ):
+        model = get_model(GoogleModelName.GEMINI_15_FLASH)
+        assert (model.provider, model.fallback.model_name) == ("google", "gpt-4o-mini")
+        with patch("core.llm.settings.CIRCUIT_BREAKER", False):
+            assert isinstance(get_model(OpenAIModelName.GPT_4O_MINI, ModelParams(temperature=0)), ChatOpenAI)
+    _models.clear()
+
+
 def test_get_model_fake():
     model = get_model(FakeModelName.FAKE)
     assert isinstance(model, FakeListChatModel)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from core.ratelimit import RateLimitedTransport, RateLimitScheduler, _duration
+
+
+class FakeProvider:
+    """Provider with a request quota that refills continuously, answering with OpenAI's x-ratelimit-* headers."""
+
+    def __init__(self, limit: int, per_second: float) -> None:
+        self.limit = limit
+        self.per_second = per_second
+        self.level = float(limit)
+        self.updated = time.monotonic()
+        self.statuses: list[int] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        now = time.monotonic()
+        self.level = min(self.level + (now - self.updated) * self.per_second, self.limit)
+        self.updated = now
+        if self.level < 1:
+            self.statuses.append(429)
+            return httpx.Response(429, headers={"retry-after-ms": "50"})
+        self.level -= 1
+        self.statuses.append(200)
+        reset = (self.limit - self.level) / self.per_second
+        return httpx.Response(
+            200,
+            headers={
+                "x-ratelimit-limit-requests": str(self.limit),
+                "x-ratelimit-remaining-requests": str(int(self.level)),
+                "x-ratelimit-reset-requests": f"{reset * 1000:.0f}ms",
+            },
+            json={"ok": True},
+        )
+
+
+async def _burst(transport: httpx.AsyncBaseTransport, requests: int) -> float:
+    start = time.monotonic()
+    async with httpx.AsyncClient(transport=transport, base_url="https://provider") as client:
+        await client.post("/v1/chat/completions", json={"model": "gpt-4o"})
+        await asyncio.gather(
+            *(client.post("/v1/chat/completions", json={"model": "gpt-4o"}) for _ in range(requests - 1))
+        )
+    return time.monotonic() - start
+
+
+@pytest.mark.asyncio
+async def test_scheduler_tracks_quota() -> None:
+    # Without the scheduler, a burst over the quota is mostly rejected
+    provider = FakeProvider(limit=5, per_second=50)
+    await _burst(httpx.MockTransport(provider), 40)
+    assert provider.statuses.count(429) > 20
+
+    # With it, requests are queued and released at the rate the quota refills
+    provider = FakeProvider(limit=5, per_second=50)
+    transport = RateLimitedTransport(httpx.MockTransport(provider))
+    elapsed = await _burst(transport, 40)
+    assert provider.statuses.count(429) == 0
+    assert 0.5 < elapsed < 1.5
+    stats = transport.stats()["gpt-4o"]
+    assert (stats["admitted"], stats["requests_limit"], stats["waiting"]) == (40, 5, 0)
+    assert stats["queued"] > 30
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_quota_is_paused() -> None:
+    calls: list[tuple[float, str]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((time.monotonic(), request.url.path))
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.2"})
+        return httpx.Response(200)
+
+    transport = RateLimitedTransport(httpx.MockTransport(handler))
+    async with httpx.AsyncClient(transport=transport, base_url="https://resource.openai.azure.com") as client:
+        path = "/openai/deployments/{}/chat/completions"
+        assert (await client.post(path.format("east"), json={"messages": []})).status_code == 429
+        # Other deployments have their own quotas
+        await client.post(path.format("west"), json={"messages": []})
+        await client.post(path.format("east"), json={"messages": []})
+
+    assert calls[1][0] - calls[0][0] < 0.1
+    assert calls[2][0] - calls[0][0] >= 0.2
+    assert transport.stats()["east"]["rate_limited"] == 1
+    assert set(transport.stats()) == {"east", "west"}
+
+
+def _tokens_response(remaining: int) -> httpx.Response:
+    headers = {
+        "x-ratelimit-limit-tokens": "100",
+        "x-ratelimit-remaining-tokens": str(remaining),
+        "x-ratelimit-reset-tokens": "1h",
+    }
+    return httpx.Response(200, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_requests_in_flight_stay_reserved() -> None:
+    scheduler = RateLimitScheduler()
+    scheduler.update(_tokens_response(100), await scheduler.acquire(10))
+    first = await scheduler.acquire(40)
+    second = await scheduler.acquire(40)
+
+    # The provider has only counted the first request when it answers it, so the second stays reserved
+    scheduler.update(_tokens_response(60), first)
+    assert scheduler.tokens.level == pytest.approx(20, abs=0.1)
+    assert scheduler.tokens.in_flight == 40
+
+    # A request admitted but cancelled before it was sent gives its reservation back
+    waiter = asyncio.create_task(scheduler.acquire(40))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["waiting"] == 1
+    scheduler.release(second, refund=True)
+    assert scheduler.stats()["waiting"] == 0
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.tokens.level == pytest.approx(60, abs=0.1)
+    assert scheduler.tokens.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_waiter_cancelled_mid_queue() -> None:
+    scheduler = RateLimitScheduler()
+    scheduler.update(_tokens_response(20), await scheduler.acquire(10))
+    waiters = [asyncio.create_task(scheduler.acquire(40)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["waiting"] == 3
+
+    # A waiter cancelled in the same step as the budget frees up is skipped, and the others are admitted
+    waiters[1].cancel()
+    scheduler.update(_tokens_response(100), (0.0, 0.0))
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert results[0] == results[2] == (0.0, 40)
+    assert scheduler.stats()["waiting"] == 0
+    assert scheduler.tokens.in_flight == 80
+    assert scheduler.tokens.level == pytest.approx(20, abs=0.1)
+
+
+def test_duration() -> None:
+    assert _duration("6m0s") == 360
+    assert _duration("20ms") == 0.02
+    assert _duration("1.5") == 1.5
+    assert _duration("soon") is None
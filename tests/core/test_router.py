@@ -0,0 +1,80 @@
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from core.router import ModelRouter, RouterChatModel, complexity_score, turn_features
+
+LONG_QUESTION = (
+    "Explain why credit growth slowed in Vietnam this year and compare it with Thailand, "
+    "analyze the effect of interest rates step by step. " * 4
+)
+
+
+def test_complexity_score() -> None:
+    assert complexity_score(turn_features([HumanMessage(content="Hello!")], tools_bound=False)) < 0.1
+    assert complexity_score(turn_features([HumanMessage(content=LONG_QUESTION)], tools_bound=True)) > 0.5
+
+    # Answering from tool results scores lower than choosing the tools
+    messages = [HumanMessage(content="Search the news"), AIMessage(content=""), ToolMessage(content="", tool_call_id="1")]
+    assert turn_features(messages, tools_bound=True)["tools"] == 0
+    assert turn_features(messages[:1], tools_bound=True)["tools"] == 1
+
+
+def test_router_adapts_to_feedback_and_latency() -> None:
+    router = ModelRouter()
+    assert router.route([HumanMessage(content="Hi")], False, True, run_id="run-1") == "cheap"
+    threshold = router.threshold
+    router.record_feedback("run-1", "stars", 0.2)
+    assert router.threshold < threshold
+    lowered = router.threshold
+    # Each key counts once per run, and only keys in ROUTER_FEEDBACK_KEYS count if it's set
+    router.record_feedback("run-1", "stars", 0.2)
+    router.record_feedback("unknown-run", "stars", 0.2)
+    with patch("core.router.settings.ROUTER_FEEDBACK_KEYS", {"stars"}):
+        router.record_feedback("run-1", "thumbs", 0.2)
+    assert router.threshold == lowered
+    router.record_feedback("run-1", "thumbs", 1.0)
+    assert lowered < router.threshold < threshold
+
+    # A strong model much slower than the cheap one raises the threshold
+    router.record_latency("cheap", True, 0.5)
+    router.record_latency("strong", True, 2.0)
+    assert router.effective_threshold(streaming=True) > router.threshold
+    assert router.effective_threshold(streaming=False) == router.threshold
+
+
+@pytest.mark.asyncio
+async def test_router_model(caplog) -> None:
+    model = RouterChatModel(
+        cheap=FakeListChatModel(responses=["cheap answer"]), strong=FakeListChatModel(responses=["strong answer"])
+    )
+    router = ModelRouter()
+    with patch("core.router.model_router", router), caplog.at_level(logging.INFO, logger="core.router.decisions"):
+        config = {"configurable": {"run_id": "run-1"}}
+        assert (await model.ainvoke([HumanMessage(content="Hi")], config)).content == "cheap answer"
+        tokens = [chunk.content async for chunk in model.astream([HumanMessage(content=LONG_QUESTION)])]
+        assert "".join(tokens) == "strong answer"
+
+    assert router.routed == {"cheap": 1, "strong": 1}
+    assert set(router.latency) == {("cheap", False), ("strong", True)}
+    decision = json.loads(caplog.records[0].getMessage())
+    assert decision["run_id"] == "run-1"
+    assert decision["tier"] == "cheap"
+    assert decision["features"]["length"] < 0.01
+
+
+def test_router_model_sync_call() -> None:
+    model = RouterChatModel(
+        cheap=FakeListChatModel(responses=["cheap answer"]), strong=FakeListChatModel(responses=["strong answer"])
+    )
+    router = ModelRouter()
+    with patch("core.router.model_router", router):
+        config = {"configurable": {"run_id": "run-1"}}
+        assert model.invoke([HumanMessage(content=LONG_QUESTION)], config).content == "strong answer"
+    assert router.routed == {"cheap": 0, "strong": 1}
+    assert set(router.latency) == {("strong", False)}
+    assert router._decisions == {"run-1": "strong"}
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from core.scheduler import PriorityScheduler, config_priority
+from schema import Priority
+
+
+async def _hold(scheduler: PriorityScheduler, priority: Priority, name: str, order: list[str]) -> None:
+    async with scheduler.slot(priority):
+        order.append(name)
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_interactive_served_before_batch() -> None:
+    scheduler = PriorityScheduler(slots=1, max_wait=60)
+    order: list[str] = []
+
+    first = asyncio.create_task(_hold(scheduler, Priority.BATCH, "batch-1", order))
+    await asyncio.sleep(0)
+    waiting = [
+        asyncio.create_task(_hold(scheduler, Priority.BATCH, "batch-2", order)),
+        asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "interactive-1", order)),
+        asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "interactive-2", order)),
+    ]
+    await asyncio.gather(first, *waiting)
+
+    assert order == ["batch-1", "interactive-1", "interactive-2", "batch-2"]
+    assert scheduler.granted == {Priority.INTERACTIVE: 2, Priority.BATCH: 2}
+    assert scheduler.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_starved_batch_request_is_served() -> None:
+    scheduler = PriorityScheduler(slots=1, max_wait=0.015)
+    order: list[str] = []
+
+    first = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "interactive-0", order))
+    await asyncio.sleep(0)
+    batch = asyncio.create_task(_hold(scheduler, Priority.BATCH, "batch", order))
+    interactive = [
+        asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, f"interactive-{i}", order)) for i in range(1, 4)
+    ]
+    await asyncio.gather(first, batch, *interactive)
+
+    # The batch request has waited longer than max_wait after the second interactive slot
+    assert order.index("batch") < order.index("interactive-3")
+    assert order.index("interactive-1") < order.index("batch")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place() -> None:
+    scheduler = PriorityScheduler(slots=1, max_wait=60)
+    order: list[str] = []
+
+    first = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "first", order))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "cancelled", order))
+    last = asyncio.create_task(_hold(scheduler, Priority.BATCH, "last", order))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.gather(first, last, cancelled, return_exceptions=True)
+
+    assert order == ["first", "last"]
+    assert scheduler.waiting(Priority.INTERACTIVE) == 0
+    assert scheduler.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_waiter_cancelled_as_the_slot_frees_up() -> None:
+    scheduler = PriorityScheduler(slots=1, max_wait=60)
+    order: list[str] = []
+
+    holder = scheduler.slot(Priority.INTERACTIVE)
+    await holder.__aenter__()
+    cancelled = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "cancelled", order))
+    last = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "last", order))
+    await asyncio.sleep(0)
+    # The slot is released in the same step as the first waiter is cancelled, so it goes to the next one
+    cancelled.cancel()
+    await holder.__aexit__(None, None, None)
+    await asyncio.gather(last, cancelled, return_exceptions=True)
+
+    assert order == ["last"]
+    assert scheduler.waiting(Priority.INTERACTIVE) == 0
+    assert scheduler.in_use == 0
+    async with scheduler.slot(Priority.BATCH):
+        assert scheduler.in_use == 1
+
+
+@pytest.mark.asyncio
+async def test_unlimited_slots() -> None:
+    scheduler = PriorityScheduler(slots=0, max_wait=60)
+    async with scheduler.slot(Priority.BATCH), scheduler.slot(Priority.BATCH):
+        assert scheduler.in_use == 0
+
+
+def test_config_priority() -> None:
+    assert config_priority(None) == Priority.INTERACTIVE
+    assert config_priority({"configurable": {}}) == Priority.INTERACTIVE
+    assert config_priority({"configurable": {"priority": "batch"}}) == Priority.BATCH
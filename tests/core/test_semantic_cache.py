@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from core.semantic_cache import HashedNgramEmbedder, SemanticCache
+
+
+def make_cache(**kwargs) -> SemanticCache:
+    return SemanticCache(**{"capacity": 10, "threshold": 0.9, "ttl": 60, **kwargs})
+
+
+def test_embedder_is_normalized() -> None:
+    embedder = HashedNgramEmbedder(dim=256)
+    vector = embedder.embed("What was the GDP growth of Vietnam?")
+    assert vector.shape == (256,)
+    assert abs(float(vector @ vector) - 1) < 1e-5
+    # Nothing but stop words and punctuation
+    assert not embedder.embed("Can you tell me?").any()
+
+
+def test_paraphrase_hits() -> None:
+    cache = make_cache()
+    cache.set("agent", "What was the inflation rate of Vietnam in 2023?", "answer")
+    assert cache.get("agent", "Can you tell me what the inflation rate of Vietnam was in 2023?") == "answer"
+    assert cache.get("agent", "inflation rate for vietnam in 2023") == "answer"
+    assert cache.get("agent", "What was the inflation rate of Thailand in 2023?") is None
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+def test_different_numbers_miss() -> None:
+    cache = make_cache(threshold=0.5)
+    cache.set("agent", "What was the inflation rate of Vietnam in 2023?", "2023")
+    assert cache.get("agent", "What was the inflation rate of Vietnam in 2024?") is None
+
+
+def test_namespaces_are_isolated() -> None:
+    cache = make_cache()
+    cache.set("a", "What is the capital of France?", "A")
+    cache.set("b", "What is the capital of France?", "B")
+    assert cache.get("a", "What is the capital of France?") == "A"
+    assert cache.get("b", "What is the capital of France?") == "B"
+    assert cache.get("c", "What is the capital of France?") is None
+
+
+def test_capacity_and_ttl() -> None:
+    cache = make_cache(capacity=2)
+    with patch("core.semantic_cache.time.time", return_value=1000):
+        cache.set("agent", "What is the capital of France?", "Paris")
+        cache.set("agent", "What is the capital of France?", "Paris, France")
+        assert cache.stats()["entries"] == 1
+        cache.set("agent", "Who wrote Hamlet?", "Shakespeare")
+    with patch("core.semantic_cache.time.time", return_value=1001):
+        assert cache.get("agent", "What is the capital of France?") == "Paris, France"
+        # "Who wrote Hamlet?" is now the least recently used entry
+        cache.set("agent", "How tall is Mount Everest?", "8849 m")
+        assert cache.get("agent", "Who wrote Hamlet?") is None
+        assert cache.get("agent", "How tall is Mount Everest?") == "8849 m"
+
+    with patch("core.semantic_cache.time.time", return_value=1062):
+        assert cache.get("agent", "How tall is Mount Everest?") is None
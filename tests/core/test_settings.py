@@ -6,7 +6,7 @@ import pytest
 from pydantic import SecretStr, ValidationError
 
 from core.settings import Settings, check_str_is_http
-from schema.models import AzureOpenAIModelName, OpenAIModelName, GoogleModelName
+from schema.models import AzureOpenAIModelName, OpenAIModelName, GoogleModelName, RouterModelName
 
 
 def test_check_str_is_http():
@@ -40,7 +40,11 @@ def test_settings_with_openai_key():
         settings = Settings(_env_file=None)
         assert settings.OPENAI_API_KEY == SecretStr("test_key")
         assert settings.DEFAULT_MODEL == OpenAIModelName.GPT_4O
-        assert settings.AVAILABLE_MODELS == set(OpenAIModelName)
+        assert settings.AVAILABLE_MODELS == set(OpenAIModelName) | {RouterModelName.AUTO}
+        assert (settings.ROUTER_CHEAP_MODEL, settings.ROUTER_STRONG_MODEL) == (
+            OpenAIModelName.GPT_4O_MINI,
+            OpenAIModelName.GPT_4O,
+        )
 
 
 def test_settings_with_multiple_api_keys():
@@ -60,6 +64,7 @@ def test_settings_with_multiple_api_keys():
         # Available models should include exactly all OpenAI and Anthropic models
         expected_models = set(OpenAIModelName)
         expected_models.update(set(GoogleModelName))
+        expected_models.add(RouterModelName.AUTO)
         assert settings.AVAILABLE_MODELS == expected_models
 
 
@@ -89,7 +94,8 @@ def test_settings_with_azure_openai_key():
         settings = Settings(_env_file=None)
         assert settings.AZURE_OPENAI_API_KEY.get_secret_value() == "test_key"
         assert settings.DEFAULT_MODEL == AzureOpenAIModelName.AZURE_GPT_4O
-        assert settings.AVAILABLE_MODELS == set(AzureOpenAIModelName)
+        assert settings.AVAILABLE_MODELS == set(AzureOpenAIModelName) | {RouterModelName.AUTO}
+        assert settings.ROUTER_STRONG_MODEL == AzureOpenAIModelName.AZURE_GPT_4O
 
 
 def test_settings_with_both_openai_and_azure():
@@ -111,6 +117,7 @@ def test_settings_with_both_openai_and_azure():
         # Available models should include both OpenAI and Azure OpenAI models
         expected_models = set(OpenAIModelName)
         expected_models.update(set(AzureOpenAIModelName))
+        expected_models.add(RouterModelName.AUTO)
         assert settings.AVAILABLE_MODELS == expected_models
 
 
@@ -178,3 +185,28 @@ def test_settings_azure_openai():
         assert settings.AZURE_OPENAI_API_KEY.get_secret_value() == "test-key"
         assert settings.AZURE_OPENAI_ENDPOINT == "https://test.openai.azure.com"
         assert settings.AZURE_OPENAI_DEPLOYMENT_MAP == deployment_map
+
+
+def test_settings_azure_deployment_lists():
+    deployment_map = {
+        "gpt-4o": ["east", {"deployment": "west", "endpoint": "https://west.openai.azure.com", "api_key": "k", "weight": 2}],
+        "gpt-4o-mini": "mini",
+    }
+    with patch.dict(
+        os.environ,
+        {
+            "AZURE_OPENAI_API_KEY": "test-key",
+            "AZURE_OPENAI_ENDPOINT": "https://test.openai.azure.com",
+            "AZURE_OPENAI_DEPLOYMENT_MAP": json.dumps(deployment_map),
+        },
+        clear=True,
+    ):
+        settings = Settings(_env_file=None)
+        east, west = settings.azure_deployments("gpt-4o")
+        assert (east.deployment, east.endpoint, east.api_key.get_secret_value()) == (
+            "east",
+            "https://test.openai.azure.com",
+            "test-key",
+        )
+        assert (west.endpoint, west.api_key.get_secret_value(), west.weight) == ("https://west.openai.azure.com", "k", 2)
+        assert [d.deployment for d in settings.azure_deployments("gpt-4o-mini")] == ["mini"]
@@ -0,0 +1,34 @@
+import asyncio
+from contextlib import suppress
+
+import httpx
+import pytest
+
+from core.transport import InstrumentedTransport
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Minimal keep-alive HTTP/1.1 server answering every request with "ok"
+    with suppress(asyncio.IncompleteReadError):
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_transport_counts_connection_reuse() -> None:
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    traced = []
+
+    async def trace(event_name: str, info: dict) -> None:
+        traced.append(event_name)
+
+    transport = InstrumentedTransport(httpx.AsyncHTTPTransport())
+    async with server, httpx.AsyncClient(transport=transport, base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(3):
+            assert (await client.get("/", extensions={"trace": trace})).text == "ok"
+        assert transport.stats() == {"requests": 3, "connections_opened": 1, "tls_handshakes": 0, "reuse_rate": 2 / 3}
+    # A trace set by the caller still receives every event
+    assert "connection.connect_tcp.complete" in traced
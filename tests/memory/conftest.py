@@ -0,0 +1,23 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, MessagesState, StateGraph
+
+
+@pytest.fixture
+def echo_graph():
+    """
+    Fixture returning a factory for a one-node graph that echoes the last message.
+    Keyword arguments of the factory are set on every echoed AIMessage.
+    """
+
+    def build(saver, **message_fields):
+        def respond(state: MessagesState):
+            return {"messages": [AIMessage(content=f"echo: {state['messages'][-1].content}", **message_fields)]}
+
+        graph = StateGraph(MessagesState)
+        graph.add_node("respond", respond)
+        graph.set_entry_point("respond")
+        graph.add_edge("respond", END)
+        return graph.compile(checkpointer=saver)
+
+    return build
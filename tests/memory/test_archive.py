@@ -0,0 +1,116 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.archive import ArchivingSaver, ThreadArchiver
+from memory.utils import checkpoint_id_time
+
+
+def test_checkpoint_id_time() -> None:
+    before = datetime.now(UTC)
+    created = checkpoint_id_time(str(uuid6()))
+    assert before - timedelta(seconds=1) < created < datetime.now(UTC) + timedelta(seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_archive_and_restore(tmp_path, echo_graph) -> None:
+    archive_dir = tmp_path / "archive"
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        archiver = ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))
+        graph = echo_graph(ArchivingSaver(saver, archiver))
+        configs = [{"configurable": {"thread_id": f"thread-{i}"}} for i in range(3)]
+        for i, config in enumerate(configs):
+            await graph.ainvoke({"messages": [("human", f"hi {i}")]}, config)
+
+        # Nothing is idle yet
+        assert await archiver.archive_idle_threads() == 0
+
+        later = datetime.now(UTC) + timedelta(days=2)
+        assert await archiver.archive_idle_threads(now=later) == 3
+        assert list(archive_dir.glob(f"day={later:%Y-%m-%d}/*.parquet"))
+        for config in configs:
+            assert await saver.aget_tuple(config) is None
+            assert archiver.is_archived(config["configurable"]["thread_id"])
+
+        # A new archiver picks up existing archive files
+        archiver = ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))
+        graph = echo_graph(ArchivingSaver(saver, archiver))
+
+        # Accessing the thread restores it, and the conversation continues where it left off
+        state = await graph.aget_state(configs[1])
+        assert [m.content for m in state.values["messages"]] == ["hi 1", "echo: hi 1"]
+        assert not archiver.is_archived("thread-1")
+        await graph.ainvoke({"messages": [("human", "again")]}, configs[1])
+        state = await graph.aget_state(configs[1])
+        assert [m.content for m in state.values["messages"]] == ["hi 1", "echo: hi 1", "again", "echo: again"]
+        assert len([c async for c in saver.alist(configs[1])]) > 2
+
+        # Unknown threads are unaffected
+        assert await archiver.restore_thread("unknown") is False
+        assert archiver.is_archived("thread-0")
+
+
+@pytest.mark.asyncio
+async def test_archive_keeps_threads_written_during_export(tmp_path, echo_graph) -> None:
+    archive_dir = tmp_path / "archive"
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        archiver = ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))
+        graph = echo_graph(ArchivingSaver(saver, archiver))
+        configs = [{"configurable": {"thread_id": f"thread-{i}"}} for i in range(2)]
+        for i, config in enumerate(configs):
+            await graph.ainvoke({"messages": [("human", f"hi {i}")]}, config)
+
+        # thread-1 is resumed after it was exported, before it is deleted
+        export_thread = archiver._export_thread
+
+        async def export_then_resume(thread_id: str):
+            rows = [row async for row in export_thread(thread_id)]
+            if thread_id == "thread-1":
+                await graph.ainvoke({"messages": [("human", "again")]}, configs[1])
+            for row in rows:
+                yield row
+
+        archiver._export_thread = export_then_resume
+        assert await archiver.archive_idle_threads(now=datetime.now(UTC) + timedelta(days=2)) == 1
+        assert archiver.is_archived("thread-0")
+        assert not archiver.is_archived("thread-1")
+        state = await graph.aget_state(configs[1])
+        assert [m.content for m in state.values["messages"]] == ["hi 1", "echo: hi 1", "again", "echo: again"]
+        # The archive file only holds the archived thread
+        assert ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))._index.keys() == {"thread-0"}
+
+
+@pytest.mark.asyncio
+async def test_archiver_processes_share_the_archive(tmp_path, echo_graph) -> None:
+    archive_dir = tmp_path / "archive"
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        # Two workers, each with its own archiver
+        first = ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))
+        second = ThreadArchiver(saver, archive_dir, ttl=timedelta(hours=24))
+
+        # Only one of them holds the archiving lease at a time, until it expires
+        assert await first.acquire_lease(0.1)
+        assert not await second.acquire_lease(0.1)
+        assert await first.acquire_lease(0.1)
+        await asyncio.sleep(0.15)
+        assert await second.acquire_lease(10)
+        assert not await first.acquire_lease(10)
+
+        config = {"configurable": {"thread_id": "thread-1"}}
+        await echo_graph(ArchivingSaver(saver, first)).ainvoke({"messages": [("human", "hi")]}, config)
+        assert await second.archive_idle_threads(now=datetime.now(UTC) + timedelta(days=2)) == 1
+
+        # The other worker finds threads archived after it started
+        graph = echo_graph(ArchivingSaver(saver, first))
+        state = await graph.aget_state(config)
+        assert [m.content for m in state.values["messages"]] == ["hi", "echo: hi"]
+
+        # and the worker that archived it doesn't restore it over newer checkpoints
+        await graph.ainvoke({"messages": [("human", "again")]}, config)
+        assert await second.restore_thread("thread-1") is False
+        assert not second.is_archived("thread-1")
+        state = await echo_graph(ArchivingSaver(saver, second)).aget_state(config)
+        assert len(state.values["messages"]) == 4
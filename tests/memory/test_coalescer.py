@@ -0,0 +1,99 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory import initialize_database
+from memory.coalescer import WriteCoalescer
+from memory.sqlite import CoalescingSqliteSaver
+
+
+@pytest.mark.asyncio
+async def test_coalescer_batches_concurrent_writes() -> None:
+    batches = []
+
+    async def commit_batch(statements):
+        batches.append(statements)
+
+    coalescer = WriteCoalescer(commit_batch, window=0.01, max_batch=100)
+    await asyncio.gather(*(coalescer.submit(f"thread-{i}", [("sql", [(i,)])]) for i in range(10)))
+
+    assert len(batches) == 1
+    # Statements are committed in submission order
+    assert [rows[0][0] for _, rows in batches[0]] == list(range(10))
+    assert coalescer.commits == 1
+    assert coalescer.writes == 10
+
+
+@pytest.mark.asyncio
+async def test_coalescer_max_batch() -> None:
+    batches = []
+
+    async def commit_batch(statements):
+        batches.append(statements)
+
+    coalescer = WriteCoalescer(commit_batch, window=10, max_batch=2)
+    await asyncio.wait_for(
+        asyncio.gather(*(coalescer.submit("thread", [("sql", [(i,)])]) for i in range(4))),
+        timeout=1,
+    )
+    assert [len(b) for b in batches] == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_commit_error() -> None:
+    async def commit_batch(statements):
+        raise RuntimeError("disk full")
+
+    coalescer = WriteCoalescer(commit_batch, window=0.01, max_batch=100)
+    results = await asyncio.gather(
+        coalescer.submit("a", [("sql", [(1,)])]),
+        coalescer.submit("b", [("sql", [(2,)])]),
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert coalescer.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_coalescing_sqlite_saver(tmp_path, echo_graph) -> None:
+    with patch("memory.sqlite.settings.CHECKPOINT_GROUP_COMMIT_MS", 20):
+        async with CoalescingSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+            graph = echo_graph(saver)
+            configs = [{"configurable": {"thread_id": f"thread-{i}"}} for i in range(8)]
+            await asyncio.gather(
+                *(graph.ainvoke({"messages": [("human", f"hi {i}")]}, c) for i, c in enumerate(configs))
+            )
+
+            # Fewer transactions than writes
+            assert saver.coalescer.commits < saver.coalescer.writes
+
+            # Read-your-writes on every thread, including a follow-up turn
+            for i, config in enumerate(configs):
+                state = await graph.aget_state(config)
+                assert state.values["messages"][-1].content == f"echo: hi {i}"
+            await graph.ainvoke({"messages": [("human", "again")]}, configs[0])
+            state = await graph.aget_state(configs[0])
+            assert [m.content for m in state.values["messages"]] == ["hi 0", "echo: hi 0", "again", "echo: again"]
+
+
+@pytest.mark.asyncio
+async def test_initialize_database_flushes_queued_writes(tmp_path) -> None:
+    db_path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "thread-1", "checkpoint_ns": ""}}
+    with (
+        patch("memory.settings.SQLITE_DB_PATH", db_path),
+        patch("memory.settings.ARCHIVE_DIR", None),
+        patch("memory.settings.CHECKPOINT_GROUP_COMMIT_MS", 10_000),
+    ):
+        async with initialize_database() as saver:
+            await saver.setup()
+            put = asyncio.create_task(saver.aput(config, empty_checkpoint(), {}, {}))
+            await asyncio.sleep(0.01)
+            assert not put.done()
+        await put
+
+    async with AsyncSqliteSaver.from_conn_string(db_path) as saver:
+        assert await saver.aget_tuple(config) is not None
@@ -0,0 +1,135 @@
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.archive import ArchivingSaver, ThreadArchiver
+from memory.export import _root_checkpoints, export_conversations, read_watermark
+
+_TOOL_CALL_FIELDS = {
+    "tool_calls": [{"name": "Calculator", "args": {"expression": "1 + 1"}, "id": "call_1"}],
+    "usage_metadata": {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15},
+    "response_metadata": {"model_name": "gpt-4o"},
+}
+
+
+@pytest.mark.asyncio
+async def test_export_conversations(tmp_path, echo_graph) -> None:
+    output_dir = tmp_path / "export"
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = echo_graph(saver, **_TOOL_CALL_FIELDS)
+        for i in range(2):
+            await graph.ainvoke({"messages": [("human", f"hi {i}")]}, {"configurable": {"thread_id": f"thread-{i}"}})
+
+        result = await export_conversations(saver, output_dir, batch_rows=1)
+        assert result.threads == 2
+        assert result.messages == 4
+        assert result.tool_calls == 2
+        assert result.token_usage == 2
+        assert read_watermark(output_dir) == result.watermark
+        # The watermark is the latest checkpoint exported
+        config = {"configurable": {"thread_id": "thread-1"}}
+        latest_id = (await saver.aget_tuple(config)).config["configurable"]["checkpoint_id"]
+        assert result.watermark == latest_id
+
+        messages = pq.read_table(output_dir / "messages").to_pandas()
+        assert sorted(messages["content"]) == ["echo: hi 0", "echo: hi 1", "hi 0", "hi 1"]
+        tool_calls = pq.read_table(output_dir / "tool_calls").to_pandas()
+        assert set(tool_calls["name"]) == {"Calculator"}
+        token_usage = pq.read_table(output_dir / "token_usage").to_pandas()
+        assert token_usage["total_tokens"].sum() == 30
+        assert list(output_dir.glob("messages/date=*/*.parquet"))
+
+        # Nothing changed since the stored watermark
+        result = await export_conversations(saver, output_dir)
+        assert result.threads == 0
+        assert result.messages == 0
+        assert read_watermark(output_dir) == latest_id
+
+        # Only the new turn of the updated thread is exported
+        await graph.ainvoke({"messages": [("human", "again")]}, config)
+        result = await export_conversations(saver, output_dir)
+        assert result.threads == 1
+        assert result.messages == 2
+        messages = pq.read_table(output_dir / "messages").to_pandas()
+        assert len(messages) == 6
+        assert messages["message_id"].is_unique
+        # Reading a thread stopped at the watermark, and closing the reads released the saver's lock
+        assert not saver.lock.locked()
+
+        # A full export ignores the watermark
+        result = await export_conversations(saver, tmp_path / "full", full=True)
+        assert result.messages == 6
+
+
+@pytest.mark.asyncio
+async def test_export_threads_written_during_export(tmp_path, echo_graph) -> None:
+    output_dir = tmp_path / "export"
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = echo_graph(saver)
+        for i in range(2):
+            await graph.ainvoke({"messages": [("human", f"hi {i}")]}, {"configurable": {"thread_id": f"thread-{i}"}})
+
+        async def write_during_export(saver, thread_id):
+            if thread_id == "thread-0":
+                # A new thread, then a thread that is exported after this one
+                await graph.ainvoke({"messages": [("human", "late")]}, {"configurable": {"thread_id": "thread-late"}})
+                await graph.ainvoke({"messages": [("human", "again")]}, {"configurable": {"thread_id": "thread-1"}})
+            async for checkpoint in _root_checkpoints(saver, thread_id):
+                yield checkpoint
+
+        with patch("memory.export._root_checkpoints", write_during_export):
+            result = await export_conversations(saver, output_dir)
+        # Only what was there when the export started is exported
+        assert (result.threads, result.messages) == (2, 4)
+
+        # The next export picks up everything written meanwhile
+        result = await export_conversations(saver, output_dir)
+        assert (result.threads, result.messages) == (2, 4)
+        messages = pq.read_table(output_dir / "messages").to_pandas()
+        assert sorted(messages["content"]) == sorted(
+            ["hi 0", "echo: hi 0", "hi 1", "echo: hi 1", "again", "echo: again", "late", "echo: late"]
+        )
+
+
+@pytest.mark.asyncio
+async def test_export_message_times(tmp_path, echo_graph) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = echo_graph(saver)
+        config = {"configurable": {"thread_id": "thread"}}
+        await graph.ainvoke({"messages": [("human", "hi")]}, config)
+        first_turn = [c.checkpoint async for c in saver.alist(config)]
+        await graph.ainvoke({"messages": [("human", "again")]}, config)
+
+        await export_conversations(saver, tmp_path / "export")
+        messages = pq.read_table(tmp_path / "export" / "messages").to_pandas().sort_values("position")
+        # Each message has the time of the checkpoint that added it, not of the latest one
+        checkpoints = {c["id"]: c["ts"] for c in first_turn}
+        first, second = messages.iloc[:2], messages.iloc[2:]
+        assert set(first["checkpoint_id"]) <= checkpoints.keys()
+        assert list(first["updated_at"]) == [checkpoints[c] for c in first["checkpoint_id"]]
+        assert not set(second["checkpoint_id"]) & checkpoints.keys()
+        assert first["updated_at"].max() < second["updated_at"].min()
+
+
+@pytest.mark.asyncio
+async def test_export_archived_threads(tmp_path, echo_graph) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        archiver = ThreadArchiver(saver, tmp_path / "archive", ttl=timedelta(hours=24))
+        archiving_saver = ArchivingSaver(saver, archiver)
+        graph = echo_graph(archiving_saver)
+        for i in range(2):
+            await graph.ainvoke({"messages": [("human", f"hi {i}")]}, {"configurable": {"thread_id": f"thread-{i}"}})
+        assert await archiver.archive_idle_threads(now=datetime.now(UTC) + timedelta(days=2)) == 2
+        await graph.ainvoke({"messages": [("human", "new")]}, {"configurable": {"thread_id": "thread-2"}})
+
+        result = await export_conversations(archiving_saver, tmp_path / "export", full=True)
+        assert (result.threads, result.messages) == (3, 6)
+        # Archived threads are read from the archive, not restored
+        assert archiver.is_archived("thread-0") and archiver.is_archived("thread-1")
+
+        # They aren't exported again incrementally
+        result = await export_conversations(archiving_saver, tmp_path / "export")
+        assert result.threads == 0
@@ -0,0 +1,40 @@
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core.router import ModelRouter
+from memory.routing import RoutingStore
+
+
+@pytest.mark.asyncio
+async def test_workers_share_routing(tmp_path) -> None:
+    path = str(tmp_path / "checkpoints.db")
+    async with AsyncSqliteSaver.from_conn_string(path) as saver_1, AsyncSqliteSaver.from_conn_string(path) as saver_2:
+        store_1, store_2 = RoutingStore(saver_1), RoutingStore(saver_2)
+        await store_1.setup()
+        await store_2.setup()  # idempotent, and keeps the threshold already there
+        router_1, router_2 = ModelRouter(), ModelRouter()
+        threshold = router_1.threshold
+
+        # Feedback on a run routed by one worker reaches another one
+        assert router_1.route([HumanMessage(content="Hi")], False, True, run_id="run-1") == "cheap"
+        await store_1.sync(router_1)
+        await store_2.record_feedback(router_2, "run-1", "stars", 0.2)
+        assert router_2.threshold < threshold
+        await store_1.sync(router_1)
+        assert router_1.threshold == router_2.threshold
+
+        # Each key counts once per run, and unknown runs are ignored
+        await store_1.record_feedback(router_1, "run-1", "stars", 0.2)
+        await store_1.record_feedback(router_1, "run-2", "stars", 0.2)
+        assert router_1.threshold == router_2.threshold
+        await store_1.record_feedback(router_1, "run-1", "thumbs", 0.0)
+        assert router_1.threshold < router_2.threshold
+
+        # A decision made since the last sync is saved before feedback on it is looked up
+        lowered = router_1.threshold
+        router_1.route([HumanMessage(content="Hello")], False, False, run_id="run-3")
+        await store_1.record_feedback(router_1, "run-3", "stars", 1.0)
+        assert router_1.threshold > lowered
+        await store_2.sync(router_2)
+        assert router_2.threshold == router_1.threshold
@@ -0,0 +1,69 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.runs import INTERRUPTED, RunIndex
+
+
+@pytest.mark.asyncio
+async def test_run_index(tmp_path) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        index = RunIndex(saver)
+        await index.setup()
+        await index.setup()  # idempotent
+
+        await index.add("run-1", thread_id="thread-1", agent_id="chatbot", started_at=datetime(2025, 1, 1, tzinfo=UTC))
+        await index.add("run-2", thread_id=None, agent_id="research-assistant", started_at=datetime.now(UTC))
+        await index.set_current_nodes({"run-2": "tools"})
+
+        runs = await index.list_runs()
+        assert [r.run_id for r in runs] == ["run-1", "run-2"]
+        assert runs[0].current_node is None
+        assert runs[1].current_node == "tools"
+        assert (await index.get_run("run-1")).thread_id == "thread-1"
+        assert await index.get_run("missing") is None
+
+        assert await index.cancel_requests() == set()
+        await index.request_cancel("run-2")
+        assert await index.cancel_requests() == {"run-2"}
+
+        await index.remove("run-2")
+        assert await index.cancel_requests() == set()
+        assert [r.run_id for r in await index.list_runs()] == ["run-1"]
+
+
+@pytest.mark.asyncio
+async def test_run_index_interrupted_runs(tmp_path) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        index = RunIndex(saver)
+        await index.setup()
+        started_at = datetime.now(UTC) - timedelta(minutes=5)
+        await index.add("resumable", thread_id="thread-1", agent_id="chatbot", started_at=started_at, user_input="{}")
+        await index.add("ephemeral", thread_id=None, agent_id="chatbot", started_at=started_at)
+        await index.add("alive", thread_id="thread-2", agent_id="chatbot", started_at=started_at, user_input="{}")
+        await index.heartbeat(["alive"], datetime.now(UTC))
+
+        # Only runs whose worker stopped refreshing them are orphaned, and only resumable ones are kept
+        await index.sweep_orphans(datetime.now(UTC) - timedelta(minutes=1))
+        assert [r.run_id for r in await index.list_runs()] == ["alive"]
+        assert [r.run_id for r in await index.list_runs(INTERRUPTED)] == ["resumable"]
+
+        # A run can only be claimed once
+        assert await index.claim_interrupted("alive") is None
+        assert await index.claim_interrupted("resumable") == ("chatbot", "{}")
+        assert await index.claim_interrupted("resumable") is None
+        assert await index.list_runs(INTERRUPTED) == []
+
+        # The claimed run stays in the index until the run resuming it takes it over,
+        # and is interrupted again if the worker that claimed it dies
+        assert {r.run_id for r in await index.list_runs()} == {"alive", "resumable"}
+        await index.rename("resumable", "resumed")
+        await index.sweep_orphans(datetime.now(UTC) + timedelta(minutes=1))
+        assert {r.run_id for r in await index.list_runs(INTERRUPTED)} == {"alive", "resumed"}
+        assert await index.claim_interrupted("resumed") == ("chatbot", "{}")
+
+        # Runs cut short by a shutdown are marked directly, and cancelling one discards it
+        assert [r.run_id for r in await index.list_runs(INTERRUPTED)] == ["alive"]
+        await index.request_cancel("alive")
+        assert await index.get_run("alive") is None
@@ -0,0 +1,45 @@
+import pytest
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.threads import ThreadIndex
+
+
+@pytest.mark.asyncio
+async def test_thread_index(tmp_path) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        index = ThreadIndex(saver)
+        await index.setup()
+        await index.setup()  # idempotent
+
+        for i in range(5):
+            await index.record_run(
+                f"thread-{i}",
+                agent_id="chatbot" if i % 2 else "research-assistant",
+                user_id="alice" if i < 3 else "bob",
+                title=f"Question {i}",
+                new_messages=2,
+            )
+        # A follow-up turn updates the count and timestamp but keeps the title
+        await index.record_run("thread-0", agent_id="chatbot", user_id="alice", title="Follow-up", new_messages=3)
+
+        page = await index.list_threads(limit=2)
+        assert [t.thread_id for t in page.threads] == ["thread-0", "thread-4"]
+        assert page.threads[0].title == "Question 0"
+        assert page.threads[0].message_count == 5
+        assert page.threads[0].agent_id == "chatbot"
+        assert page.threads[0].updated_at > page.threads[0].created_at
+
+        seen = [t.thread_id for t in page.threads]
+        while page.next_cursor:
+            page = await index.list_threads(limit=2, cursor=page.next_cursor)
+            seen.extend(t.thread_id for t in page.threads)
+        assert seen == ["thread-0", "thread-4", "thread-3", "thread-2", "thread-1"]
+
+        page = await index.list_threads(user_id="alice")
+        assert [t.thread_id for t in page.threads] == ["thread-0", "thread-2", "thread-1"]
+        assert page.next_cursor is None
+        page = await index.list_threads(user_id="alice", agent_id="chatbot")
+        assert [t.thread_id for t in page.threads] == ["thread-0", "thread-1"]
+
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await index.list_threads(cursor="not-a-cursor")
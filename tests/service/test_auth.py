@@ -40,3 +40,36 @@ def test_auth_secret_incorrect(mock_settings, mock_agent, test_client):
     # Should also reject requests with no auth header
     response = test_client.post("/invoke", json={"message": "test"})
     assert response.status_code == 401
+
+
+def test_batch_auth_secret_sets_priority(mock_settings, mock_agent, test_client):
+    """Test that BATCH_AUTH_SECRET is accepted and always schedules the request as batch"""
+    mock_settings.AUTH_SECRET = SecretStr("test-secret")
+    mock_settings.BATCH_AUTH_SECRET = SecretStr("batch-secret")
+
+    def priority() -> str:
+        return mock_agent.ainvoke.await_args.kwargs["config"]["configurable"]["priority"]
+
+    response = test_client.post(
+        "/invoke",
+        json={"message": "test"},
+        headers={"Authorization": "Bearer batch-secret", "X-Priority": "interactive"},
+    )
+    assert response.status_code == 200
+    assert priority() == "batch"
+
+    response = test_client.post(
+        "/invoke",
+        json={"message": "test"},
+        headers={"Authorization": "Bearer test-secret"},
+    )
+    assert response.status_code == 200
+    assert priority() == "interactive"
+
+    response = test_client.post(
+        "/invoke",
+        json={"message": "test"},
+        headers={"Authorization": "Bearer test-secret", "X-Priority": "batch"},
+    )
+    assert response.status_code == 200
+    assert priority() == "batch"
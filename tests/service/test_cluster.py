@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import Counter
+from unittest.mock import Mock
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from service.cluster import WorkerSupervisor, create_router_app, worker_for_thread
+
+WORKER_URLS = [f"http://127.0.0.1:{9000 + i}" for i in range(4)]
+
+
+def test_worker_for_thread() -> None:
+    assert worker_for_thread("thread-1", 4) == worker_for_thread("thread-1", 4)
+    counts = Counter(worker_for_thread(f"thread-{i}", 4) for i in range(1000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 200
+
+
+@pytest.fixture
+def worker_requests():
+    requests: list[tuple[int, httpx.Request]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        worker = request.url.port - 9000
+        requests.append((worker, request))
+        if request.url.path == "/ready":
+            return httpx.Response(503 if worker == 3 else 200)
+        if request.url.path.endswith("/reload") and worker == 3:
+            return httpx.Response(500, json={"detail": "Reload failed"})
+        if request.url.path == "/stream":
+            return httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=b"data: hi\n\ndata: [DONE]\n\n"
+            )
+        return httpx.Response(200, json={"worker": worker})
+
+    app = create_router_app(WORKER_URLS, transport=httpx.MockTransport(handler))
+    with TestClient(app) as client:
+        yield client, requests
+
+
+def test_router_thread_affinity(worker_requests) -> None:
+    client, requests = worker_requests
+    expected = worker_for_thread("thread-1", len(WORKER_URLS))
+    for _ in range(3):
+        response = client.post(
+            "/invoke", json={"message": "hi", "thread_id": "thread-1"}, headers={"Authorization": "Bearer secret"}
+        )
+        assert response.json() == {"worker": expected}
+    assert requests[0][1].headers["authorization"] == "Bearer secret"
+
+    response = client.get("/threads", params={"thread_id": "thread-1", "limit": 5})
+    assert response.json() == {"worker": expected}
+    assert requests[-1][1].url.params["limit"] == "5"
+
+    # Requests without a thread are spread across workers
+    workers = {client.post("/invoke", json={"message": "hi"}).json()["worker"] for _ in range(4)}
+    assert workers == {0, 1, 2, 3}
+
+
+def test_router_streams_responses(worker_requests) -> None:
+    client, _ = worker_requests
+    with client.stream("POST", "/stream", json={"message": "hi", "thread_id": "thread-1"}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert list(response.iter_lines()) == ["data: hi", "", "data: [DONE]", ""]
+
+
+def test_router_reloads_every_worker(worker_requests) -> None:
+    client, requests = worker_requests
+    response = client.post("/admin/agents/chatbot/reload", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 500
+    assert response.json()["workers"] == [
+        {"worker": 0, "status_code": 200, "body": {"worker": 0}},
+        {"worker": 1, "status_code": 200, "body": {"worker": 1}},
+        {"worker": 2, "status_code": 200, "body": {"worker": 2}},
+        {"worker": 3, "status_code": 500, "body": {"detail": "Reload failed"}},
+    ]
+    assert sorted(worker for worker, _ in requests) == [0, 1, 2, 3]
+    assert all(request.headers["authorization"] == "Bearer secret" for _, request in requests)
+
+
+def test_router_ready_needs_every_worker(worker_requests) -> None:
+    client, _ = worker_requests
+    assert client.get("/health").status_code == 200
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"detail": "1 workers not ready"}
+
+
+@pytest.mark.asyncio
+async def test_supervisor_restarts_exited_workers() -> None:
+    # Worker 0 exits immediately, worker 1 keeps running for a while
+    supervisor = WorkerSupervisor(time.sleep, 2, stop_timeout=5)
+    supervisor.start()
+    try:
+        watch = asyncio.create_task(supervisor.watch(interval=0.05))
+        # Spawning a process can take seconds on a loaded machine
+        for _ in range(400):
+            await asyncio.sleep(0.05)
+            if supervisor.restarts:
+                break
+        assert supervisor.restarts >= 1
+        assert supervisor.processes[1].is_alive()
+    finally:
+        await asyncio.to_thread(supervisor.stop)
+        await watch
+    assert not any(p.is_alive() for p in supervisor.processes)
+
+
+def test_supervisor_stop_deadline_starts_at_terminate() -> None:
+    supervisor = WorkerSupervisor(time.sleep, 2, stop_timeout=0.2)
+    # Workers that don't exit on SIGTERM, like ones still waiting for their streams to finish
+    supervisor.processes = [Mock(**{"is_alive.return_value": True}) for _ in range(2)]
+    supervisor.terminate()
+    assert all(p.terminate.call_count == 1 for p in supervisor.processes)
+    time.sleep(0.2)
+
+    supervisor.stop()
+    # The stop timeout ran out before stop() was called, so workers are killed without waiting
+    for process in supervisor.processes:
+        assert process.terminate.call_count == 1
+        assert process.join.call_args_list[0].args == (0,)
+        process.kill.assert_called_once()
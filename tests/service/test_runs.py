@@ -0,0 +1,179 @@
+import asyncio
+import time
+from unittest.mock import ANY, AsyncMock, Mock
+
+import pytest
+
+from service.runs import NodeTracker, RunRegistry, ThreadRunQueue, sync_run_index
+
+
+@pytest.mark.asyncio
+async def test_runs_on_same_thread_are_serialized() -> None:
+    queue = ThreadRunQueue()
+    order = []
+
+    async def run(name: str, thread_id: str) -> None:
+        async with queue.run(thread_id, name) as batch:
+            order.append(f"start {name}")
+            await asyncio.sleep(0.01)
+            order.append(f"end {name}")
+            batch.result.set_result(name)
+
+    await asyncio.gather(run("a", "thread"), run("b", "thread"), run("c", "other"))
+
+    assert order.index("end a") < order.index("start b")
+    # Runs on other threads don't wait
+    assert order.index("start c") < order.index("end a")
+    assert not queue._threads
+
+
+@pytest.mark.asyncio
+async def test_coalesce_merges_queued_messages() -> None:
+    queue = ThreadRunQueue()
+    runs = []
+
+    async def run(message: str) -> str:
+        async with queue.run("thread", message, coalesce=True) as batch:
+            if batch.merged:
+                return await batch.result
+            runs.append(list(batch.messages))
+            await asyncio.sleep(0.01)
+            batch.result.set_result(" + ".join(batch.messages))
+            return batch.result.result()
+
+    first = asyncio.create_task(run("1"))
+    await asyncio.sleep(0)
+    results = await asyncio.gather(first, run("2"), run("3"), run("4"))
+
+    assert runs == [["1"], ["2", "3", "4"]]
+    assert results == ["1", "2 + 3 + 4", "2 + 3 + 4", "2 + 3 + 4"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_failure_reaches_merged_requests() -> None:
+    queue = ThreadRunQueue()
+
+    async def run(message: str) -> str:
+        async with queue.run("thread", message, coalesce=True) as batch:
+            if batch.merged:
+                return await batch.result
+            await asyncio.sleep(0.01)
+            if message == "2":
+                raise ValueError("boom")
+            batch.result.set_result(message)
+            return message
+
+    first = asyncio.create_task(run("1"))
+    await asyncio.sleep(0)
+    results = await asyncio.gather(first, run("2"), run("3"), return_exceptions=True)
+
+    assert results[0] == "1"
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_ephemeral_runs_are_not_serialized() -> None:
+    queue = ThreadRunQueue()
+    async with queue.run(None, "a") as first, queue.run(None, "b") as second:
+        assert first.messages == ["a"]
+        assert second.messages == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_runs() -> None:
+    registry = RunRegistry()
+
+    async def run(run_id: str, duration: float) -> None:
+        with registry.track(run_id, thread_id=None, agent_id="agent"):
+            await asyncio.sleep(duration)
+
+    quick = asyncio.create_task(run("quick", 0.01))
+    slow = asyncio.create_task(run("slow", 10))
+    await asyncio.sleep(0)
+    assert set(registry.runs) == {"quick", "slow"}
+
+    cancelled = await registry.drain(grace_period=0.05)
+
+    assert registry.draining
+    assert cancelled == 1
+    assert quick.done() and not quick.cancelled()
+    assert slow.cancelled()
+    assert registry.runs == {}
+
+
+@pytest.mark.asyncio
+async def test_drain_when_idle() -> None:
+    registry = RunRegistry()
+    assert await registry.drain(grace_period=10) == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_counts_from_start_draining() -> None:
+    registry = RunRegistry()
+
+    async def run() -> None:
+        with registry.track("slow", thread_id=None, agent_id="agent"):
+            await asyncio.sleep(10)
+
+    slow = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    registry.start_draining(grace_period=0.1)
+    assert registry.draining
+    await asyncio.sleep(0.1)
+    # The grace period already ran out while the server waited for its connections
+    start = time.monotonic()
+    assert await registry.drain(grace_period=10) == 1
+    assert time.monotonic() - start < 1
+    assert slow.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_cancel_run() -> None:
+    registry = RunRegistry()
+    started = asyncio.Event()
+
+    async def run() -> None:
+        with registry.track("run", thread_id=None, agent_id="agent") as active_run:
+            NodeTracker(active_run).on_chain_start({}, {}, metadata={"langgraph_node": "model"})
+            started.set()
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(run())
+    await started.wait()
+    assert registry.runs["run"].current_node == "model"
+
+    assert registry.cancel("run")
+    assert registry.runs["run"].cancel_requested
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert registry.runs == {}
+    assert not registry.cancel("run")
+
+
+@pytest.mark.asyncio
+async def test_sync_run_index() -> None:
+    registry = RunRegistry()
+    index = AsyncMock()
+    index.cancel_requests.return_value = {"run", "run-on-other-worker"}
+
+    async def run() -> None:
+        with registry.track("run", thread_id=None, agent_id="agent") as active_run:
+            active_run.current_node = "tools"
+            await asyncio.sleep(10)
+
+    index.list_runs.return_value = [Mock(run_id="interrupted-run")]
+    on_interrupted = Mock()
+
+    task = asyncio.create_task(run())
+    sync_task = asyncio.create_task(
+        sync_run_index(registry, index, interval=0.01, orphan_timeout=30, on_interrupted=on_interrupted)
+    )
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, 1)
+    sync_task.cancel()
+
+    index.heartbeat.assert_any_await(["run"], ANY)
+    index.set_current_nodes.assert_any_await({"run": "tools"})
+    index.sweep_orphans.assert_awaited()
+    on_interrupted.assert_called_with(index.list_runs.return_value[0])
@@ -1,13 +1,30 @@
+import asyncio
 import json
+from datetime import UTC, datetime
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from fastapi import HTTPException
 from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langgraph.constants import CONFIG_KEY_CHECKPOINTER
 from langgraph.pregel.types import StateSnapshot
 from langgraph.types import Interrupt
 
 from agents.agents import Agent
-from schema import ChatHistory, ChatMessage, ServiceMetadata
+from core import ModelParams, config_model_params
+from core.semantic_cache import SemanticCache
+from service import app
+from schema import (
+    ChatHistory,
+    ChatMessage,
+    CircuitState,
+    ExportResult,
+    ServiceMetadata,
+    StreamInput,
+    ThreadInfo,
+    ThreadList,
+    UserInput,
+)
 from schema.models import OpenAIModelName
 
 
@@ -90,6 +107,30 @@ def test_invoke_model_param(test_client, mock_agent) -> None:
     assert response.status_code == 422
 
 
+def test_invoke_model_variant(test_client, mock_agent) -> None:
+    """Test that model parameters are passed to the agent, and /invoke uses a non-streaming variant."""
+    response = test_client.post("/invoke", json={"message": "Hi", "temperature": 0.1, "max_tokens": 100})
+    assert response.status_code == 200
+    configurable = mock_agent.ainvoke.await_args.kwargs["config"]["configurable"]
+    assert config_model_params({"configurable": configurable}) == ModelParams(
+        temperature=0.1, max_tokens=100, streaming=False
+    )
+
+    stream_kwargs = {}
+
+    async def mock_astream(**kwargs):
+        stream_kwargs.update(kwargs)
+        yield ("updates", {"chat_model": {"messages": [AIMessage(content="Hello")]}})
+
+    mock_agent.astream = mock_astream
+    test_client.post("/stream", json={"message": "Hi"})
+    configurable = stream_kwargs["config"]["configurable"]
+    assert config_model_params({"configurable": configurable}) == ModelParams()
+
+    response = test_client.post("/invoke", json={"message": "Hi", "temperature": 3})
+    assert response.status_code == 422
+
+
 def test_invoke_custom_agent_config(test_client, mock_agent) -> None:
     """Test that the agent_config parameter is correctly passed to the agent."""
     QUESTION = "What is the weather in Tokyo?"
@@ -118,6 +159,189 @@ def test_invoke_custom_agent_config(test_client, mock_agent) -> None:
     assert response.status_code == 422
 
 
+def test_invoke_durability(test_client, mock_agent) -> None:
+    """Test that checkpoint durability is resolved from the request, then the agent, then settings."""
+    QUESTION = "What is the weather in Tokyo?"
+
+    # research-assistant (the default agent) only checkpoints on exit
+    response = test_client.post("/invoke", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert mock_agent.ainvoke.await_args.kwargs["checkpoint_during"] is False
+
+    # chatbot falls back to settings.CHECKPOINT_DURABILITY
+    response = test_client.post("/chatbot/invoke", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert mock_agent.ainvoke.await_args.kwargs["checkpoint_during"] is True
+
+    # An explicit request durability wins over the agent's
+    response = test_client.post("/invoke", json={"message": QUESTION, "durability": "async"})
+    assert response.status_code == 200
+    assert mock_agent.ainvoke.await_args.kwargs["checkpoint_during"] is True
+
+    response = test_client.post("/invoke", json={"message": QUESTION, "durability": "never"})
+    assert response.status_code == 422
+
+
+def test_invoke_ephemeral(test_client, mock_agent) -> None:
+    """Test that runs without a thread_id, or with ephemeral=true, skip the checkpointer."""
+    QUESTION = "What is the weather in Tokyo?"
+
+    response = test_client.post("/invoke", json={"message": QUESTION})
+    assert response.status_code == 200
+    mock_agent.aget_state.assert_not_awaited()
+    config = mock_agent.ainvoke.await_args.kwargs["config"]
+    assert config["configurable"][CONFIG_KEY_CHECKPOINTER] is None
+
+    response = test_client.post("/invoke", json={"message": QUESTION, "thread_id": "thread-1", "ephemeral": True})
+    assert response.status_code == 200
+    mock_agent.aget_state.assert_not_awaited()
+    config = mock_agent.ainvoke.await_args.kwargs["config"]
+    assert config["configurable"]["thread_id"] == "thread-1"
+    assert config["configurable"][CONFIG_KEY_CHECKPOINTER] is None
+
+    # Persistent runs look up the thread state and use the agent's checkpointer
+    response = test_client.post("/invoke", json={"message": QUESTION, "thread_id": "thread-1"})
+    assert response.status_code == 200
+    mock_agent.aget_state.assert_awaited_once()
+    config = mock_agent.ainvoke.await_args.kwargs["config"]
+    assert CONFIG_KEY_CHECKPOINTER not in config["configurable"]
+
+
+def test_feedback_tunes_router(test_client, mock_agent) -> None:
+    """Test that runs pass their ID to the agent, and feedback on them reaches the model router."""
+    response = test_client.post("/invoke", json={"message": "Hi", "model": "auto"})
+    run_id = response.json()["run_id"]
+    assert mock_agent.ainvoke.await_args.kwargs["config"]["configurable"]["run_id"] == run_id
+
+    with patch("service.service.model_router") as mock_router:
+        response = test_client.post("/feedback", json={"run_id": run_id, "key": "human-feedback-stars", "score": 0.2})
+        assert response.status_code == 200
+        mock_router.record_feedback.assert_called_once_with(run_id, "human-feedback-stars", 0.2)
+
+    # Feedback is still accepted, and tunes this worker's routing, if the routing store fails
+    routing_store = AsyncMock()
+    routing_store.record_feedback.side_effect = RuntimeError("database is locked")
+    with (
+        patch("service.service.model_router") as mock_router,
+        patch.object(app.state, "routing_store", routing_store, create=True),
+    ):
+        response = test_client.post("/feedback", json={"run_id": run_id, "key": "human-feedback-stars", "score": 0.2})
+        assert response.status_code == 200
+        routing_store.record_feedback.assert_awaited_once()
+        mock_router.record_feedback.assert_called_once_with(run_id, "human-feedback-stars", 0.2)
+
+
+def test_invoke_semantic_cache(test_client, mock_agent) -> None:
+    """Test that stateless turns of agents that opt in are answered from the semantic cache."""
+    ANSWER = "Inflation was 3.25% in 2023."
+    mock_agent.ainvoke.return_value = [("values", {"messages": [AIMessage(content=ANSWER)]})]
+
+    with patch("service.service.semantic_cache", SemanticCache(capacity=10, threshold=0.9, ttl=60)) as cache:
+        first = test_client.post("/research-assistant/invoke", json={"message": "What was the inflation rate in 2023?"})
+        second = test_client.post("/research-assistant/invoke", json={"message": "inflation rate in 2023?"})
+        assert mock_agent.ainvoke.await_count == 1
+        assert second.json()["content"] == ANSWER
+        assert second.json()["run_id"] != first.json()["run_id"]
+
+        # Stateful turns and agents that don't opt in run the agent
+        test_client.post("/research-assistant/invoke", json={"message": "inflation rate in 2023?", "thread_id": "t1"})
+        test_client.post("/chb-assistant/invoke", json={"message": "inflation rate in 2023?"})
+        assert mock_agent.ainvoke.await_count == 3
+
+        response = test_client.post(
+            "/research-assistant/stream", json={"message": "What was the inflation rate in 2023", "stream_tokens": False}
+        )
+        events = [line.removeprefix("data: ") for line in response.text.splitlines() if line]
+        assert json.loads(events[0])["content"]["content"] == ANSWER
+        assert events[-1] == "[DONE]"
+        assert cache.stats()["hits"] == 2
+
+        assert test_client.get("/metrics").json()["semantic_cache"]["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invoke_coalesce(mock_agent) -> None:
+    """Test that messages queued behind an active run on a thread are merged into one run."""
+    from service.service import invoke
+
+    release = asyncio.Event()
+
+    async def ainvoke(input, **kwargs):
+        if len(input["messages"]) == 1:
+            await release.wait()
+        content = " + ".join(m.content for m in input["messages"])
+        return [("values", {"messages": [AIMessage(content=content)]})]
+
+    mock_agent.ainvoke.side_effect = ainvoke
+    mock_agent.aget_state.return_value = StateSnapshot(
+        values={}, next=(), config={}, metadata=None, created_at=None, parent_config=None, tasks=()
+    )
+
+    def user_input(message: str) -> UserInput:
+        return UserInput(message=message, thread_id="thread-1", coalesce=True)
+
+    first = asyncio.create_task(invoke(user_input("first")))
+    await asyncio.sleep(0.01)
+    queued = asyncio.gather(invoke(user_input("second")), invoke(user_input("third")))
+    await asyncio.sleep(0.01)
+    release.set()
+    first_output, (second_output, third_output) = await asyncio.gather(first, queued)
+
+    assert first_output.content == "first"
+    assert second_output.content == third_output.content == "second + third"
+    assert second_output.run_id == third_output.run_id
+    assert mock_agent.ainvoke.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invoke_merged_into_stream_without_response(mock_agent) -> None:
+    """Test that an invoke merged into a streamed run that ends without a message gets an error."""
+    from service.service import invoke, message_generator
+
+    release = asyncio.Event()
+
+    async def ainvoke(input, **kwargs):
+        await release.wait()
+        return [("values", {"messages": [AIMessage(content="first answer")]})]
+
+    async def astream(**kwargs):
+        for event in ():
+            yield event
+
+    mock_agent.ainvoke.side_effect = ainvoke
+    mock_agent.astream = astream
+    mock_agent.aget_state.return_value = StateSnapshot(
+        values={}, next=(), config={}, metadata=None, created_at=None, parent_config=None, tasks=()
+    )
+
+    # A stream queued behind a running invoke, and an invoke merged into the stream's run
+    first = asyncio.create_task(invoke(UserInput(message="first", thread_id="thread-1", coalesce=True)))
+    await asyncio.sleep(0.01)
+    stream_input = StreamInput(message="second", thread_id="thread-1", coalesce=True, stream_tokens=False)
+    stream = asyncio.create_task(anext(message_generator(stream_input)))
+    await asyncio.sleep(0.01)
+    merged = asyncio.create_task(invoke(UserInput(message="third", thread_id="thread-1", coalesce=True)))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert (await first).content == "first answer"
+    await stream
+    with pytest.raises(HTTPException) as exc_info:
+        await merged
+    assert exc_info.value.status_code == 500
+    assert exc_info.value.detail == "The run ended without a response"
+
+
+def test_reject_runs_while_draining(test_client, mock_agent) -> None:
+    with patch("service.service.active_runs.draining", True):
+        response = test_client.post("/invoke", json={"message": "hi"})
+        assert response.status_code == 503
+        response = test_client.post("/stream", json={"message": "hi"})
+        assert response.status_code == 503
+        assert test_client.get("/ready").status_code == 503
+    mock_agent.ainvoke.assert_not_awaited()
+    mock_agent.astream.assert_not_called()
+
+
 def test_invoke_interrupt(test_client, mock_agent) -> None:
     QUESTION = "What is the weather in Tokyo?"
     ANSWER = "The weather in Tokyo is 70 degrees."
@@ -164,6 +388,75 @@ def test_history(test_client, mock_agent) -> None:
     assert output.messages[1].content == ANSWER
 
 
+def test_threads(test_client) -> None:
+    THREADS = ThreadList(
+        threads=[
+            ThreadInfo(
+                thread_id="thread-1",
+                user_id="alice",
+                agent_id="chatbot",
+                title="Hello",
+                message_count=2,
+                created_at="2026-01-01T00:00:00+00:00",
+                updated_at="2026-01-01T00:01:00+00:00",
+            )
+        ],
+        next_cursor="abc",
+    )
+    thread_index = AsyncMock()
+    thread_index.list_threads.return_value = THREADS
+
+    # Not available until the lifespan has set up the index
+    response = test_client.get("/threads")
+    assert response.status_code == 503
+
+    with patch.object(app.state, "thread_index", thread_index, create=True):
+        response = test_client.get("/threads", params={"user_id": "alice", "limit": 1, "cursor": "xyz"})
+        assert response.status_code == 200
+        assert ThreadList.model_validate(response.json()) == THREADS
+        thread_index.list_threads.assert_awaited_once_with(user_id="alice", agent_id=None, limit=1, cursor="xyz")
+
+        response = test_client.get("/threads", params={"limit": 1000})
+        assert response.status_code == 422
+
+        thread_index.list_threads.side_effect = ValueError("Invalid cursor: xyz")
+        response = test_client.get("/threads", params={"cursor": "xyz"})
+        assert response.status_code == 422
+
+
+def test_invoke_records_thread_metadata(test_client, mock_agent) -> None:
+    QUESTION = "What is the weather in Tokyo?"
+    mock_agent.ainvoke.return_value = [
+        ("updates", {"model": {"messages": [AIMessage(content="", tool_calls=[])]}}),
+        ("updates", {"tools": {"messages": [AIMessage(content="sunny")]}}),
+        ("values", {"messages": [AIMessage(content="It is sunny.")]}),
+    ]
+    thread_index = AsyncMock()
+    with patch.object(app.state, "thread_index", thread_index, create=True):
+        response = test_client.post(
+            "/chatbot/invoke", json={"message": QUESTION, "thread_id": "thread-1", "user_id": "alice"}
+        )
+        assert response.status_code == 200
+    thread_index.record_run.assert_awaited_once_with(
+        "thread-1", agent_id="chatbot", user_id="alice", title=QUESTION, new_messages=3
+    )
+
+
+def test_export(test_client, mock_agent) -> None:
+    RESULT = ExportResult(watermark="1f0", threads=2, messages=4, tool_calls=1, token_usage=2)
+    with patch("memory.export.export_conversations", AsyncMock(return_value=RESULT)) as mock_export:
+        response = test_client.post("/admin/export", json={"since": "1ef"})
+        assert response.status_code == 200
+        assert ExportResult.model_validate(response.json()) == RESULT
+        assert mock_export.await_args.args[0] is mock_agent.checkpointer
+        assert mock_export.await_args.kwargs["since"] == "1ef"
+        assert mock_export.await_args.kwargs["full"] is False
+
+        mock_export.side_effect = RuntimeError("disk full")
+        response = test_client.post("/admin/export", json={})
+        assert response.status_code == 500
+
+
 @pytest.mark.asyncio
 async def test_stream(test_client, mock_agent) -> None:
     """Test streaming tokens and messages."""
@@ -308,7 +601,10 @@ def test_info(test_client, mock_settings) -> None:
     mock_settings.AUTH_SECRET = None
     mock_settings.DEFAULT_MODEL = OpenAIModelName.GPT_4O_MINI
     mock_settings.AVAILABLE_MODELS = {OpenAIModelName.GPT_4O_MINI, OpenAIModelName.GPT_4O}
-    with patch.dict("agents.agents.agents", {"base-agent": base_agent}, clear=True):
+    with (
+        patch.dict("agents.agents.agents", {"base-agent": base_agent}, clear=True),
+        patch("service.service.circuit_states", return_value={"google": "open"}),
+    ):
         response = test_client.get("/info")
         assert response.status_code == 200
         output = ServiceMetadata.model_validate(response.json())
@@ -320,3 +616,137 @@ def test_info(test_client, mock_settings) -> None:
 
     assert output.default_model == OpenAIModelName.GPT_4O_MINI
     assert output.models == [OpenAIModelName.GPT_4O, OpenAIModelName.GPT_4O_MINI]
+    assert output.circuit_breakers == {"google": CircuitState.OPEN}
+
+
+def test_reload_agent(test_client) -> None:
+    with patch("service.service.reload_agent") as mock_reload:
+        response = test_client.post("/admin/agents/chatbot/reload")
+        assert response.status_code == 200
+        assert response.json()["key"] == "chatbot"
+        mock_reload.assert_called_once_with("chatbot")
+
+        response = test_client.post("/admin/agents/missing-agent/reload")
+        assert response.status_code == 404
+
+        mock_reload.side_effect = SyntaxError("invalid syntax")
+        response = test_client.post("/admin/agents/chatbot/reload")
+        assert response.status_code == 500
+        # The error, which may include file paths, is only logged
+        assert response.json()["detail"] == "Reload failed"
+
+
+@pytest.mark.asyncio
+async def test_cancel_run(mock_agent) -> None:
+    """Test that a run in progress is listed and can be cancelled."""
+    from service.service import cancel_run, invoke, list_active_runs
+
+    started = asyncio.Event()
+
+    async def ainvoke(input, **kwargs):
+        started.set()
+        await asyncio.sleep(10)
+
+    mock_agent.ainvoke.side_effect = ainvoke
+    run = asyncio.create_task(invoke(UserInput(message="research this", thread_id="thread-1", ephemeral=True)))
+    await started.wait()
+
+    with patch("service.service.app.state.run_index", None, create=True):
+        [run_info] = await list_active_runs()
+        assert run_info.thread_id == "thread-1"
+        assert (await cancel_run(run_info.run_id)).run_id == run_info.run_id
+        with pytest.raises(HTTPException) as exc_info:
+            await run
+        assert exc_info.value.status_code == 409
+
+        with pytest.raises(HTTPException) as exc_info:
+            await cancel_run(run_info.run_id)
+        assert exc_info.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_resume_interrupted_run(tmp_path) -> None:
+    """Test that an interrupted run continues from its last checkpoint without repeating finished steps."""
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    from langgraph.graph import END, MessagesState, StateGraph
+
+    from memory.runs import RunIndex
+    from service.service import list_interrupted_runs, resume_run
+
+    calls = {"generate_report": 0, "summarize": 0}
+
+    def generate_report(state: MessagesState):
+        calls["generate_report"] += 1
+        return {"messages": [AIMessage(content="report.docx")]}
+
+    def summarize(state: MessagesState):
+        calls["summarize"] += 1
+        if calls["summarize"] == 1:
+            raise RuntimeError("worker crashed")
+        return {"messages": [AIMessage(content="Here is your report")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("generate_report", generate_report)
+    builder.add_node("summarize", summarize)
+    builder.set_entry_point("generate_report")
+    builder.add_edge("generate_report", "summarize")
+    builder.add_edge("summarize", END)
+
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = builder.compile(checkpointer=saver)
+        run_index = RunIndex(saver)
+        await run_index.setup()
+        config = {"configurable": {"thread_id": "thread-1", "run_id": "run-1"}}
+        with pytest.raises(RuntimeError):
+            await graph.ainvoke({"messages": [HumanMessage(content="Write a report")]}, config)
+        user_input = UserInput(message="Write a report", thread_id="thread-1")
+        await run_index.add(
+            "run-1",
+            thread_id="thread-1",
+            agent_id="report-agent",
+            started_at=datetime.now(UTC),
+            user_input=user_input.model_dump_json(),
+        )
+        await run_index.mark_interrupted("run-1")
+
+        with (
+            patch("service.service.app.state.run_index", run_index, create=True),
+            patch("service.service.get_agent", return_value=graph),
+        ):
+            [run_info] = await list_interrupted_runs()
+            assert run_info.run_id == "run-1"
+
+            output = await resume_run("run-1")
+            assert output.content == "Here is your report"
+            assert calls == {"generate_report": 1, "summarize": 2}
+            assert await list_interrupted_runs() == []
+
+            with pytest.raises(HTTPException) as exc_info:
+                await resume_run("run-1")
+            assert exc_info.value.status_code == 404
+
+            # A run interrupted before its input was checkpointed is started over with that input
+            user_input = UserInput(message="Write another report", thread_id="thread-1")
+            for run_id in ("run-2", "run-3"):
+                await run_index.add(
+                    run_id,
+                    thread_id="thread-1",
+                    agent_id="report-agent",
+                    started_at=datetime.now(UTC),
+                    user_input=user_input.model_dump_json(),
+                )
+                await run_index.mark_interrupted(run_id)
+            output = await resume_run("run-2")
+            assert output.content == "Here is your report"
+            assert calls == {"generate_report": 2, "summarize": 3}
+            state = await graph.aget_state(config)
+            assert state.values["messages"][-3].content == "Write another report"
+
+        # A resume that fails leaves the run interrupted
+        with (
+            patch("service.service.app.state.run_index", run_index, create=True),
+            patch("service.service.get_agent", side_effect=RuntimeError("import failed")),
+        ):
+            with pytest.raises(RuntimeError):
+                await resume_run("run-3")
+            assert [r.run_id for r in await list_interrupted_runs()] == ["run-3"]
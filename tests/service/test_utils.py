@@ -1,6 +1,8 @@
+import signal
+
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolCall, ToolMessage
 
-from service.utils import langchain_to_chat_message
+from service.utils import langchain_to_chat_message, on_shutdown_signal
 
 
 def test_messages_from_langchain() -> None:
@@ -42,3 +44,17 @@ def test_messages_tool_calls() -> None:
     assert ai_message.tool_calls[0]["id"] == "call_Jja7"
     assert ai_message.tool_calls[0]["name"] == "test_tool"
     assert ai_message.tool_calls[0]["args"] == {"x": 1, "y": 2}
+
+
+def test_on_shutdown_signal() -> None:
+    calls = []
+    previous = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: calls.append("server"))
+        on_shutdown_signal(lambda: calls.append("callback"))
+        signal.raise_signal(signal.SIGTERM)
+        # The callback runs first, then the handler it replaced
+        assert calls == ["callback", "server"]
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
@@ -0,0 +1,60 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from agents.research_assistant.research_assistant import bound_model
+from schema.models import FakeModelName
+from service import app
+from service.service import _warm_up
+from service.warmup import WARMUP_THREAD_ID, warm_up
+
+
+@pytest.mark.asyncio
+async def test_warm_up() -> None:
+    saver = AsyncMock()
+    bound_model.cache_clear()
+    with (
+        patch("service.warmup.settings.AVAILABLE_MODELS", {FakeModelName.FAKE}),
+        patch("agents.agents.settings.ENABLED_AGENTS", {"chatbot", "research-assistant"}),
+    ):
+        await warm_up(saver)
+
+    assert saver.aget_tuple.await_args.args[0]["configurable"]["thread_id"] == WARMUP_THREAD_ID
+    # Tools are bound once per available model ahead of the first request, for /stream and /invoke
+    assert bound_model.cache_info().currsize == 2
+
+
+@pytest.mark.asyncio
+async def test_warm_up_failure_is_not_fatal() -> None:
+    with (
+        patch("service.warmup.settings.AVAILABLE_MODELS", {FakeModelName.FAKE}),
+        patch("service.warmup.get_model", side_effect=ValueError("missing key")),
+        patch("agents.agents.settings.ENABLED_AGENTS", {"chatbot"}),
+        patch("service.warmup.get_agent", side_effect=RuntimeError("boom")),
+    ):
+        await warm_up(AsyncMock(**{"aget_tuple.side_effect": ConnectionError("database is down")}))
+
+
+@pytest.mark.asyncio
+async def test_ready_after_warm_up(test_client) -> None:
+    app.state.ready = False
+    response = test_client.get("/ready")
+    assert response.status_code == 503
+    assert test_client.get("/health").status_code == 200
+
+    with patch("service.service.warm_up", AsyncMock()) as mock_warm_up:
+        await _warm_up(app, AsyncMock())
+    mock_warm_up.assert_awaited_once()
+    response = test_client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+    with patch("service.service.settings.WARMUP", False), patch("service.service.warm_up", AsyncMock()) as mock_warm_up:
+        await _warm_up(app, AsyncMock())
+    mock_warm_up.assert_not_awaited()
+    assert app.state.ready
+
+    with patch("service.service.warm_up", AsyncMock(side_effect=RuntimeError("boom"))):
+        await _warm_up(app, AsyncMock())
+    assert app.state.ready
+    del app.state.ready